@@ -1,124 +1,51 @@
 """
 Add missing packages to package_units.json with best-guess weights.
-Uses pattern matching on package names to estimate weights.
+Uses the package parser, then the rule table in backend_update/package_rules.py.
 """
 import json
-import re
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend_update")))
+from package_rules import RuleEngine
+from package_weights import PACKAGE_UNITS_PATH, parse_package_measures
 
 # Load missing packages
 with open("missing_packages.json", "r") as f:
-    missing = json.load(f)
+    missing = pd.DataFrame(json.load(f), columns=["commodity", "package"])
 
-# Load existing package_units
-with open("package_units.json", "r") as f:
+# Load existing package_units (the one shared copy, in backend_update/)
+with open(PACKAGE_UNITS_PATH, "r") as f:
     package_units = json.load(f)
 
-def guess_weight(package_str):
-    """
-    Estimate weight in lbs from package string.
-    Returns (weight_lbs, weight_kg, units) tuple.
-    - If weight-based: returns (lbs, kg, None)
-    - If unit-based: returns (None, None, units)
-    """
-    pkg = package_str.lower()
-    
-    # Pattern 1: Explicit weight like "30 lb cartons", "10 kg mesh sacks"
-    lb_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:lb|lbs|pound)', pkg)
-    if lb_match:
-        lbs = float(lb_match.group(1))
-        return (lbs, round(lbs * 0.453592, 1), None)
-    
-    kg_match = re.search(r'(\d+(?:\.\d+)?)\s*kg', pkg)
-    if kg_match:
-        kg = float(kg_match.group(1))
-        return (round(kg * 2.20462, 1), kg, None)
-    
-    # Pattern 2: Unit packs like "12 1-pint baskets", "30 6-oz film bags"
-    unit_match = re.search(r'(\d+)\s+(?:\d+-(?:oz|pint|lb))', pkg)
-    if unit_match:
-        # Estimate based on units and size
-        if '1-lb' in pkg:
-            count = int(re.search(r'(\d+)\s+1-lb', pkg).group(1))
-            return (count, round(count * 0.453592, 1), None)
-        if '6-oz' in pkg:
-            return (4.5, 2.0, None)  # 12 x 6oz = 72oz = 4.5 lbs
-        if 'pint' in pkg:
-            return (12, 5.4, None)  # Standard flat
-    
-    # Pattern 3: Bushel-based
-    if '1 1/9 bushel' in pkg or '1-1/9 bushel' in pkg:
-        # Standard 1 1/9 bushel varies by crop
-        if 'pepper' in pkg or 'pea' in pkg:
-            return (28, 12.7, None)
-        if 'squash' in pkg or 'eggplant' in pkg:
-            return (33, 15.0, None)
-        return (30, 13.6, None)  # Default for 1 1/9 bushel
-    
-    if '4/7 bushel' in pkg:
-        return (21, 9.5, None)
-    
-    if 'bushel' in pkg and 'cartons' in pkg:
-        return (30, 13.6, None)
-    
-    # Pattern 4: Standard carton sizes by crop type
-    if 'cartons bunched' in pkg:
-        if any(herb in pkg for herb in ['basil', 'cilantro', 'parsley', 'mint', 'dill', 'thyme', 'rosemary', 'oregano', 'sage', 'chive', 'tarragon', 'chervil', 'marjoram', 'savory', 'sorrel', 'fenugreek', 'epasote']):
-            return (5, 2.3, None)  # Herb bunches are light
-        if 'greens' in pkg or 'chard' in pkg or 'kale' in pkg or 'collard' in pkg:
-            return (25, 11.3, None)
-        return (20, 9.1, None)  # Default bunched
-    
-    if 'cartons' in pkg or 'containers' in pkg:
-        # General carton defaults
-        if 'artichoke' in pkg:
-            return (22, 10.0, None)
-        if 'lettuce' in pkg:
-            return (24, 10.9, None)
-        if 'endive' in pkg or 'escarole' in pkg:
-            return (18, 8.2, None)
-        if 'mushroom' in pkg:
-            return (10, 4.5, None)
-        if 'radicchio' in pkg:
-            return (12, 5.4, None)
-        return (25, 11.3, None)  # Default carton
-    
-    if '1 lb film bag' in pkg:
-        return (1, 0.45, None)
-    
-    if 'film bags' in pkg or 'mesh sacks' in pkg:
-        return (25, 11.3, None)
-    
-    if 'flats' in pkg:
-        return (12, 5.4, None)
-    
-    if 'lugs' in pkg or 'lug' in pkg:
-        return (25, 11.3, None)
-    
-    if 'crates' in pkg:
-        return (35, 15.9, None)
-    
-    if 'reusable plastic containers' in pkg or 'rpc' in pkg:
-        return (30, 13.6, None)
-    
-    # Default fallback
-    return (25, 11.3, None)
+# Only (crop, package) pairs the reference does not already have, once each,
+# so re-running the script never adds a second entry for a key.
+known = {(e["crop"], e["package_size"]) for e in package_units}
+missing = missing.drop_duplicates()
+missing = missing[[k not in known for k in zip(missing["commodity"], missing["package"])]]
+missing = missing.reset_index(drop=True)
 
+# A weight the package parser shared by the pipelines can read, else the rule
+# table in backend_update/package_rules.py over the whole column at once.
+guesses = RuleEngine().evaluate(missing["commodity"], missing["package"])
+parsed = [parse_package_measures(p)[:2] for p in missing["package"]]
 
 # Generate new entries
 new_entries = []
-for item in missing:
-    commodity = item["commodity"]
-    package = item["package"]
-    
-    weight_lbs, weight_kg, units = guess_weight(package)
-    
+for item, (lbs, kg), guess in zip(missing.itertuples(index=False), parsed,
+                                  guesses.itertuples(index=False)):
+    rule = "parsed"
+    if lbs is None:
+        lbs, kg, rule = guess.weight_lbs, guess.weight_kg, guess.rule
     entry = {
-        "crop": commodity,
-        "package_size": package,
-        "weight_lbs": weight_lbs,
-        "weight_kg": weight_kg,
-        "units": units,
-        "source": "Auto-generated estimate"
+        "crop": item.commodity,
+        "package_size": item.package,
+        "weight_lbs": lbs,
+        "weight_kg": kg,
+        "units": None,
+        "source": f"Auto-generated estimate ({rule})"
     }
     new_entries.append(entry)
 
@@ -132,7 +59,7 @@ combined = package_units + new_entries
 combined.sort(key=lambda x: (x["crop"], x["package_size"]))
 
 # Save updated file
-with open("package_units.json", "w") as f:
+with open(PACKAGE_UNITS_PATH, "w") as f:
     json.dump(combined, f, indent=2)
 
 print(f"Added {len(new_entries)} new package entries")
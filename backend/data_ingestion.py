@@ -1,104 +1,126 @@
-import os
+"""
+Bulk-load the local SQLite mirror (unified_prices) from the USDA CSV files.
+
+Rows are formatted with backend_update/format_data.py, the same code the
+Supabase upload uses, so the mirror has the production schema. The load runs
+in one transaction: the table is recreated, rows go in with batched
+executemany inserts, and the composite indexes in database.FRONTEND_INDEXES
+are built once at the end.
+
+Usage:
+    python data_ingestion.py          # *_recent.csv files
+    python data_ingestion.py --full   # plus the *-Full.csv history
+    python data_ingestion.py --store  # the already-formatted Parquet store
+                                      # (backend_update/local_analytics.py --build)
+"""
+import argparse
 import glob
+import os
+import sys
+import time
+
 import pandas as pd
-from datetime import datetime
-from sqlalchemy.orm import Session
-from database import engine, SessionLocal, UnifiedCropPrice, Base
-
-# Path to the data directory (relative to backend/)
-DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "APP_CROP_DATA"))
-
-def clean_price(price_str):
-    if pd.isna(price_str) or price_str == "N/A":   
-        return None
-    try:
-        return float(price_str)
-    except ValueError:
-        return None
-
-def parse_date(date_str):
-    try:
-        return datetime.strptime(date_str, "%m/%d/%Y")
-    except (ValueError, TypeError):
-        return None
-
-def process_file(filepath, db: Session):
-    print(f"Processing {filepath}...")
-    try:
-        df = pd.read_csv(filepath, low_memory=False)
-    except Exception as e:
-        print(f"Error reading {filepath}: {e}")
+from sqlalchemy import text
+
+from database import engine, UnifiedCropPrice, FRONTEND_INDEXES
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend_update")))
+from format_data import DATA_DIR, format_for_unified_crop_price, load_and_format_all_data
+from natural_key import with_row_keys
+
+BATCH_SIZE = 50000
+
+COLUMNS = [c.name for c in UnifiedCropPrice.__table__.columns if c.name != "id"]
+
+
+def iter_store():
+    """Yield the local Parquet store one report year at a time (no formatting pass)."""
+    from local_analytics import LocalAnalytics
+    db = LocalAnalytics()
+    for (year,) in db.con.execute("SELECT DISTINCT year FROM UnifiedCropPrice ORDER BY 1").fetchall():
+        yield db.query("SELECT * EXCLUDE (year) FROM UnifiedCropPrice WHERE year = ?", [year])
+
+
+def iter_formatted(full: bool = False):
+    """
+    Yield formatted frames: the *_recent.csv window, then (with full) the
+    *-Full.csv history up to the first day of that window, as the uploads split it.
+    """
+    recent = load_and_format_all_data()
+    since = None
+    if not recent.empty:
+        since = pd.to_datetime(recent["report_date"], errors="coerce").min()
+        yield recent
+    if not full:
         return
 
-    # Normalize Columns
-    # Map disparate columns to a common schema
-    # Terminal: report_date, market_type, commodity, variety, package, low_price, high_price, market_location_name, grade
-    # Shipping: report_date, market_type, commodity, var, pkg, low_price, high_price, district, grade
-    
-    records = []
-    
-    for _, row in df.iterrows():
-        # Determine Market Type
-        m_type = row.get('market_type')
-        
-        # Normalize Fields based on type
-        # Variety
-        variety = row.get('variety') if 'variety' in row else row.get('var')
-        
-        # Package
-        package = row.get('package') if 'package' in row else row.get('pkg')
-        
-        # Region
-        # Terminal uses 'market_location_name' (e.g. LA Terminal)
-        # Shipping uses 'district' (e.g. San Joaquin Valley)
-        district = row.get('district')
-        
-        # Prices
-        min_p = clean_price(row.get('low_price'))
-        max_p = clean_price(row.get('high_price'))
-        avg_p = clean_price(row.get('wtd_avg_price'))
-        
-        report_dt = parse_date(row.get('report_date') or row.get('report_end_date'))
-        if not report_dt:
-            continue
-
-        record = UnifiedCropPrice(
-            report_date=report_dt,
-            market_type=m_type,
-            commodity=row.get('commodity'),
-            variety=variety if pd.notna(variety) and variety != "N/A" else None,
-            package=package if pd.notna(package) and package != "N/A" else None,
-            district=district if pd.notna(district) and district != "N/A" else None,
-            price_min=min_p,
-            price_max=max_p,
-            price_retail=avg_p,
-        )
-        records.append(record)
-        
-    # Bulk Insert for speed
-    if records:
-        db.bulk_save_objects(records)
-        db.commit()
-        print(f"Inserted {len(records)} records from {os.path.basename(filepath)}")
+    from upload_historical import FULL_FILE_DIR, read_csv_by_year
+    full_files = sorted(glob.glob(os.path.join(FULL_FILE_DIR, "*-Full.csv")))
+    print(f"Found {len(full_files)} full files in {FULL_FILE_DIR}")
+    for path in full_files:
+        for _, chunk, _ in read_csv_by_year(path):
+            formatted = format_for_unified_crop_price(chunk)
+            if since is not None and not formatted.empty:
+                formatted = formatted[pd.to_datetime(formatted["report_date"], errors="coerce") < since]
+            if not formatted.empty:
+                yield formatted
+
+
+def to_rows(df: pd.DataFrame) -> list[tuple]:
+    """Formatted frame -> parameter tuples in COLUMNS order (NaN -> NULL), one per row."""
+    if "row_key" not in df.columns:
+        df = with_row_keys(df)
+    df = df.reindex(columns=COLUMNS)
+    df["report_date"] = pd.to_datetime(df["report_date"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def load(full: bool = False, store: bool = False) -> int:
+    t0 = time.time()
+    table = UnifiedCropPrice.__table__
+    insert_sql = (f"INSERT INTO {table.name} ({', '.join(COLUMNS)}) "
+                  f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+    total = 0
+
+    with engine.begin() as conn:
+        # Recreate rather than clear: older mirrors have the nine-column schema.
+        table.drop(conn, checkfirst=True)
+        table.create(conn)
+        for index in FRONTEND_INDEXES:
+            index.drop(conn)
+
+        cursor = conn.connection.cursor()
+        for df in (iter_store() if store else iter_formatted(full)):
+            rows = to_rows(df)
+            for i in range(0, len(rows), BATCH_SIZE):
+                cursor.executemany(insert_sql, rows[i:i + BATCH_SIZE])
+            total += len(rows)
+            print(f"  -> {total:,} rows loaded ({time.time() - t0:.1f}s)")
+
+        print("Building indexes...")
+        for index in FRONTEND_INDEXES:
+            index.create(conn)
+        conn.execute(text("ANALYZE"))
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+    print(f"Ingestion complete: {total:,} rows in {time.time() - t0:.1f}s")
+    return total
+
 
 def main():
-    # Re-create tables to be safe (optional, but good for dev)
-    # Base.metadata.drop_all(bind=Engine) 
-    # Base.metadata.create_all(bind=Engine)
-    # NOTE: Keeping existing data for now, but in a real "Phase 1" clean slate might be better.
-    # Let's clear just the Unified table to avoid dupes on re-run
-    db = SessionLocal()
-    db.query(UnifiedCropPrice).delete()
-    db.commit()
-    print("Cleared UnifiedCropPrice table.")
-
-    csv_files = glob.glob(os.path.join(DATA_DIR, "*.csv"))
-    print(f"Found {len(csv_files)} files in {DATA_DIR}")
-    for csv_file in csv_files:
-        process_file(csv_file, db)
-    
-    db.close()
-    print("Ingestion complete.")
+    parser = argparse.ArgumentParser(description="Bulk-load the local SQLite mirror")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--full", action="store_true",
+                        help="Also load the *-Full.csv history used by upload_historical.py")
+    source.add_argument("--store", action="store_true",
+                        help="Load the formatted Parquet store built by local_analytics.py")
+    args = parser.parse_args()
+    if not args.store:
+        print(f"Loading from {DATA_DIR}")
+    load(args.full, args.store)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import create_engine, event, Column, Index, Integer, String, Float, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
@@ -9,6 +9,25 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///../specialty_crop.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+# WAL lets readers keep serving while a load writes; the rest trade durability
+# of the last transaction on power loss (not corruption) for bulk-load speed.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -262144,      # 256 MB page cache
+    "mmap_size": 1073741824,    # 1 GB memory-mapped reads
+}
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -49,18 +68,74 @@ class CropPrice(Base):
     market_tone_comments = Column(Text, nullable=True)
 
 class UnifiedCropPrice(Base):
+    """
+    Local mirror of the Supabase UnifiedCropPrice table, in the schema
+    backend_update/format_data.py produces.
+
+    Only the primary key is declared on the columns. The composite indexes in
+    FRONTEND_INDEXES are built after a bulk load (see data_ingestion.py),
+    which is much faster than maintaining them row by row.
+    """
     __tablename__ = "unified_prices"
 
-    id = Column(Integer, primary_key=True, index=True)
-    report_date = Column(DateTime, index=True)
-    market_type = Column(String, index=True)  # "Terminal" or "Shipping Point"
-    district = Column(String, index=True)
-    commodity = Column(String, index=True)
-    variety = Column(String, index=True)
-    package = Column(String, index=True)
-    price_min = Column(Float)
-    price_max = Column(Float)
-    price_retail = Column(Float)
+    id = Column(Integer, primary_key=True)
+    report_date = Column(DateTime)
+    market_type = Column(String)  # "Terminal", "Shipping Point", "Retail"
+    category = Column(String)
+    commodity = Column(String)
+    variety = Column(String)
+    package = Column(String)
+    origin = Column(String)
+    district = Column(String)
+    organic = Column(String)
+    item_size = Column(String)
+    market_location_name = Column(String)
+    slug_id = Column(String)
+    slug_name = Column(String)
+
+    # Price fields
+    price_avg = Column(Float)
+    low_price = Column(Float)
+    high_price = Column(Float)
+    mostly_low_price = Column(Float)
+    mostly_high_price = Column(Float)
+    wtd_avg_price = Column(Float)
+
+    # Package weights and normalized prices
+    weight_lbs = Column(Float)
+    weight_kgs = Column(Float)
+    units = Column(Float)
+    price_per_lb = Column(Float)
+    price_per_unit = Column(Float)
+
+    # Notes
+    supply_tone_comments = Column(Text)
+    demand_tone_comments = Column(Text)
+    market_tone_comments = Column(Text)
+    offerings_comments = Column(Text)
+    reporter_comment = Column(Text)
+    commodity_comments = Column(Text)
+
+    row_key = Column(String)
+
+
+# Composite indexes matching the frontend queries in supabaseApi.js:
+# newest-first reads by commodity (getStats, getPricesByDateRange, getTimeSeriesData),
+# narrowed by district / variety / organic, and unfiltered date ranges (getPrices, getDateRange).
+FRONTEND_INDEXES = [
+    Index("ix_unified_commodity_date", UnifiedCropPrice.commodity, UnifiedCropPrice.report_date),
+    Index("ix_unified_commodity_district_date", UnifiedCropPrice.commodity,
+          UnifiedCropPrice.district, UnifiedCropPrice.report_date),
+    Index("ix_unified_commodity_variety_date", UnifiedCropPrice.commodity,
+          UnifiedCropPrice.variety, UnifiedCropPrice.report_date),
+    Index("ix_unified_commodity_organic_date", UnifiedCropPrice.commodity,
+          UnifiedCropPrice.organic, UnifiedCropPrice.report_date),
+    Index("ix_unified_category_commodity", UnifiedCropPrice.category, UnifiedCropPrice.commodity),
+    Index("ix_unified_date", UnifiedCropPrice.report_date),
+    # Lookups by natural key. Not unique: the mirror is loaded frame by frame,
+    # and a key collision must not abort the whole load.
+    Index("ix_unified_date_row_key", UnifiedCropPrice.report_date, UnifiedCropPrice.row_key),
+]
 
 def init_db():
     Base.metadata.create_all(bind=engine)
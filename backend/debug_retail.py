@@ -6,10 +6,14 @@ Debug script to trace retail data through the pipeline:
 """
 import os
 import glob
+import sys
 import pandas as pd
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend_update")))
+from table_reader import distinct_rest
+
 load_dotenv()
 
 # --- Step 1: Check CSV files for retail/market_type data ---
@@ -45,13 +49,9 @@ url = os.getenv("EXPO_PUBLIC_SUPABASE_URL")
 key = os.getenv("EXPO_PUBLIC_SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
-# Get unique market_type values from CropPrice
-response = supabase.table("CropPrice").select("market_type").limit(10000).execute()
-db_market_types = set()
-for row in response.data:
-    mt = row.get('market_type')
-    if mt:
-        db_market_types.add(mt)
+# Get unique market_type values from CropPrice (every row, not just the first page)
+market_types = distinct_rest(supabase, ["market_type"], table="CropPrice")
+db_market_types = set(market_types["market_type"].dropna())
 
 print(f"Unique market_type values in CropPrice table:")
 for mt in sorted(db_market_types):
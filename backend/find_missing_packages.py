@@ -1,11 +1,20 @@
 """
 Script to find all unique package types in Supabase that are not in package_units.json
+
+A package counts as covered when the shared resolver (backend_update/package_weights.py)
+can weigh it from its name or from package_units.json; package_guess.json is
+regenerated from this list, so guesses do not count.
 """
 import json
 import os
+import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend_update")))
+from package_weights import get_resolver
+from table_reader import distinct_rest
+
 load_dotenv()
 
 # Supabase connection
@@ -13,48 +22,32 @@ url = os.getenv("EXPO_PUBLIC_SUPABASE_URL")
 key = os.getenv("EXPO_PUBLIC_SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
-# Load existing package_units.json
-with open("package_units.json", "r") as f:
-    package_units = json.load(f)
-
-# Create a set of existing (crop, package) combinations
-existing_combos = set()
-for entry in package_units:
-    existing_combos.add((entry["crop"].lower(), entry["package_size"].lower()))
+# Shared package weight resolver (package name, then package_units.json)
+weights = get_resolver()
 
 # Query all unique commodity + package combinations from UnifiedCropPrice
+# (every row, paged by id in parallel — not just the first page)
 print("Fetching unique packages from UnifiedCropPrice...")
-response = supabase.table("UnifiedCropPrice").select("commodity, package").limit(10000).execute()
-
-# Extract unique combinations
-db_combos = set()
-for row in response.data:
-    commodity = row.get("commodity")
-    package = row.get("package")
-    if commodity and package:
-        db_combos.add((commodity, package))
+pairs = distinct_rest(supabase, ["commodity", "package"])
+db_combos = {(c, p) for c, p in pairs.itertuples(index=False, name=None) if c and p}
 
 print(f"Found {len(db_combos)} unique commodity+package combinations in database")
-print(f"Existing in package_units.json: {len(existing_combos)}")
+print(f"Existing in package_units.json: {len(weights.reference)}")
 
 # Find missing packages
 missing = []
 for commodity, package in sorted(db_combos):
-    # Check if any existing entry matches (fuzzy)
-    found = False
-    for existing_crop, existing_pkg in existing_combos:
-        if existing_crop in commodity.lower() or commodity.lower() in existing_crop:
-            if existing_pkg in package.lower() or package.lower() in existing_pkg:
-                found = True
-                break
-    
-    if not found:
+    # Covered if the package name or package_units.json gives it a weight
+    source = weights.resolve(commodity, package)[3]
+    if source not in ("parsed", "reference"):
         missing.append({"commodity": commodity, "package": package})
 
 print(f"\nMissing packages: {len(missing)}")
 print("\n--- Missing Packages ---")
 for m in missing:
-    print(f"  {m['commodity']}: {m['package']}")
+    closest = weights.suggest(m["commodity"], m["package"], limit=1)
+    hint = f"  (closest: {closest[0][1]['crop']} / {closest[0][1]['package_size']})" if closest else ""
+    print(f"  {m['commodity']}: {m['package']}{hint}")
 
 # Save to file for review
 with open("missing_packages.json", "w") as f:
@@ -1,132 +1,56 @@
 """
 Update the weight_lbs, weight_kgs, and units columns in Supabase UnifiedCropPrice table
 based on package_units.json mappings, with package_guess.json as fallback.
+
+Weights come from the shared resolver (backend_update/package_weights.py), the same
+one the uploads use; rows no source knows are left as they are. The rows are
+rewritten in bulk by backend_update/recompute_columns.py (monthly set-based UPDATEs,
+resumable), which also re-derives price_per_lb / price_per_unit. Needs DB_CONNECTION_STRING.
 """
-import json
 import os
-from supabase import create_client, Client
+import sys
+
+import psycopg2
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Supabase connection
-url = os.getenv("EXPO_PUBLIC_SUPABASE_URL")
-key = os.getenv("EXPO_PUBLIC_SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-# Load package_units.json (primary source)
-with open("package_units.json", "r") as f:
-    package_units = json.load(f)
-
-# Load package_guess.json (fallback source) if it exists
-package_guesses = []
-if os.path.exists("package_guess.json"):
-    with open("package_guess.json", "r") as f:
-        package_guesses = json.load(f)
-    print(f"Loaded package_guess.json with {len(package_guesses)} entries")
-
-# Create lookup dictionary: (commodity.lower(), package.lower()) -> (weight_lbs, weight_kg, units, source)
-lookup = {}
-
-# Add primary package_units first
-for entry in package_units:
-    crop = entry["crop"].lower()
-    pkg = entry["package_size"].lower()
-    lookup[(crop, pkg)] = (
-        entry.get("weight_lbs"),
-        entry.get("weight_kg"),
-        entry.get("units"),
-        "package_units.json"
-    )
-
-# Add guesses as fallback (won't overwrite existing)
-for entry in package_guesses:
-    crop = entry["crop"].lower()
-    pkg = entry["package_size"].lower()
-    key = (crop, pkg)
-    if key not in lookup:
-        lookup[key] = (
-            entry.get("weight_lbs"),
-            entry.get("weight_kg"),
-            entry.get("units"),
-            entry.get("source", "package_guess.json")
-        )
-
-print(f"Loaded {len(lookup)} total package weight mappings")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend_update")))
+from package_weights import get_resolver
+from recompute_columns import recompute_pg
 
-# Fetch all UnifiedCropPrice rows
-print("\nFetching UnifiedCropPrice rows...")
-response = supabase.table("UnifiedCropPrice").select("id, commodity, package").limit(50000).execute()
+weights = get_resolver()
+print(f"Loaded {len(weights.reference)} package_units.json and {len(weights.guess)} "
+      "package_guess.json weight mappings")
 
-print(f"Found {len(response.data)} rows to process")
+unmatched = set()
 
-# Match and prepare updates
-updates = []
-unmatched = []
 
-for row in response.data:
-    row_id = row["id"]
-    commodity = (row.get("commodity") or "").lower()
-    package = (row.get("package") or "").lower()
-    
-    # Try exact match first
-    key = (commodity, package)
-    if key in lookup:
-        weight_lbs, weight_kg, units, source = lookup[key]
-        updates.append({
-            "id": row_id,
-            "weight_lbs": weight_lbs,
-            "weight_kgs": weight_kg,
-            "units": units
-        })
-    else:
-        # Try fuzzy match - check if commodity contains or is contained in crop name
-        matched = False
-        for (crop, pkg), (w_lbs, w_kg, u, src) in lookup.items():
-            # Check commodity match (partial)
-            commodity_match = crop in commodity or commodity in crop
-            # Check package match (exact or partial)
-            package_match = pkg == package or pkg in package or package in pkg
-            
-            if commodity_match and package_match:
-                updates.append({
-                    "id": row_id,
-                    "weight_lbs": w_lbs,
-                    "weight_kgs": w_kg,
-                    "units": u
-                })
-                matched = True
-                break
-        
-        if not matched:
-            unmatched.append({"commodity": row.get("commodity"), "package": row.get("package")})
+def resolve(commodity, package):
+    """(weight_lbs, weight_kg, units) for a row's key, or None to leave its rows alone."""
+    weight_lbs, weight_kg, units, source = weights.resolve(commodity, package)
+    if source is None:
+        unmatched.add(((commodity or "").lower(), (package or "").lower()))
+        return None
+    return weight_lbs, weight_kg, units
 
-print(f"\nMatched: {len(updates)} rows")
-print(f"Unmatched: {len(unmatched)} rows")
 
-# Update in batches
-BATCH_SIZE = 100
-updated_count = 0
+db_conn_str = os.getenv("DB_CONNECTION_STRING")
+if not db_conn_str:
+    print("ERROR: DB_CONNECTION_STRING must be set in .env")
+    sys.exit(1)
 
-print(f"\nUpdating Supabase in batches of {BATCH_SIZE}...")
-for i in range(0, len(updates), BATCH_SIZE):
-    batch = updates[i:i+BATCH_SIZE]
-    
-    for update in batch:
-        row_id = update.pop("id")
-        try:
-            supabase.table("UnifiedCropPrice").update(update).eq("id", row_id).execute()
-            updated_count += 1
-        except Exception as e:
-            print(f"  Error updating row {row_id}: {e}")
-    
-    print(f"  Updated {min(i + BATCH_SIZE, len(updates))}/{len(updates)} rows")
+print("\nRecomputing UnifiedCropPrice weight columns...")
+conn = psycopg2.connect(db_conn_str)
+try:
+    updated_count = recompute_pg(conn, resolve=resolve, restart="--restart" in sys.argv)
+finally:
+    conn.close()
 
 print(f"\n✔ Successfully updated {updated_count} rows in UnifiedCropPrice")
 
 # Show unmatched for reference
 if unmatched:
     print(f"\nUnmatched combinations (first 10):")
-    unique_unmatched = list({(u["commodity"], u["package"]) for u in unmatched})[:10]
-    for comm, pkg in unique_unmatched:
+    for comm, pkg in sorted(unmatched)[:10]:
         print(f"  {comm}: {pkg}")
@@ -0,0 +1,187 @@
+"""
+Adaptive batch sizing for SpecialtyCropDashboard uploads.
+
+Every write path used to run on a hard-coded guess: 5,000 rows per psycopg2
+execute_values, 500 / 100 rows per REST insert and one-day slices for the daily
+delete. AdaptiveBatcher replaces those guesses with a feedback loop:
+
+  - after each call it records rows, round-trip time and outcome;
+  - it keeps an EWMA of seconds-per-row and sizes the next batch so that the
+    expected latency lands at TARGET_FRACTION of the server's statement_timeout;
+  - growth is capped per step, a slow-but-successful call trims the size, and a
+    statement timeout halves it immediately.
+
+Each decision is kept in memory and appended to LOG_PATH (JSONL) so the
+throughput a run reached can be inspected afterwards.
+
+    batcher = AdaptiveBatcher("rest_insert", initial=100, minimum=50, maximum=2000)
+    size = batcher.size
+    t0 = time.time(); send(rows[:size]); batcher.record(size, time.time() - t0)
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+# Postgres statement_timeout the server enforces on our role (seconds). The
+# psycopg2 path reads the session's real setting; REST callers rely on this.
+STATEMENT_TIMEOUT_S = float(os.getenv("STATEMENT_TIMEOUT_S", "8"))
+
+# Aim each call at this fraction of the timeout — far enough below it that a
+# slow moment on the server does not tip a batch over.
+TARGET_FRACTION = 0.25
+
+# Decisions are appended here, one JSON object per line.
+LOG_PATH = os.getenv(
+    "BATCH_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "batching.jsonl"),
+)
+
+
+def is_statement_timeout(exc: Exception) -> bool:
+    """True if exc is Postgres cancelling a statement (SQLSTATE 57014), via psycopg2 or REST."""
+    if getattr(exc, "pgcode", None) == "57014":
+        return True
+    msg = str(exc).lower()
+    return "57014" in msg or "statement timeout" in msg or "canceling statement" in msg
+
+
+def pg_statement_timeout_s(cur, default: float = STATEMENT_TIMEOUT_S) -> float:
+    """Read statement_timeout for the current session; 0 (disabled) falls back to default."""
+    cur.execute("SELECT setting::bigint FROM pg_settings WHERE name = 'statement_timeout'")
+    row = cur.fetchone()
+    ms = row[0] if row else 0
+    return ms / 1000.0 if ms else default
+
+
+class AdaptiveBatcher:
+    """
+    Latency-driven batch size controller. Thread-safe, so parallel workers can
+    share one instance and it learns from all of them.
+
+    Args:
+        name: label written with every decision (e.g. "pg_insert", "rest_delete").
+        initial: starting batch size (the old hard-coded value).
+        minimum / maximum: hard bounds on the size.
+        timeout_s: statement_timeout the calls must stay under.
+        unit: what a size counts, for reporting ("rows", "days").
+    """
+
+    GROWTH_CAP = 2.0      # at most double per step
+    SLOW_FRACTION = 0.5   # succeeded, but above half the timeout -> trim
+    SLOW_SHRINK = 0.75
+    TIMEOUT_SHRINK = 0.5
+    ERROR_SHRINK = 0.75
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int,
+                 timeout_s: float = STATEMENT_TIMEOUT_S, unit: str = "rows"):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.timeout_s = timeout_s
+        self.unit = unit
+        self._size = min(max(initial, self.minimum), self.maximum)
+        self._sec_per_item = None
+        self._lock = threading.Lock()
+        self.decisions: list[dict] = []
+        self._logged = 0
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def target_s(self) -> float:
+        return self.timeout_s * TARGET_FRACTION
+
+    def record(self, items: int, seconds: float, ok: bool = True, exc: Exception = None) -> int:
+        """
+        Feed back the outcome of one call and return the next batch size.
+
+        Pass ok=False with the exception for failed calls; a statement timeout
+        shrinks harder than any other error.
+        """
+        with self._lock:
+            before = self._size
+            timeout = bool(exc is not None and is_statement_timeout(exc))
+
+            if ok and items > 0:
+                observed = max(seconds, 1e-6) / items
+                self._sec_per_item = (observed if self._sec_per_item is None else
+                                      self.EWMA_ALPHA * observed
+                                      + (1 - self.EWMA_ALPHA) * self._sec_per_item)
+                if seconds > self.timeout_s * self.SLOW_FRACTION:
+                    proposed = before * self.SLOW_SHRINK
+                else:
+                    proposed = min(self.target_s / self._sec_per_item, before * self.GROWTH_CAP)
+                action = "grow" if proposed > before else "shrink" if proposed < before else "hold"
+            elif timeout:
+                # The call died at the timeout; the true per-item cost is at least this.
+                if items > 0:
+                    floor = self.timeout_s / items
+                    self._sec_per_item = max(self._sec_per_item or 0.0, floor)
+                proposed = before * self.TIMEOUT_SHRINK
+                action = "timeout"
+            else:
+                proposed = before * self.ERROR_SHRINK
+                action = "error"
+
+            self._size = int(min(max(math.floor(proposed), self.minimum), self.maximum))
+            self.decisions.append({
+                "controller": self.name,
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "size": before,
+                "items": items,
+                "seconds": round(seconds, 4),
+                "ok": ok,
+                "action": action,
+                "next_size": self._size,
+                "items_per_s": round(items / seconds, 1) if ok and seconds > 0 else None,
+            })
+            return self._size
+
+    def summary(self) -> dict:
+        """Aggregate throughput over every successful call recorded so far."""
+        with self._lock:
+            done = [d for d in self.decisions if d["ok"]]
+            items = sum(d["items"] for d in done)
+            seconds = sum(d["seconds"] for d in done)
+            return {
+                "controller": self.name,
+                "unit": self.unit,
+                "calls": len(self.decisions),
+                "items": items,
+                "seconds": round(seconds, 2),
+                "items_per_s": round(items / seconds, 1) if seconds else None,
+                "peak_size": max((d["size"] for d in done), default=self._size),
+                "final_size": self._size,
+                "timeouts": sum(d["action"] == "timeout" for d in self.decisions),
+                "errors": sum(d["action"] == "error" for d in self.decisions),
+            }
+
+    def report(self, log_path: str = LOG_PATH):
+        """Print a one-line summary and append every decision to log_path."""
+        s = self.summary()
+        if not s["calls"]:
+            return
+        rate = f"{s['items_per_s']:,.0f} {self.unit}/s" if s["items_per_s"] else "n/a"
+        print(f"  [{self.name}] {s['items']:,} {self.unit} in {s['calls']} calls, {rate}; "
+              f"batch peaked at {s['peak_size']:,}, settled at {s['final_size']:,} "
+              f"({s['timeouts']} timeouts, {s['errors']} errors)")
+
+        if not log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with self._lock, open(log_path, "a") as f:
+                for d in self.decisions[self._logged:]:
+                    f.write(json.dumps({"run": self.started_at, **d}) + "\n")
+                f.write(json.dumps({"run": self.started_at, "summary": s}) + "\n")
+                self._logged = len(self.decisions)
+        except OSError as e:
+            print(f"  ⚠ Could not write batching log {log_path}: {e}")
+
@@ -0,0 +1,671 @@
+"""
+End-to-end benchmark of the UnifiedCropPrice write paths on a local PostgreSQL.
+
+The daily overwrite and the historical backfill can otherwise only be timed
+against the live Supabase project. This harness:
+
+  1. starts a throwaway PostgreSQL server (the pgserver package if installed,
+     else initdb / pg_ctl from PATH; or --dsn for a server you already run);
+  2. creates UnifiedCropPrice with the production columns and its nine
+     indexes (SCHEMA_SQL; --schema-from clones a live table's instead);
+  3. seeds it with --rows synthetic formatted rows spread over --years (COPY);
+  4. daily: formats --daily-rows raw report rows for the last --days, then runs
+     delete_recent_rows() and upload_dataframe() from overwrite_supabse.py with
+     a PgWriter in place of the RestWriter, so the adaptive delete slices and
+     insert batches are the production code;
+  5. backfill: writes --backfill-rows raw rows per slug as *-Full.csv files and
+     runs upload_historical.main() on them (pass its flags with --backfill-args).
+
+Every stage reports its wall time, rows/s, WAL written and index growth, plus
+its index write amplification: the WAL the stage wrote (derived-table refreshes
+excluded) ÷ the WAL the same new rows cost in an unindexed copy of the table. The metrics stages inside
+(format, delete, upload, ...) are printed too (metrics.py), and the result is
+appended to LEDGER_PATH to compare upload strategies offline.
+
+With --derived, the rollup / CPI / cube / summary / notes / sentiment / filter
+index DDL is applied as well and both paths refresh them as in production.
+
+Usage:
+    pip install pgserver              # or put initdb and pg_ctl on PATH
+    python benchmark.py               # 500k rows, daily window + backfill
+    python benchmark.py --rows 3000000 --daily-rows 20000 --backfill-rows 100000
+    python benchmark.py --backfill-args "--workers 4 --upsert" --derived
+    python benchmark.py --schema-from "$DB_CONNECTION_STRING"   # live indexes, no data
+    python benchmark.py --history     # results of earlier runs
+"""
+
+import argparse
+import io
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Batching decisions of benchmark runs go to their own log, never the production
+# one. batching.py binds the path when it is imported, so this comes first.
+BATCH_LOG_PATH = os.getenv(
+    "BENCHMARK_BATCH_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "benchmark_batching.jsonl"),
+)
+os.environ["BATCH_LOG_PATH"] = BATCH_LOG_PATH
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from metrics import add_stage_hook, recorded_run, remove_stage_hook, stage
+from natural_key import INDEX_NAME, with_row_keys
+from rest_writer import dumps
+
+TABLE_NAME = "UnifiedCropPrice"
+
+# Results are appended here, one JSON object per run.
+LEDGER_PATH = os.getenv(
+    "BENCHMARK_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "benchmark.jsonl"),
+)
+
+# Unindexed copy of the table that new rows are re-inserted into, to measure
+# what they cost without the indexes.
+HEAP_ONLY_TABLE = "bench_heap_only"
+
+SEED_CHUNK_ROWS = 200_000
+
+# The production table: documented columns (DATAPIPELINE.md), real price
+# columns (cpi.py), row_key (natural_key.py) and nine indexes — the primary
+# key, one per filter the frontends and pipelines query by, and the natural key.
+SCHEMA_SQL = [
+    f'''CREATE TABLE "{TABLE_NAME}" (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        report_date timestamptz, market_type text, category text, commodity text,
+        variety text, package text, origin text, district text, organic text,
+        price_avg real, low_price real, high_price real, mostly_low_price real,
+        mostly_high_price real, wtd_avg_price real, real_price_avg real, real_price_per_lb real,
+        market_location_name text, item_size text, slug_id text, slug_name text,
+        supply_tone_comments text, demand_tone_comments text, market_tone_comments text,
+        offerings_comments text, reporter_comment text, commodity_comments text,
+        weight_lbs real, weight_kgs real, units real, price_per_lb real, price_per_unit real,
+        row_key text
+    )''',
+    f'CREATE INDEX "{TABLE_NAME}_report_date_idx" ON "{TABLE_NAME}" (report_date)',
+    f'CREATE INDEX "{TABLE_NAME}_commodity_idx" ON "{TABLE_NAME}" (commodity)',
+    f'CREATE INDEX "{TABLE_NAME}_category_idx" ON "{TABLE_NAME}" (category)',
+    f'CREATE INDEX "{TABLE_NAME}_variety_idx" ON "{TABLE_NAME}" (variety)',
+    f'CREATE INDEX "{TABLE_NAME}_package_idx" ON "{TABLE_NAME}" (package)',
+    f'CREATE INDEX "{TABLE_NAME}_district_idx" ON "{TABLE_NAME}" (district)',
+    f'CREATE INDEX "{TABLE_NAME}_slug_id_report_date_idx" ON "{TABLE_NAME}" (slug_id, report_date)',
+    f'CREATE UNIQUE INDEX "{INDEX_NAME}" ON "{TABLE_NAME}" (report_date, row_key)',
+]
+
+# Roles the Supabase DDL grants to (--derived).
+SUPABASE_ROLES = ("anon", "authenticated", "service_role")
+
+SLUGS = {"2306": "Terminal", "2307": "Terminal", "2308": "Shipping Point", "2309": "Shipping Point",
+         "2390": "Retail", "2391": "Retail", "3324": "Terminal"}
+COMMODITIES = [("APPLES", "FRUITS"), ("PEARS", "FRUITS"), ("STRAWBERRIES", "FRUITS"),
+               ("BLUEBERRIES", "FRUITS"), ("GRAPES", "FRUITS"), ("LEMONS", "FRUITS"),
+               ("LETTUCE, ICEBERG", "VEGETABLES"), ("BROCCOLI", "VEGETABLES"),
+               ("CARROTS", "VEGETABLES"), ("TOMATOES", "VEGETABLES"), ("PEPPERS, BELL", "VEGETABLES"),
+               ("ONIONS DRY", "ONIONS AND POTATOES"), ("POTATOES", "ONIONS AND POTATOES"),
+               ("ALMONDS", "NUTS"), ("WALNUTS", "NUTS")]
+PACKAGES = ["40 lb cartons", "cartons tray pack", "flats 12 1-pint baskets", "each",
+            "25 lb sacks", "50 lb sacks", "cartons 24s", "flats 8 1-lb containers",
+            "1 1/9 bushel cartons", "cartons 12 2-lb film bags"]
+VARIETIES = ["GALA", "FUJI", "RED DELICIOUS", "ROMA", "RUSSET", None]
+ORIGINS = ["WASHINGTON", "CALIFORNIA", "MEXICO", "FLORIDA", "IDAHO", "CHILE", "OREGON", "TEXAS"]
+DISTRICTS = ["YAKIMA VALLEY", "SALINAS-WATSONVILLE", "CENTRAL MEXICO", "SOUTH FLORIDA",
+             "IDAHO AND MALHEUR", "IMPORTED", "COLUMBIA BASIN", None]
+LOCATIONS = ["ATLANTA", "BOSTON", "CHICAGO", "DALLAS", "DETROIT", "LOS ANGELES", "MIAMI",
+             "NEW YORK", "PHILADELPHIA", "SAN FRANCISCO"]
+SIZES = ["LG", "MED", "SML", "XL", None]
+TONES = ["Market steady.", "Prices higher, demand good.", "Lower, weak demand.",
+         "Slightly higher; supplies light.", "About steady, demand moderate.", None]
+
+
+# ── Local server ──────────────────────────────────────────────────────────────
+
+class LocalPostgres:
+    """A throwaway PostgreSQL cluster in data_dir: pgserver if installed, else initdb / pg_ctl."""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._server = None
+        self.dsn = None
+
+    def start(self) -> str:
+        try:
+            import pgserver
+        except ImportError:
+            pgserver = None
+        if pgserver is not None:
+            self._server = pgserver.get_server(self.data_dir, cleanup_mode="stop")
+            self.dsn = self._server.get_uri()
+            return self.dsn
+
+        initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+        if not (initdb and pg_ctl):
+            raise RuntimeError("No local PostgreSQL: run `pip install pgserver`, put initdb and "
+                               "pg_ctl on PATH, or pass --dsn")
+        pgdata = os.path.join(self.data_dir, "pgdata")
+        if not os.path.exists(pgdata):
+            subprocess.run([initdb, "-D", pgdata, "-U", "postgres", "-A", "trust"],
+                           check=True, capture_output=True)
+        subprocess.run([pg_ctl, "-D", pgdata, "-w", "-l", os.path.join(self.data_dir, "server.log"),
+                        "-o", f"-k {self.data_dir} -c listen_addresses=''", "start"],
+                       check=True, capture_output=True)
+        self.dsn = f"postgresql://postgres@/postgres?host={self.data_dir}"
+        return self.dsn
+
+    def stop(self):
+        if self._server is not None:
+            self._server.cleanup()
+        elif self.dsn:
+            subprocess.run([shutil.which("pg_ctl"), "-D", os.path.join(self.data_dir, "pgdata"),
+                            "-m", "fast", "stop"], capture_output=True)
+
+
+# ── Schema ────────────────────────────────────────────────────────────────────
+
+def live_schema_sql(dsn: str) -> list[str]:
+    """CREATE TABLE + index statements reproducing a live table's columns and indexes."""
+    import psycopg2
+    from partitioning import _index_sql, index_definitions
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT a.attname, format_type(a.atttypid, a.atttypmod), a.attidentity "
+                "FROM pg_attribute a WHERE a.attrelid = %s::regclass "
+                "AND a.attnum > 0 AND NOT a.attisdropped ORDER BY a.attnum",
+                (f'public."{TABLE_NAME}"',),
+            )
+            columns = [f'"{name}" {kind}' + (" GENERATED BY DEFAULT AS IDENTITY" if ident else "")
+                       for name, kind, ident in cur.fetchall()]
+            indexes = index_definitions(cur, TABLE_NAME)
+    finally:
+        conn.close()
+    return ([f'CREATE TABLE "{TABLE_NAME}" ({", ".join(columns)})']
+            + [_index_sql(idx, TABLE_NAME, idx["name"]) for idx in indexes])
+
+
+def create_schema(conn, schema: list[str], derived: bool):
+    with conn.cursor() as cur:
+        cur.execute(f'DROP TABLE IF EXISTS "{TABLE_NAME}" CASCADE')
+        cur.execute(f'DROP TABLE IF EXISTS "{HEAP_ONLY_TABLE}"')
+        for sql in schema:
+            cur.execute(sql)
+        cur.execute(f'CREATE TABLE "{HEAP_ONLY_TABLE}" (LIKE "{TABLE_NAME}")')
+        cur.execute("SELECT count(*) FROM pg_index WHERE indrelid = %s::regclass",
+                    (f'public."{TABLE_NAME}"',))
+        print(f"  ✔ {TABLE_NAME} created with {cur.fetchone()[0]} indexes")
+        if not derived:
+            return
+        for role in SUPABASE_ROLES:
+            cur.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (role,))
+            if not cur.fetchone():
+                cur.execute(f"CREATE ROLE {role} NOLOGIN")
+        import cpi, filter_index, market_notes, price_summary, rollups, segment_cube, sentiment
+        for module in (rollups, cpi, segment_cube, price_summary, market_notes, sentiment, filter_index):
+            for sql in module.ddl():
+                cur.execute(sql)
+        print("  ✔ Derived tables and refresh functions created")
+    if derived:
+        from cpi import sync_cpi_pg
+        sync_cpi_pg(conn)
+
+
+def table_columns(conn) -> list[str]:
+    from upload_historical import get_table_columns_pg
+    with conn.cursor() as cur:
+        return get_table_columns_pg(cur)
+
+
+# ── Synthetic data ────────────────────────────────────────────────────────────
+
+def _pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def raw_rows(rng, n: int, start: date, end: date, slugs: list[str]) -> pd.DataFrame:
+    """USDA MARS report rows, as get_recent_data.py saves them, dated in [start, end]."""
+    days = rng.integers(0, max((end - start).days, 0) + 1, n)
+    when = pd.to_datetime(start) + pd.to_timedelta(days, unit="D")
+    commodity = rng.integers(0, len(COMMODITIES), n)
+    low = np.round(rng.uniform(5, 60, n), 2)
+    slug = _pick(rng, slugs, n)
+    return pd.DataFrame({
+        "report_date": when.strftime("%m/%d/%Y"),
+        "report_end_date": when.strftime("%m/%d/%Y"),
+        "market_type": [SLUGS.get(s, "Terminal") for s in slug],
+        "community": [COMMODITIES[i][1] for i in commodity],
+        "commodity": [COMMODITIES[i][0] for i in commodity],
+        "variety": _pick(rng, VARIETIES, n),
+        "package": _pick(rng, PACKAGES, n),
+        "origin": _pick(rng, ORIGINS, n),
+        "district": _pick(rng, DISTRICTS, n),
+        "organic": _pick(rng, ["N", "Y"], n),
+        "low_price": low,
+        "high_price": low + np.round(rng.uniform(0, 8, n), 2),
+        "mostly_low_price": low + 1,
+        "mostly_high_price": low + 3,
+        "slug_id": slug.astype(int),
+        "slug_name": [f"Report {s}" for s in slug],
+        "market_location_name": _pick(rng, LOCATIONS, n),
+        "item_size": _pick(rng, SIZES, n),
+        "market_tone_comments": _pick(rng, TONES, n),
+        "supply_tone_comments": _pick(rng, TONES, n),
+    })
+
+
+def formatted_rows(rng, n: int, start: date, end: date, slugs: list[str]) -> pd.DataFrame:
+    """Rows as format_for_unified_crop_price() leaves them, built column-wise (for seeding)."""
+    raw = raw_rows(rng, n, start, end, slugs)
+    title = lambda s: s.str.title()  # noqa: E731
+    weight = rng.choice([np.nan, 10.0, 25.0, 40.0, 50.0], n)
+    price = ((raw["low_price"] + raw["high_price"] + raw["mostly_low_price"]
+              + raw["mostly_high_price"]) / 4).round(2)
+    return pd.DataFrame({
+        "report_date": pd.to_datetime(raw["report_date"], format="%m/%d/%Y").dt.strftime("%Y-%m-%d"),
+        "market_type": raw["market_type"],
+        "category": title(raw["community"]).str.replace("Onions And Potatoes", "Potatoes & Onions"),
+        "commodity": title(raw["commodity"]),
+        "variety": title(raw["variety"]),
+        "package": title(raw["package"]),
+        "origin": title(raw["origin"]),
+        "district": title(raw["district"]),
+        "organic": np.where(raw["organic"] == "Y", "yes", "no"),
+        "price_avg": price,
+        "low_price": raw["low_price"],
+        "high_price": raw["high_price"],
+        "mostly_low_price": raw["mostly_low_price"],
+        "mostly_high_price": raw["mostly_high_price"],
+        "market_location_name": raw["market_location_name"],
+        "item_size": raw["item_size"],
+        "slug_id": raw["slug_id"].astype(str),
+        "slug_name": raw["slug_name"],
+        "market_tone_comments": raw["market_tone_comments"],
+        "supply_tone_comments": raw["supply_tone_comments"],
+        "weight_lbs": weight,
+        "weight_kgs": (weight * 0.45359237).round(3),
+        "price_per_lb": (price / weight).round(2),
+    })
+
+
+def seed(conn, rng, rows: int, start: date, end: date, slugs: list[str]) -> int:
+    """COPY rows formatted rows into the table, SEED_CHUNK_ROWS at a time."""
+    from upload_historical import align_df_to_columns
+
+    cols = table_columns(conn)
+    copied = 0
+    while copied < rows:
+        n = min(SEED_CHUNK_ROWS, rows - copied)
+        df = align_df_to_columns(with_row_keys(formatted_rows(rng, n, start, end, slugs)), cols)
+        buf = io.StringIO()
+        df.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        with conn.cursor() as cur:
+            cur.copy_expert(f'COPY "{TABLE_NAME}" ({", ".join(cols)}) FROM STDIN WITH (FORMAT csv)', buf)
+        copied += n
+        print(f"  seeded {copied:,}/{rows:,}")
+    with conn.cursor() as cur:
+        cur.execute(f'VACUUM ANALYZE "{TABLE_NAME}"')
+    return copied
+
+
+# ── PostgREST stand-in ────────────────────────────────────────────────────────
+
+class PgWriter:
+    """
+    RestWriter's insert / delete over psycopg2, so the daily code path runs
+    unchanged against a local database. Each call commits on its own, like a
+    PostgREST request; records are still serialised to JSON, so that client
+    cost stays in the measurement.
+    """
+
+    _OPS = {"eq": "=", "gte": ">=", "gt": ">", "lte": "<=", "lt": "<", "neq": "<>"}
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.requests = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+
+    def insert(self, table: str, records: list[dict], on_conflict: str = None) -> int:
+        from psycopg2.extras import execute_values
+
+        if not records:
+            return 0
+        body = dumps(records)
+        cols = list(records[0])
+        quoted = ", ".join(f'"{c}"' for c in cols)
+        sql = f'INSERT INTO "{table}" ({quoted}) VALUES %s'
+        if on_conflict:
+            keys = on_conflict.split(",")
+            updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in cols if c not in keys)
+            sql += f' ON CONFLICT ({", ".join(keys)}) ' + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+        with self.conn.cursor() as cur:
+            execute_values(cur, sql, [tuple(r[c] for c in cols) for r in records], page_size=len(records))
+            written = cur.rowcount
+        self.conn.commit()
+        self._account(body)
+        return written
+
+    def delete(self, table: str, filters: dict) -> int:
+        clauses, params = [], []
+        for col, fs in filters.items():
+            for f in ([fs] if isinstance(fs, str) else fs):
+                op, value = f.split(".", 1)
+                clauses.append(f'"{col}" {self._OPS[op]} %s')
+                params.append(value)
+        with self.conn.cursor() as cur:
+            cur.execute(f'DELETE FROM "{table}" WHERE {" AND ".join(clauses)}', params)
+            deleted = cur.rowcount
+        self.conn.commit()
+        self._account(b"")
+        return deleted
+
+    def _account(self, body: bytes):
+        self.requests += 1
+        self.raw_bytes += len(body)
+        self.sent_bytes += len(body)
+
+    def report(self):
+        if self.requests:
+            print(f"  [pg] {self.requests:,} requests, {self.raw_bytes / 1_048_576:.2f} MB JSON")
+
+
+# ── Measurement ───────────────────────────────────────────────────────────────
+
+class Bench:
+    """Runs stages on one server and records what each one cost."""
+
+    def __init__(self, dsn: str):
+        import psycopg2
+
+        self.dsn = dsn
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+        self.stages: list[dict] = []
+        self._refresh_wal = 0
+
+    def _query(self, sql: str, params=None):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def relation_sizes(self) -> dict[str, int]:
+        """Bytes of the table and each of its indexes."""
+        return dict(self._query(
+            "SELECT c.relname, pg_relation_size(c.oid) FROM pg_class c "
+            "WHERE c.oid = %(t)s::regclass "
+            "OR c.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = %(t)s::regclass)",
+            {"t": f'public."{TABLE_NAME}"'},
+        ))
+
+    def wal_lsn(self) -> str:
+        return self._query("SELECT pg_current_wal_insert_lsn()")[0][0]
+
+    def wal_since(self, lsn: str) -> int:
+        return int(self._query("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)", (lsn,))[0][0])
+
+    def heap_only_wal(self, after_id: int) -> int:
+        """WAL for re-inserting the rows with id > after_id into an unindexed copy."""
+        self._query(f'TRUNCATE "{HEAP_ONLY_TABLE}"; CHECKPOINT; SELECT 1')
+        lsn = self.wal_lsn()
+        with self.conn.cursor() as cur:
+            cur.execute(f'INSERT INTO "{HEAP_ONLY_TABLE}" SELECT * FROM "{TABLE_NAME}" WHERE id > %s',
+                        (after_id,))
+        wal = self.wal_since(lsn)
+        self._query(f'TRUNCATE "{HEAP_ONLY_TABLE}"; SELECT 1')
+        return wal
+
+    @contextmanager
+    def _refresh_hook(self, name: str, slug: str = None):
+        """metrics stage hook: the WAL of derived-table refreshes, kept out of the amplification."""
+        if name != "refresh":
+            yield
+            return
+        lsn = self.wal_lsn()
+        try:
+            yield
+        finally:
+            self._refresh_wal += self.wal_since(lsn)
+
+    @contextmanager
+    def measure(self, name: str):
+        """Time the block; record its rows, WAL, index growth and write amplification."""
+        self._query("CHECKPOINT; SELECT 1")
+        max_id = self._query(f'SELECT coalesce(max(id), 0) FROM "{TABLE_NAME}"')[0][0]
+        rows_before = self._query(f'SELECT count(*) FROM "{TABLE_NAME}"')[0][0]
+        sizes = self.relation_sizes()
+        lsn = self.wal_lsn()
+        print(f"\n{'─' * 60}\n{name}\n{'─' * 60}")
+        rec = {"stage": name}
+        self._refresh_wal = 0
+        add_stage_hook(self._refresh_hook)
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            remove_stage_hook(self._refresh_hook)
+        rec["seconds"] = round(time.perf_counter() - t0, 3)
+        rec["refresh_wal_bytes"] = self._refresh_wal
+        rec["wal_bytes"] = self.wal_since(lsn) - self._refresh_wal
+        after = self.relation_sizes()
+        rec["inserted"] = self._query(f'SELECT count(*) FROM "{TABLE_NAME}" WHERE id > %s', (max_id,))[0][0]
+        rec["deleted"] = rows_before + rec["inserted"] - self._query(f'SELECT count(*) FROM "{TABLE_NAME}"')[0][0]
+        rec["heap_growth"] = after.get(TABLE_NAME, 0) - sizes.get(TABLE_NAME, 0)
+        rec["index_growth"] = {k: v - sizes.get(k, 0) for k, v in after.items() if k != TABLE_NAME}
+        if rec["inserted"]:
+            rec["heap_only_wal"] = self.heap_only_wal(max_id)
+            rec["amplification"] = round(rec["wal_bytes"] / max(rec["heap_only_wal"], 1), 2)
+        self.stages.append(rec)
+
+    def report(self):
+        print(f"\n{'=' * 60}\nBENCHMARK\n{'=' * 60}")
+        print(f"{'stage':<10} {'seconds':>8} {'inserted':>10} {'deleted':>10} {'rows/s':>9} "
+              f"{'WAL MB':>8} {'WAL B/row':>9} {'index MB':>9} {'amplif.':>8}")
+        for s in self.stages:
+            rows = s["inserted"] + s["deleted"]
+            rate = rows / s["seconds"] if s["seconds"] else 0
+            index_mb = sum(s["index_growth"].values()) / 1_048_576
+            print(f"{s['stage']:<10} {s['seconds']:>8.1f} {s['inserted']:>10,} {s['deleted']:>10,} "
+                  f"{rate:>9,.0f} {s['wal_bytes'] / 1_048_576:>8.1f} "
+                  f"{s['wal_bytes'] / max(rows, 1):>9,.0f} {index_mb:>9.1f} "
+                  f"{str(s.get('amplification', '-')) + '×':>8}")
+        sizes = self.relation_sizes()
+        print(f"\n{'relation':<48} {'MB':>8}   growth per stage (MB)")
+        for name, size in sorted(sizes.items(), key=lambda kv: kv[0] != TABLE_NAME):
+            growth = "  ".join(
+                f"{s['stage']} {(s['heap_growth'] if name == TABLE_NAME else s['index_growth'].get(name, 0)) / 1_048_576:.1f}"
+                for s in self.stages)
+            print(f"{name:<48} {size / 1_048_576:>8.1f}   {growth}")
+        print("\nWAL excludes derived-table refreshes; amplif. = that WAL (deletes included) "
+              "÷ WAL of the stage's new rows in an unindexed copy")
+
+    def close(self):
+        self.conn.close()
+
+
+# ── Stages ────────────────────────────────────────────────────────────────────
+
+def run_daily(bench: Bench, rng, rows: int, days: int, slugs: list[str], derived: bool):
+    """The replace-mode body of overwrite_supabase_data() through a PgWriter."""
+    import psycopg2
+    from format_data import format_for_unified_crop_price
+    from overwrite_supabse import delete_recent_rows, upload_dataframe
+    from upload_historical import align_df_to_columns
+
+    today = datetime.utcnow().date()
+    raw = raw_rows(rng, rows, today - timedelta(days=days), today, slugs)
+    with stage("format") as s:
+        df = format_for_unified_crop_price(raw)
+        s.count(input_rows=len(raw), rows=len(df))
+    # The table has row_key, so replace mode keys rows too. Pass-through
+    # columns the table lacks are dropped here, not added by detect_new_columns().
+    df = align_df_to_columns(with_row_keys(df), table_columns(bench.conn))
+
+    conn = psycopg2.connect(bench.dsn)
+    writer = PgWriter(conn)
+    try:
+        oldest = pd.to_datetime(df["report_date"]).min().date()
+        with stage("delete"):
+            delete_recent_rows(None, TABLE_NAME, days=max((today - oldest).days, 0), writer=writer)
+        with stage("upload"):
+            upload_dataframe(None, TABLE_NAME, df, writer=writer)
+        if derived:
+            from cpi import refresh_real_prices_pg
+            from filter_index import merge_filter_index
+            from market_notes import refresh_notes_pg
+            from price_summary import refresh_summary_pg
+            from rollups import refresh_rollups_pg
+            from segment_cube import refresh_cube_pg
+            from sentiment import refresh_sentiment_pg
+
+            window = (oldest, today + timedelta(days=7))
+            with stage("refresh"):
+                refresh_real_prices_pg(conn, *window)
+                refresh_rollups_pg(conn, *window)
+                refresh_cube_pg(conn, oldest)
+                refresh_summary_pg(conn)
+                refresh_notes_pg(conn, *window)
+                refresh_sentiment_pg(conn, *window)
+                merge_filter_index(writer, df)
+        writer.report()
+    finally:
+        conn.close()
+
+
+def run_backfill(bench: Bench, rng, rows: int, start: date, slugs: list[str], argv: list[str],
+                 work_dir: str):
+    """upload_historical.main() over generated *-Full.csv files, on the local server."""
+    import upload_historical
+
+    full_dir = os.path.join(work_dir, "SlugIDFullFile")
+    os.makedirs(full_dir, exist_ok=True)
+    end = upload_historical.CUTOFF_DATE - timedelta(days=1)
+    for slug in slugs:
+        raw_rows(rng, rows, start, end, [slug]).to_csv(
+            os.path.join(full_dir, f"{slug}-Full.csv"), index=False)
+
+    upload_historical.FULL_FILE_DIR = full_dir
+    saved_argv = sys.argv
+    sys.argv = ["upload_historical.py", *argv]
+    try:
+        upload_historical.main()
+    finally:
+        sys.argv = saved_argv
+
+
+# ── History ───────────────────────────────────────────────────────────────────
+
+def print_history(path: str = LEDGER_PATH, last: int = 10):
+    if not os.path.exists(path):
+        print(f"No benchmarks recorded in {path}")
+        return
+    with open(path) as f:
+        runs = [json.loads(line) for line in f if line.strip()][-last:]
+    print(f"{'run':<19} {'commit':<9} {'seed rows':>10} {'stage':<10} {'seconds':>8} "
+          f"{'rows/s':>9} {'amplif.':>8}  options")
+    for r in runs:
+        for s in r["stages"]:
+            rows = s["inserted"] + s["deleted"]
+            print(f"{r['run']:<19} {r.get('commit') or '-':<9} {r['rows']:>10,} {s['stage']:<10} "
+                  f"{s['seconds']:>8.1f} {rows / max(s['seconds'], 1e-9):>9,.0f} "
+                  f"{str(s.get('amplification', '-')) + '×':>8}  {r.get('backfill_args', '')}")
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the daily overwrite and the backfill "
+                                                 "against a local PostgreSQL")
+    parser.add_argument("--dsn", help="Use this server instead of starting one (its "
+                                      f'"{TABLE_NAME}" is dropped and recreated)')
+    parser.add_argument("--data-dir", help="Cluster directory (default: a temporary directory)")
+    parser.add_argument("--schema-from", metavar="DSN",
+                        help="Clone the columns and indexes of this database's table")
+    parser.add_argument("--rows", type=int, default=500_000, help="Rows to seed (default: 500000)")
+    parser.add_argument("--years", type=int, default=10, help="Years the seed spans (default: 10)")
+    parser.add_argument("--daily-rows", type=int, default=20_000,
+                        help="Raw rows in the daily window (default: 20000)")
+    parser.add_argument("--days", type=int, default=30, help="Daily window in days (default: 30)")
+    parser.add_argument("--backfill-rows", type=int, default=20_000,
+                        help="Raw rows per slug file for the backfill (default: 20000; 0 skips it)")
+    parser.add_argument("--backfill-args", default="",
+                        help='Flags for upload_historical.py, e.g. "--workers 4 --upsert"')
+    parser.add_argument("--slugs", default="2306,2308,2390", help="Slugs to generate (default: 2306,2308,2390)")
+    parser.add_argument("--derived", action="store_true",
+                        help="Create the derived tables and refresh them as production does")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--history", action="store_true", help="Print earlier results and exit")
+    args = parser.parse_args()
+
+    if args.history:
+        print_history()
+        return
+
+    slugs = [s.strip() for s in args.slugs.split(",") if s.strip()]
+    rng = np.random.default_rng(args.seed)
+    schema = live_schema_sql(args.schema_from) if args.schema_from else SCHEMA_SQL
+    work_dir = args.data_dir or tempfile.mkdtemp(prefix="ucp-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+
+    server = None
+    if args.dsn:
+        dsn = args.dsn
+    else:
+        server = LocalPostgres(os.path.join(work_dir, "cluster"))
+        dsn = server.start()
+        print(f"  ✔ Local PostgreSQL at {dsn}")
+    # Every module reading DB_CONNECTION_STRING (upload_historical, the refreshes)
+    # must see the local server, never the .env one.
+    os.environ["DB_CONNECTION_STRING"] = dsn
+    os.environ["SUPABASE_URL"] = ""
+
+    bench = Bench(dsn)
+    try:
+        create_schema(bench.conn, schema, args.derived)
+        today = datetime.utcnow().date()
+        start = today.replace(year=today.year - args.years, month=1, day=1)
+        with recorded_run("benchmark", ledger_path=""):
+            with bench.measure("seed"):
+                seed(bench.conn, rng, args.rows, start, today, slugs)
+            with bench.measure("daily"):
+                run_daily(bench, rng, args.daily_rows, args.days, slugs, args.derived)
+            if args.backfill_rows:
+                with bench.measure("backfill"):
+                    run_backfill(bench, rng, args.backfill_rows, start, slugs,
+                                 shlex.split(args.backfill_args), work_dir)
+        bench.report()
+
+        from metrics import _git_commit
+        record = {"run": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                  "rows": args.rows, "daily_rows": args.daily_rows, "backfill_rows": args.backfill_rows,
+                  "backfill_args": args.backfill_args, "derived": args.derived,
+                  "schema_from": bool(args.schema_from), "stages": bench.stages}
+        try:
+            os.makedirs(os.path.dirname(LEDGER_PATH), exist_ok=True)
+            with open(LEDGER_PATH, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            print(f"Appended to {LEDGER_PATH}")
+        except OSError as e:
+            print(f"  ⚠ Could not write {LEDGER_PATH}: {e}")
+    finally:
+        bench.close()
+        if server is not None:
+            server.stop()
+        if not args.data_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+CPI-U store and real-dollar price columns.
+
+The frontends deflate every chart point themselves (cpiAdjust.js), looking
+each month up in cpiData.js, which update_cpi.py used to patch with regex
+edits. The series now lives in cpi_u.json next to this file, and the pipeline
+keeps the deflated prices in the database:
+
+    cpi_u.json          month -> CPI-U value, plus real_base, the month whose
+                        dollars real prices are expressed in
+    CpiMonthly          the same series as (month, cpi, deflator), where
+                        deflator = CPI(real_base) / CPI(month)
+    UnifiedCropPrice    real_price_avg, real_price_per_lb = price x deflator
+                        of the row's month, rounded to the cent like the
+                        nominal prices
+
+refresh_real_prices(from, to) sets the real columns with one UPDATE ... FROM
+CpiMonthly joined on the row's month, skipping rows whose values are already
+right. The rollups aggregate the real columns like the nominal ones.
+
+real_base is fixed, so a new CPI month only touches the rows of that month:
+sync_cpi_* upserts the months whose value changed and refreshes the real
+columns and rollups of just those months. Changing real_base (`--rebase`)
+changes every deflator and so rewrites every row, once. Months without a CPI
+value yet (the current one, until BLS publishes it) keep NULL real prices.
+
+with_real_prices(df) is the same computation for a local frame, as one merge
+on month.
+
+Usage:
+    python cpi.py --ddl                      # print table + function SQL
+    python cpi.py --apply                    # create them via DB_CONNECTION_STRING
+    python cpi.py --sync                     # push cpi_u.json, refresh the months that changed
+    python cpi.py --rebuild                  # recompute every row's real prices
+    python cpi.py --rebase 2026-02           # express real prices in another month's dollars
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from rollups import REAL_PRICE_COLUMNS, full_range_pg, month_slices
+
+TABLE_NAME = "UnifiedCropPrice"
+CPI_TABLE = "CpiMonthly"
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cpi_u.json")
+
+REFRESH_FUNCTION = "refresh_real_prices"
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+# ─── Store ──────────────────────────────────────────────────────────────────
+
+def load_store(path: str = STORE_PATH) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_store(store: dict, path: str = STORE_PATH):
+    store["values"] = dict(sorted(store["values"].items()))
+    with open(path, "w") as f:
+        json.dump(store, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def latest_month(store: dict) -> str:
+    return max(store["values"])
+
+
+def cpi_rows(store: dict) -> list[tuple[date, float, float]]:
+    """(first of month, cpi, deflator to real_base dollars) for every month in the store."""
+    base = store["values"][store["real_base"]]
+    return [(date.fromisoformat(f"{month}-01"), value, base / value)
+            for month, value in sorted(store["values"].items())]
+
+
+def with_real_prices(df: pd.DataFrame, store: dict = None) -> pd.DataFrame:
+    """df with the REAL_PRICE_COLUMNS added, joined to the store on report month."""
+    rows = cpi_rows(store or load_store())
+    deflators = pd.Series([d for _, _, d in rows],
+                          index=pd.PeriodIndex([m for m, _, _ in rows], freq="M"))
+    dates = pd.to_datetime(df["report_date"], errors="coerce", utc=True).dt.tz_localize(None)
+    factor = deflators.reindex(dates.dt.to_period("M")).to_numpy()
+    out = df.copy()
+    for real, nominal in REAL_PRICE_COLUMNS.items():
+        out[real] = (pd.to_numeric(out[nominal], errors="coerce") * factor).round(2)
+    return out
+
+
+# ─── Database ───────────────────────────────────────────────────────────────
+
+def _table_sql() -> list[str]:
+    roles = ", ".join(READ_ROLES)
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{CPI_TABLE}" (\n'
+        f"    month date PRIMARY KEY,\n    cpi double precision NOT NULL,\n"
+        f"    deflator double precision NOT NULL\n)",
+        f'ALTER TABLE "{CPI_TABLE}" ENABLE ROW LEVEL SECURITY',
+        f'DROP POLICY IF EXISTS "{CPI_TABLE} read" ON "{CPI_TABLE}"',
+        f'CREATE POLICY "{CPI_TABLE} read" ON "{CPI_TABLE}" FOR SELECT TO {roles} USING (true)',
+        f'GRANT SELECT ON "{CPI_TABLE}" TO {roles}',
+        *(f'ALTER TABLE "{TABLE_NAME}" ADD COLUMN IF NOT EXISTS {c} real' for c in REAL_PRICE_COLUMNS),
+    ]
+
+
+def function_sql() -> str:
+    """refresh_real_prices(from_date, to_date): re-deflate the rows of [from, to]."""
+    new = {real: f"round((u.{nominal} * c.deflator)::numeric, 2)::real"
+           for real, nominal in REAL_PRICE_COLUMNS.items()}
+    assignments = ",\n        ".join(f"{real} = {value}" for real, value in new.items())
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}(from_date date, to_date date)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+SET timezone = 'UTC'
+AS $$
+DECLARE
+    n integer;
+BEGIN
+    UPDATE "{TABLE_NAME}" u SET
+        {assignments}
+    FROM "{CPI_TABLE}" c
+    WHERE c.month = date_trunc('month', u.report_date)::date
+      AND u.report_date >= from_date AND u.report_date < to_date + 1
+      AND ({", ".join(f"u.{c}" for c in new)}) IS DISTINCT FROM
+          ({", ".join(new.values())});
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = _table_sql()
+    stmts.append(function_sql())
+    signature = f"{REFRESH_FUNCTION}(date, date)"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {signature} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {signature} TO {WRITE_ROLE}")
+    return stmts
+
+
+def _changed(current: dict, rows: list[tuple]) -> list[tuple]:
+    """Store rows whose month is missing from, or differs in, the table."""
+    return [r for r in rows
+            if r[0] not in current
+            or abs(current[r[0]][0] - r[1]) > 1e-9 or abs(current[r[0]][1] - r[2]) > 1e-12]
+
+
+def refresh_real_prices_pg(conn, start: date, end: date) -> int:
+    """Re-deflate report days in [start, end], one month per transaction."""
+    total = 0
+    t0 = time.time()
+    with conn.cursor() as cur:
+        for lo, hi in month_slices(start, end):
+            cur.execute(f"SELECT {REFRESH_FUNCTION}(%s, %s)", (lo, hi))
+            total += cur.fetchone()[0]
+            conn.commit()
+    print(f"  ✔ Real prices refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_real_prices_rest(client, start: date, end: date) -> int:
+    """Same as refresh_real_prices_pg, through PostgREST RPC."""
+    total = 0
+    t0 = time.time()
+    for lo, hi in month_slices(start, end):
+        res = client.rpc(REFRESH_FUNCTION, {
+            "from_date": lo.isoformat(), "to_date": hi.isoformat(),
+        }).execute()
+        total += int(res.data or 0)
+    print(f"  ✔ Real prices refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def _month_end(month: date) -> date:
+    return (pd.Timestamp(month) + pd.offsets.MonthEnd(0)).date()
+
+
+def sync_cpi_pg(conn, store: dict = None) -> list[date]:
+    """
+    Upsert the store into CpiMonthly and refresh the real prices and rollups of
+    the months whose CPI or deflator changed. Returns those months.
+    """
+    from psycopg2.extras import execute_values
+    from rollups import refresh_rollups_pg
+
+    rows = cpi_rows(store or load_store())
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT month, cpi, deflator FROM "{CPI_TABLE}"')
+        current = {m: (c, d) for m, c, d in cur.fetchall()}
+        changed = _changed(current, rows)
+        if changed:
+            execute_values(cur, f'INSERT INTO "{CPI_TABLE}" (month, cpi, deflator) VALUES %s '
+                                "ON CONFLICT (month) DO UPDATE SET cpi = excluded.cpi, "
+                                "deflator = excluded.deflator", changed)
+    conn.commit()
+    months = [m for m, _, _ in changed]
+    print(f"  ✔ {CPI_TABLE}: {len(rows)} months, {len(months)} new or changed")
+    for month in months:
+        if refresh_real_prices_pg(conn, month, _month_end(month)):
+            refresh_rollups_pg(conn, month, _month_end(month))
+    return months
+
+
+def sync_cpi_rest(client, store: dict = None) -> list[date]:
+    """Same as sync_cpi_pg, through PostgREST."""
+    from rollups import refresh_rollups_rest
+
+    rows = cpi_rows(store or load_store())
+    data = client.table(CPI_TABLE).select("month,cpi,deflator").execute().data or []
+    current = {date.fromisoformat(r["month"]): (r["cpi"], r["deflator"]) for r in data}
+    changed = _changed(current, rows)
+    if changed:
+        client.table(CPI_TABLE).upsert(
+            [{"month": m.isoformat(), "cpi": c, "deflator": d} for m, c, d in changed],
+            on_conflict="month",
+        ).execute()
+    months = [m for m, _, _ in changed]
+    print(f"  ✔ {CPI_TABLE}: {len(rows)} months, {len(months)} new or changed")
+    for month in months:
+        if refresh_real_prices_rest(client, month, _month_end(month)):
+            refresh_rollups_rest(client, month, _month_end(month))
+    return months
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPI-U store and real-dollar price columns")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the table and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--sync", action="store_true", help="Push cpi_u.json and refresh the months that changed")
+    group.add_argument("--rebuild", action="store_true", help="Recompute the real prices of every row")
+    group.add_argument("--rebase", metavar="YYYY-MM", help="Set the month real prices are expressed in")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="First day to rebuild")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last day to rebuild")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    if args.rebase:
+        store = load_store()
+        if args.rebase not in store["values"]:
+            print(f"ERROR: {args.rebase} is not in {STORE_PATH}")
+            sys.exit(1)
+        store["real_base"] = args.rebase
+        save_store(store)
+        print(f"  ✔ Real prices are now in {args.rebase} dollars.")
+        print("    Run `python cpi.py --sync` to rewrite them (every month changes).")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {CPI_TABLE}, the real price columns and {REFRESH_FUNCTION}()")
+            print("    Run `python cpi.py --sync` once to fill them.")
+            return
+
+        if args.sync:
+            sync_cpi_pg(conn)
+            return
+
+        window = full_range_pg(conn)
+        if window is None:
+            print(f"  {TABLE_NAME} is empty — nothing to deflate")
+            return
+        refresh_real_prices_pg(conn, args.start or window[0], args.end or window[1] + timedelta(days=7))
+        print("    Run `python rollups.py --rebuild` to carry them into the rollups.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
-
+import argparse
 import json
+import re
 import sys
 import os
-from datetime import datetime
-from collections import defaultdict
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from dotenv import load_dotenv
 
 # Add parent directory to path so we can import format_data as a package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend_update.format_data import load_and_format_all_data
+from backend_update.filter_index import INDEX_COLUMNS, INDEX_TABLE
+from backend_update.profiling import add_profile_arguments, profiled
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
 
 # Both frontends share the same generated file
 OUTPUT_FILES = [
@@ -16,9 +23,31 @@ OUTPUT_FILES = [
     "web_frontend/src/constants/staticFilters.js",
 ]
 
+# STATIC_FILTERS key -> source column
+FILTER_FIELDS = {
+    "categories": "category",
+    "commodities": "commodity",
+    "varieties": "variety",
+    "packages": "package",
+    "districts": "district",
+    "organics": "organic",
+}
+
+# Marks how far the file's contents reach (the latest FilterIndex.updated_at
+# read), so the next run only reads combinations written since.
+_WATERMARK = re.compile(r"^ \* Source watermark: (\S+)$", re.M)
+
+# Incremental runs re-read this much before the watermark, so a write whose
+# transaction started earlier but committed after the last read is not missed.
+WATERMARK_OVERLAP = timedelta(hours=1)
+_CATEGORY_BLOCK = re.compile(r"export const CATEGORY_COMMODITIES = (\{.*?\n\});", re.S)
+_FILTERS_BLOCK = re.compile(r"export const STATIC_FILTERS = (\{.*\});", re.S)
 
-def build_js(filters: dict, category_commodities: dict) -> str:
+
+def build_js(filters: dict, category_commodities: dict, watermark: datetime = None) -> str:
     generated_on = datetime.now().strftime("%a %b %d %H:%M:%S %Z %Y")
+    watermark_line = (f"\n * Source watermark: {watermark.isoformat(timespec='seconds')}"
+                      if watermark else "")
 
     # Render CATEGORY_COMMODITIES with consistent formatting
     cat_lines = []
@@ -31,7 +60,7 @@ def build_js(filters: dict, category_commodities: dict) -> str:
 
     return f"""/**
  * Static filter options generated from database.
- * Generated on: {generated_on}
+ * Generated on: {generated_on}{watermark_line}
  */
 
 /**
@@ -57,43 +86,152 @@ export const STATIC_FILTERS = {json.dumps(filters, indent=4)};
 """
 
 
-def extract_and_save():
-    print("Loading data...")
-    unified_df = load_and_format_all_data()
-
-    if unified_df.empty:
+def read_existing(path: str):
+    """
+    Parse a previously generated staticFilters.js into
+    (filters, category_commodities, watermark), or None if it cannot be used
+    as a base for an incremental run.
+    """
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError:
+        return None
+    watermark = _WATERMARK.search(text)
+    cats = _CATEGORY_BLOCK.search(text)
+    flat = _FILTERS_BLOCK.search(text)
+    if not (watermark and cats and flat):
+        return None
+    try:
+        filters = {k: set(v) for k, v in json.loads(flat.group(1)).items()}
+        category_commodities = {k: set(v) for k, v in json.loads(cats.group(1)).items()}
+        since = datetime.fromisoformat(watermark.group(1))
+    except ValueError:
+        return None
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return filters, category_commodities, since
+
+
+def load_filter_rows(since: datetime = None) -> tuple[pd.DataFrame, datetime]:
+    """
+    Return the six filter columns for every combination written to FilterIndex
+    since `since` (all of them when None), plus the watermark they reach.
+
+    Reads the FilterIndex table (one row per combination) over psycopg2 or the
+    REST API, by updated_at rather than the report day, so combinations a
+    backfill adds with old report days are picked up too. Without database
+    credentials it falls back to formatting the local *_recent.csv files; that
+    result has no watermark, so the next run with credentials is a full one.
+    """
+    start = since - WATERMARK_OVERLAP if since else None
+    cols = ", ".join(INDEX_COLUMNS)
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if db_conn_str:
+        import psycopg2
+        conn = psycopg2.connect(db_conn_str)
+        try:
+            with conn.cursor() as cur:
+                sql = f'SELECT {cols}, updated_at FROM "{INDEX_TABLE}"'
+                if start:
+                    cur.execute(sql + " WHERE updated_at >= %s", (start,))
+                else:
+                    cur.execute(sql)
+                rows = pd.DataFrame(cur.fetchall(), columns=[*INDEX_COLUMNS, "updated_at"])
+        finally:
+            conn.close()
+    elif os.getenv("SUPABASE_URL"):
+        from backend_update.overwrite_supabse import get_supabase_client
+        client = get_supabase_client()
+        pages, page, size = [], 0, 1000
+        while True:
+            query = client.table(INDEX_TABLE).select(f"{cols}, updated_at")
+            if start:
+                query = query.gte("updated_at", start.isoformat())
+            for col in INDEX_COLUMNS:  # the primary key, so pages are stable
+                query = query.order(col)
+            data = query.range(page * size, (page + 1) * size - 1).execute().data
+            pages.extend(data)
+            if len(data) < size:
+                break
+            page += 1
+        rows = pd.DataFrame(pages, columns=[*INDEX_COLUMNS, "updated_at"])
+    else:
+        print("No database credentials — formatting local *_recent.csv files instead")
+        from backend_update.format_data import load_and_format_all_data
+        df = load_and_format_all_data()
+        return df.reindex(columns=list(INDEX_COLUMNS)), None
+
+    updated_at = pd.to_datetime(rows["updated_at"], errors="coerce", utc=True).max()
+    watermark = updated_at.to_pydatetime() if pd.notna(updated_at) else since
+    if since and watermark < since:
+        watermark = since  # only the overlap was re-read
+    # FilterIndex stores missing values as ''.
+    return rows[list(INDEX_COLUMNS)].replace("", pd.NA), watermark
+
+
+def extract_filters(rows: pd.DataFrame) -> tuple[dict, dict]:
+    """Distinct values per field and category -> commodities, as sets."""
+    filters = {key: set(rows[col].dropna().unique()) for key, col in FILTER_FIELDS.items()}
+    pairs = rows[["category", "commodity"]].dropna().drop_duplicates()
+    category_commodities = pairs.groupby("category")["commodity"].agg(set).to_dict()
+    return filters, category_commodities
+
+
+def extract_and_save(full: bool = False):
+    t0 = time.perf_counter()
+    base = None if full else read_existing(OUTPUT_FILES[0])
+    since = base[2] if base else None
+
+    print(f"Loading filter combinations {'since ' + since.isoformat() if since else '(full)'}...")
+    rows, watermark = load_filter_rows(since)
+
+    if rows.empty and base is None:
         print("Error: No data found!")
         sys.exit(1)
 
-    print(f"Data loaded: {len(unified_df)} records")
+    print(f"Data loaded: {len(rows)} combinations")
 
-    # Build CATEGORY_COMMODITIES: category -> sorted set of commodities
-    category_commodities = defaultdict(set)
-    for _, row in unified_df[['category', 'commodity']].dropna().iterrows():
-        category_commodities[row['category']].add(row['commodity'])
-
-    filters = {
-        "categories": sorted(unified_df['category'].dropna().unique().tolist()),
-        "commodities": sorted(unified_df['commodity'].dropna().unique().tolist()),
-        "varieties": sorted(unified_df['variety'].dropna().unique().tolist()),
-        "packages": sorted(unified_df['package'].dropna().unique().tolist()),
-        "districts": sorted(unified_df['district'].dropna().unique().tolist()),
-        "organics": sorted(unified_df['organic'].dropna().unique().tolist()),
-    }
+    filters, category_commodities = extract_filters(rows)
+    if base:
+        old_filters, old_categories, _ = base
+        for key, values in old_filters.items():
+            filters[key] = filters.get(key, set()) | values
+        for cat, commodities in old_categories.items():
+            category_commodities[cat] = category_commodities.get(cat, set()) | commodities
+        unchanged = filters == old_filters and category_commodities == old_categories
+    else:
+        unchanged = False
 
     print("\nExtracted Filters:")
     for k, v in filters.items():
         print(f"  - {k}: {len(v)} options")
     print(f"  - category_commodities: {len(category_commodities)} categories")
 
-    js_content = build_js(filters, category_commodities)
+    # Keep the old watermark too: the next run re-reads a few extra rows
+    # rather than creating a diff that only moves the timestamp.
+    if unchanged:
+        print(f"\nNo new filter values — leaving staticFilters.js untouched "
+              f"({time.perf_counter() - t0:.2f}s)")
+        return
+
+    js_content = build_js({k: sorted(v) for k, v in filters.items()},
+                          category_commodities, watermark)
 
     for output_file in OUTPUT_FILES:
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         with open(output_file, "w") as f:
             f.write(js_content)
         print(f"Wrote {output_file}")
+    print(f"Done in {time.perf_counter() - t0:.2f}s")
 
 
 if __name__ == "__main__":
-    extract_and_save()
+    parser = argparse.ArgumentParser(description="Generate staticFilters.js for both frontends")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild from every combination instead of merging new ones "
+                             "(drops values that no longer occur)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profiled("extract_filters"):
+        extract_and_save(args.full)
@@ -0,0 +1,207 @@
+"""
+Co-occurrence index behind the cascading filter dropdowns.
+
+getFilters needs, for the filters a user has picked, the values every other
+dropdown can still take. Scanning UnifiedCropPrice for that is slow; the
+answer only depends on which (category, commodity, variety, district,
+organic, package) combinations exist. FilterIndex stores exactly those, one
+row per combination (missing values as ''), which is a few thousand rows
+instead of millions.
+
+filter_options(category, commodity, variety, district, organic) answers a
+whole dropdown refresh in one RPC call. It applies the same cascade as
+getFilters: each field is narrowed by every other active filter, and category
+only by district and organic.
+
+The pipeline keeps the index current:
+  - the daily upload merges in the combinations it wrote (upsert, last_seen);
+  - the historical backfill, and `--rebuild`, regenerate it from the table,
+    which also drops combinations that no longer occur.
+
+last_seen is the latest report day of a combination; updated_at is when its
+row was last written (set by a trigger), which is what extract_filters.py
+reads incrementally by, since a backfill writes combinations with old report
+days.
+
+Usage:
+    python filter_index.py --ddl       # print table + function SQL
+    python filter_index.py --apply     # create them via DB_CONNECTION_STRING
+    python filter_index.py --rebuild   # regenerate from UnifiedCropPrice
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+TABLE_NAME = "UnifiedCropPrice"
+
+INDEX_TABLE = "FilterIndex"
+
+INDEX_COLUMNS = ("category", "commodity", "variety", "district", "organic", "package")
+
+OPTIONS_FUNCTION = "filter_options"
+
+# Filters the dropdowns can set (package is indexed but not a dropdown).
+CASCADE_FILTERS = ("category", "commodity", "variety", "district", "organic")
+
+# Dropdown field -> the filters that narrow it (mirrors getFilters in supabaseApi.js).
+CASCADE = {
+    "categories": ("category", ("district", "organic")),
+    "commodities": ("commodity", ("category", "district", "organic")),
+    "varieties": ("variety", ("category", "commodity", "district", "organic")),
+    "districts": ("district", ("category", "commodity", "variety", "organic")),
+    "organics": ("organic", ("category", "commodity", "variety", "district")),
+}
+
+READ_ROLES = ("anon", "authenticated")
+
+TOUCH_FUNCTION = "filter_index_touch"
+
+
+def _function_sql() -> str:
+    params = ", ".join(f"p_{c} text DEFAULT NULL" for c in CASCADE_FILTERS)
+    fields = []
+    for key, (col, narrowed_by) in CASCADE.items():
+        where = " AND ".join(f"(p_{f} IS NULL OR p_{f} = '' OR {f} = p_{f})" for f in narrowed_by)
+        fields.append(
+            f"'{key}', coalesce((SELECT jsonb_agg(v ORDER BY v) FROM (\n"
+            f'        SELECT DISTINCT {col} AS v FROM "{INDEX_TABLE}"\n'
+            f"        WHERE {col} NOT IN ('', 'N/A') AND {where}) s), '[]'::jsonb)"
+        )
+    body = ",\n    ".join(fields)
+    return f"""CREATE OR REPLACE FUNCTION {OPTIONS_FUNCTION}({params})
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT jsonb_build_object(
+    {body},
+    'packages', '[]'::jsonb
+  )
+$$"""
+
+
+def ddl() -> list[str]:
+    cols = ",\n    ".join(f"{c} text NOT NULL DEFAULT ''" for c in INDEX_COLUMNS)
+    key = ", ".join(INDEX_COLUMNS)
+    roles = ", ".join(READ_ROLES)
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{INDEX_TABLE}" (\n    {cols},\n'
+        f"    last_seen date,\n    updated_at timestamptz NOT NULL DEFAULT now(),\n"
+        f"    PRIMARY KEY ({key})\n)",
+        f'ALTER TABLE "{INDEX_TABLE}" ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()',
+        f"""CREATE OR REPLACE FUNCTION {TOUCH_FUNCTION}()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$""",
+        f'DROP TRIGGER IF EXISTS "{INDEX_TABLE}_touch" ON "{INDEX_TABLE}"',
+        f'CREATE TRIGGER "{INDEX_TABLE}_touch" BEFORE INSERT OR UPDATE ON "{INDEX_TABLE}" '
+        f"FOR EACH ROW EXECUTE FUNCTION {TOUCH_FUNCTION}()",
+        f'CREATE INDEX IF NOT EXISTS "{INDEX_TABLE}_updated_at" ON "{INDEX_TABLE}" (updated_at)',
+        f'CREATE INDEX IF NOT EXISTS "{INDEX_TABLE}_commodity" ON "{INDEX_TABLE}" (commodity)',
+        f'CREATE INDEX IF NOT EXISTS "{INDEX_TABLE}_district" ON "{INDEX_TABLE}" (district)',
+        f'ALTER TABLE "{INDEX_TABLE}" ENABLE ROW LEVEL SECURITY',
+        f'DROP POLICY IF EXISTS "{INDEX_TABLE} read" ON "{INDEX_TABLE}"',
+        f'CREATE POLICY "{INDEX_TABLE} read" ON "{INDEX_TABLE}" FOR SELECT TO {roles} USING (true)',
+        f'GRANT SELECT ON "{INDEX_TABLE}" TO {roles}',
+        _function_sql(),
+        f"GRANT EXECUTE ON FUNCTION {OPTIONS_FUNCTION}({', '.join('text' for _ in CASCADE_FILTERS)}) "
+        f"TO {roles}",
+    ]
+
+
+def _key_exprs() -> str:
+    return ", ".join(f"coalesce({c}::text, '')" for c in INDEX_COLUMNS)
+
+
+def build_filter_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Distinct index combinations in a formatted frame, with the latest report day of each."""
+    cols = [c for c in INDEX_COLUMNS if c in df.columns]
+    if df.empty or not cols:
+        return pd.DataFrame(columns=[*INDEX_COLUMNS, "last_seen"])
+    keys = df[cols].astype("string").fillna("")
+    for c in INDEX_COLUMNS:
+        if c not in keys.columns:
+            keys[c] = ""
+    keys["last_seen"] = pd.to_datetime(df["report_date"], errors="coerce", utc=True)
+    index = keys.groupby(list(INDEX_COLUMNS), sort=False, as_index=False)["last_seen"].max()
+    last_seen = index["last_seen"].dt.strftime("%Y-%m-%d")
+    index["last_seen"] = last_seen.astype(object).where(last_seen.notna(), None)
+    return index
+
+
+def merge_filter_index(writer, df: pd.DataFrame) -> int:
+    """Upsert the combinations in df into FilterIndex through a RestWriter."""
+    index = build_filter_index(df)
+    if index.empty:
+        return 0
+    records = index.to_dict("records")
+    written = 0
+    for i in range(0, len(records), 1000):
+        written += writer.insert(INDEX_TABLE, records[i:i + 1000],
+                                 on_conflict=",".join(INDEX_COLUMNS))
+    return written
+
+
+def rebuild_filter_index_pg(conn) -> int:
+    """Regenerate FilterIndex from UnifiedCropPrice in one transaction."""
+    t0 = time.time()
+    key = ", ".join(INDEX_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(f'DELETE FROM "{INDEX_TABLE}"')
+        cur.execute(
+            f'INSERT INTO "{INDEX_TABLE}" ({key}, last_seen) '
+            f"SELECT {_key_exprs()}, max(report_date)::date "
+            f'FROM "{TABLE_NAME}" GROUP BY 1, 2, 3, 4, 5, 6'
+        )
+        count = cur.rowcount
+    conn.commit()
+    print(f"  ✔ {INDEX_TABLE} rebuilt: {count:,} combinations ({time.time() - t0:.1f}s)")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascading filter co-occurrence index")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the table and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Regenerate from UnifiedCropPrice")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {INDEX_TABLE} and {OPTIONS_FUNCTION}()")
+        rebuild_filter_index_pg(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
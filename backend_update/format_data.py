@@ -5,52 +5,19 @@ Transforms raw CSV data from USDA API into the UnifiedCropPrice schema.
 
 import os
 import glob
-import re
-import json
 import pandas as pd
 from datetime import datetime
 
 
-# Conversion constant
-LB_PER_KG = 2.20462
+# Package weights (parsed description, then package_units.json, then guesses)
+# come from the shared resolver, so uploads and backfills agree with every script.
+from package_weights import package_measures
+from metrics import stage
 
 
 # Path to the data directory (local to backend_update/)
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "APP_CROP_DATA"))
 
-# Canonical (crop, package) -> net weight reference, sourced from USDA Handbook 697
-# plus explicit report weights. Used as a fallback for bare package descriptions
-# ("cartons tray pack", "bushel cartons", ...) that the regex parser cannot measure.
-# Keeps the daily pipeline's weights consistent with the historical Supabase backfill.
-_PACKAGE_UNITS_PATH = os.path.join(os.path.dirname(__file__), "package_units.json")
-
-
-def _load_package_weight_reference():
-    """Build {(crop_lower, package_lower): (weight_lbs, weight_kgs)} from package_units.json."""
-    try:
-        with open(_PACKAGE_UNITS_PATH, "r") as f:
-            entries = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-    ref = {}
-    for entry in entries:
-        crop = str(entry.get("crop", "")).lower().strip()
-        pkg = str(entry.get("package_size", "")).lower().strip()
-        if not crop or not pkg:
-            continue
-        lbs = entry.get("weight_lbs")
-        kgs = entry.get("weight_kg")
-        if lbs is None:
-            continue
-        lbs = round(float(lbs), 2)
-        kgs = round(float(kgs), 2) if kgs is not None else round(lbs / LB_PER_KG, 2)
-        ref[(crop, pkg)] = (lbs, kgs)
-    return ref
-
-
-PACKAGE_WEIGHT_REFERENCE = _load_package_weight_reference()
-
 
 def clean_price(price_val):
     """Clean and convert price value to float."""
@@ -201,131 +168,6 @@ _CONSUMED_COLS = {
 }
 
 
-def _parse_mixed_number(s):
-    """
-    Parse a USDA numeric token that may contain whole + fractional parts.
-
-    Handles: '5', '19.8', '1/2', '1 1/9', '2-1/2', '3 1/2'.
-    The dash form ('2-1/2') and space form ('3 1/2') both mean whole + fraction.
-    """
-    s = s.strip().replace('-', ' ')
-    total = 0.0
-    for tok in s.split():
-        if '/' in tok:
-            num, den = tok.split('/')
-            total += float(num) / float(den)
-        else:
-            total += float(tok)
-    return total
-
-
-def _lbs_kgs(lbs):
-    """Return (weight_lbs, weight_kgs) rounded, derived from a pound figure."""
-    return round(lbs, 2), round(lbs / LB_PER_KG, 2)
-
-
-def _kgs_lbs(kgs):
-    """Return (weight_lbs, weight_kgs) rounded, derived from a kilogram figure."""
-    return round(kgs * LB_PER_KG, 2), round(kgs, 2)
-
-
-def parse_package_measures(package):
-    """
-    Derive (weight_lbs, weight_kgs, units) from a USDA package description.
-
-    weight_lbs / weight_kgs are the TOTAL net product weight of the package (kg is
-    derived from lbs and vice-versa so both columns are populated whenever either is
-    known). `units` is the count of individual sellable sub-units in the package
-    (e.g. the 12 in 'flats 12 1-pint baskets', or 1 for 'each'). Any value that
-    cannot be derived from the string is returned as None.
-
-    Patterns covered, in priority order:
-      1. Combined kg + lb        -> '5 kg/11 lb cartons', '9 kg (19.8 lb) containers'
-      2. Priced per pound        -> 'per lb', 'per pound'                  (weight=1 lb)
-      3. Count x per-unit measure-> 'cartons 12 1-lb film bags', 'flats 12 5-oz cups',
-                                     'cartons 4 2-1/2 lb film bags', 'flats 12 125-gm cups'
-      4. Leading kilograms       -> '10 kg containers', '3.5 kg containers'
-      5. Leading pounds (+range) -> '25 lb sacks', '30-35 lb cartons', '2 pound bags'
-      6. Leading ounces (+range) -> '6 oz package', '5-9 oz package'
-      7. Leading grams           -> '100 gm packages'
-      8. Per-item pricing        -> 'each', 'per bunch', 'per sleeve'      (units=1)
-      9. Leading count/volume    -> bare 'N pint' / 'N count'
-
-    Bushels and bare containers ('cartons', 'bins', 'lugs', '1 layer', 'N inch')
-    yield no weight because the figure depends on the commodity, so they stay None.
-    """
-    if package is None or (isinstance(package, float) and pd.isna(package)) or str(package).strip() == "":
-        return None, None, None
-
-    s = str(package).lower().strip()
-
-    # 1. Combined "X kg/Y lb" or "X kg (Y lb)" — both figures are stated explicitly.
-    m = re.search(r'(\d+(?:\.\d+)?)\s*kg\s*[/(]\s*(\d+(?:\.\d+)?)\s*lb', s)
-    if m:
-        return round(float(m.group(2)), 2), round(float(m.group(1)), 2), None
-
-    # 2. Priced by the pound — normalize to a 1 lb basis so price/weight = price/lb.
-    if re.search(r'\bper\s+(?:lbs?|pounds?)\b', s):
-        return (*_lbs_kgs(1.0), None)
-
-    # 3. Count x per-unit measure, e.g. "12 1-lb", "4 2-1/2 lb", "12 18-oz", "12 125-gm".
-    m = re.search(r'(\d+)\s+([\d./\s-]*?\d)\s*-?\s*'
-                  r'(lbs?|pounds?|oz|gms?|grams?|kgs?|pints?|pt|cups?|count|ct)\b', s)
-    if m:
-        count = int(m.group(1))
-        each = _parse_mixed_number(m.group(2))
-        unit = m.group(3)
-        if unit.startswith(('lb', 'pound')):
-            return (*_lbs_kgs(count * each), count)
-        if unit == 'oz':
-            return (*_lbs_kgs(count * each / 16.0), count)
-        if unit.startswith('kg'):
-            return (*_kgs_lbs(count * each), count)
-        if unit.startswith(('gm', 'gram')):
-            return (*_kgs_lbs(count * each / 1000.0), count)
-        if unit in ('count', 'ct'):
-            # "12 3-count packages" -> 36 individual items
-            return None, None, int(count * each) if each else count
-        # pint / pt / cup -> volume measure, weight depends on commodity
-        return None, None, count
-
-    # 4. Leading kilograms, e.g. "10 kg containers".
-    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)\s*kg\b', s)
-    if m:
-        return (*_kgs_lbs(float(m.group(1))), None)
-
-    # 5. Leading pounds, optionally a range "30-35 lb" (use the midpoint).
-    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(?:lbs?|pounds?)\b', s)
-    if m:
-        lo = float(m.group(1))
-        hi = float(m.group(2)) if m.group(2) else lo
-        return (*_lbs_kgs((lo + hi) / 2.0), None)
-
-    # 6. Leading ounces, optionally a range. Skip fluid-ounce volumes ("64 oz (1 gallon)").
-    if 'gallon' not in s:
-        m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*oz\b', s)
-        if m:
-            lo = float(m.group(1))
-            hi = float(m.group(2)) if m.group(2) else lo
-            return (*_lbs_kgs((lo + hi) / 2.0 / 16.0), None)
-
-    # 7. Leading grams, e.g. "100 gm packages".
-    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)\s*(?:gms?|grams?)\b', s)
-    if m:
-        return (*_kgs_lbs(float(m.group(1)) / 1000.0), None)
-
-    # 8. Per-item pricing with no weight, e.g. "each", "per bunch", "per sleeve".
-    if s == 'each' or s.startswith('per '):
-        return None, None, 1
-
-    # 9. Bare count / volume with no weight, e.g. "1 pint containers", "3 count".
-    m = re.search(r'(?<![\d.])(\d+)\s*(pints?|pt|count|ct|cups?)\b', s)
-    if m:
-        return None, None, int(m.group(1))
-
-    return None, None, None
-
-
 def format_for_unified_crop_price(df):
     """
     Format DataFrame for UnifiedCropPrice table.
@@ -361,18 +203,7 @@ def format_for_unified_crop_price(df):
         package = get_field(row, 'package', 'pkg', 'size')
 
         # Derive net weight and unit count from the package description.
-        weight_lbs, weight_kgs, units = parse_package_measures(package)
-
-        # Fallback for bare packages the regex can't measure ("cartons tray pack",
-        # "bushel cartons", ...): look up the net weight by (commodity, package) in the
-        # USDA Handbook reference. Exact, lower()-normalized match — same key the
-        # Supabase historical backfill uses, so the two stay consistent.
-        if weight_lbs is None and units is None and package is not None:
-            ref = PACKAGE_WEIGHT_REFERENCE.get(
-                (str(commodity).lower().strip(), str(package).lower().strip())
-            )
-            if ref:
-                weight_lbs, weight_kgs = ref
+        weight_lbs, weight_kgs, units = package_measures(commodity, package)
 
         # Calculate price_avg for this single row.
         # USDA alternates between wtd_avg_price and wtd_Avg_Price across report sections.
@@ -481,9 +312,11 @@ def load_and_format_all_data():
     for csv_file in csv_files:
         print(f"Processing {os.path.basename(csv_file)}...")
         try:
-            df = pd.read_csv(csv_file, low_memory=False)
-
-            unified_df = format_for_unified_crop_price(df)
+            slug = os.path.basename(csv_file).split("_")[0]
+            with stage("format", slug=slug) as s:
+                df = pd.read_csv(csv_file, low_memory=False)
+                unified_df = format_for_unified_crop_price(df)
+                s.count(input_rows=len(df), rows=len(unified_df))
             all_unified_records.append(unified_df)
 
             print(f"  -> UnifiedCropPrice: {len(unified_df)} rows")
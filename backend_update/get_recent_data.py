@@ -5,6 +5,8 @@ import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from metrics import count, stage
+
 # --------------------------------------------------
 # Configuration
 # --------------------------------------------------
@@ -47,6 +49,7 @@ def safe_request(url, params):
             timeout=60
         )
         response.raise_for_status()
+        count(bytes=len(response.content))
         time.sleep(REQUEST_DELAY)
         
         try:
@@ -160,12 +163,15 @@ def fetch_recent_data(slug_ids, days=60):
         if days is not None:
             params["q"] = f"published_date={start_str}:{end_str}"
 
-        data = safe_request(url, params)
+        with stage("fetch", slug=slug):
+            data = safe_request(url, params)
         if not data:
             print(f"  No data returned for {slug}")
             continue
 
-        df = flatten_sections(data)
+        with stage("flatten", slug=slug) as s:
+            df = flatten_sections(data)
+            s.count(rows=len(df))
 
         if df is not None and not df.empty:
             print(f"  ✔ {slug}: {len(df)} rows found")
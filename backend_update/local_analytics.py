@@ -0,0 +1,286 @@
+"""
+Local analytics over a Parquet copy of UnifiedCropPrice, queried with DuckDB.
+
+Ad-hoc questions (analyze_market_notes.py, debug_retail.py,
+find_missing_packages.py) go through Supabase REST, where `.limit(10000)` and
+the 1,000-row page size cut results off without saying so. This module answers
+them locally: DuckDB scans the formatted rows in Parquet, with no row caps.
+
+The store is a directory of Parquet files partitioned by report year:
+
+    APP_CROP_DATA/store/year=2024/<part>.parquet
+
+`--build` fills it from the local source files: the *-Full.csv backfill files
+(the same ones upload_historical.py reads) for history, and the *_recent.csv
+daily window on top, mirroring how the two uploads split the table.
+
+The Python API mirrors supabaseApi.js, minus its row caps:
+
+    from local_analytics import LocalAnalytics
+    db = LocalAnalytics()
+    db.get_prices({"commodity": "Apples"}, limit=None, days=30)
+    db.get_prices_by_date_range({"commodity": "Apples"}, "2024-01-01", "2024-03-31")
+    db.get_time_series_data("Apples", {"district": "Washington"})
+    db.get_stats("Apples")
+    db.query("SELECT commodity, count(*) FROM UnifiedCropPrice GROUP BY 1")
+
+Usage:
+    pip install duckdb   # once
+    python local_analytics.py --build
+    python local_analytics.py --sql "SELECT count(*) FROM UnifiedCropPrice"
+    python local_analytics.py --snapshot --info   # the copy synced by snapshot.py
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(__file__))
+from cpi import with_real_prices
+from format_data import DATA_DIR, format_for_unified_crop_price, load_and_format_all_data
+from natural_key import with_row_keys
+
+TABLE_NAME = "UnifiedCropPrice"
+
+STORE_DIR = os.path.abspath(os.getenv("LOCAL_STORE_DIR") or os.path.join(DATA_DIR, "store"))
+
+# Column filters each supabaseApi.js query applies (the ones it silently drops
+# are dropped here too, so results line up).
+PRICE_FILTERS = ("commodity", "variety", "category", "package", "district", "organic")
+RANGE_FILTERS = ("commodity", "variety", "district", "package")
+SERIES_FILTERS = ("district", "organic")
+
+SERIES_COLUMNS = ("report_date", "market_type", "price_avg", "price_per_lb", "price_per_unit",
+                  "package", "origin", "variety", "organic")
+
+
+def require_duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        print("ERROR: duckdb is not installed — run `pip install duckdb`")
+        sys.exit(1)
+    return duckdb
+
+
+# ─── Building the store ─────────────────────────────────────────────────────
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Give every column a stable Parquet type, so partitions union cleanly."""
+    out = df.copy()
+    out["report_date"] = pd.to_datetime(out["report_date"], errors="coerce", utc=True).dt.tz_localize(None)
+    for col in out.columns.drop("report_date"):
+        if out[col].dtype != object:
+            continue
+        kind = pd.api.types.infer_dtype(out[col], skipna=True)
+        if kind in ("floating", "integer", "mixed-integer-float"):
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype("float64")
+        else:
+            out[col] = out[col].astype("string")
+    return out[out["report_date"].notna()]
+
+
+def write_partitions(con, df: pd.DataFrame, part: str, store_dir: str = STORE_DIR) -> int:
+    """Write a formatted frame as year=YYYY/<part>.parquet files (replacing them)."""
+    if df.empty:
+        return 0
+    df = normalize_frame(with_real_prices(df))
+    for year, chunk in df.groupby(df["report_date"].dt.year):
+        path = os.path.join(store_dir, f"year={int(year)}", f"{part}.parquet")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        con.register("chunk", chunk)
+        con.execute(f"COPY (SELECT * FROM chunk ORDER BY report_date) TO '{path}' "
+                    "(FORMAT PARQUET, COMPRESSION ZSTD)")
+        con.unregister("chunk")
+    return len(df)
+
+
+def build_store(store_dir: str = STORE_DIR) -> int:
+    """
+    Rebuild the store from the local *-Full.csv and *_recent.csv files.
+
+    History comes from the full files up to the first day of the recent
+    window; from there on the recent files win, as after a daily upload.
+    Rows carry the same row_key as in Postgres; keying never drops a row.
+    """
+    from upload_historical import FULL_FILE_DIR, extract_slug_id, read_csv_by_year
+
+    duckdb = require_duckdb()
+    t0 = time.time()
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir)
+    os.makedirs(store_dir)
+    con = duckdb.connect()
+
+    recent = load_and_format_all_data()
+    since = None
+    if not recent.empty:
+        recent = with_row_keys(recent)
+        since = pd.to_datetime(recent["report_date"], errors="coerce").min()
+
+    total = 0
+    full_files = sorted(glob.glob(os.path.join(FULL_FILE_DIR, "*-Full.csv")))
+    print(f"Found {len(full_files)} full files in {FULL_FILE_DIR}")
+    for path in full_files:
+        slug = extract_slug_id(path) or os.path.basename(path)
+        frames = []
+        for _, chunk, _ in read_csv_by_year(path):
+            formatted = format_for_unified_crop_price(chunk)
+            if formatted.empty:
+                continue
+            if since is not None:
+                formatted = formatted[pd.to_datetime(formatted["report_date"], errors="coerce") < since]
+            frames.append(formatted)
+        if frames:
+            written = write_partitions(con, with_row_keys(pd.concat(frames, ignore_index=True)),
+                                       f"full-{slug}", store_dir)
+            print(f"  -> {written:,} rows")
+            total += written
+
+    total += write_partitions(con, recent, "recent", store_dir)
+    con.close()
+    print(f"\n✔ Store built: {total:,} rows in {store_dir} ({time.time() - t0:.1f}s)")
+    return total
+
+
+# ─── Querying ───────────────────────────────────────────────────────────────
+
+class LocalAnalytics:
+    """A DuckDB connection with the store exposed as the UnifiedCropPrice view."""
+
+    def __init__(self, store_dir: str = STORE_DIR):
+        files = glob.glob(os.path.join(store_dir, "**", "*.parquet"), recursive=True)
+        if not files:
+            raise FileNotFoundError(
+                f"No Parquet files in {store_dir} — run `python local_analytics.py --build`")
+        self.con = require_duckdb().connect()
+        pattern = os.path.join(store_dir, "**", "*.parquet")
+        self.con.execute(
+            f"CREATE VIEW {TABLE_NAME} AS SELECT * FROM read_parquet('{pattern}', "
+            "hive_partitioning = true, union_by_name = true)")
+        self.columns = [r[0] for r in self.con.execute(f"DESCRIBE {TABLE_NAME}").fetchall()]
+
+    def query(self, sql: str, params=None) -> pd.DataFrame:
+        """Run any SQL against the store (the view is called UnifiedCropPrice)."""
+        return self.con.execute(sql, params or []).df()
+
+    def _where(self, filters: dict, allowed, clauses=None, params=None):
+        clauses, params = list(clauses or []), list(params or [])
+        for col in allowed:
+            value = (filters or {}).get(col)
+            if value and col in self.columns:
+                clauses.append(f"{col} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def get_prices(self, filters: dict = None, limit: int | None = 100, days: int = None) -> pd.DataFrame:
+        """getPrices: newest rows first; falls back to the latest data when `days` finds none."""
+        limit_sql = f" LIMIT {int(limit)}" if limit else ""
+        if days:
+            cutoff = datetime.utcnow() - timedelta(days=days)
+            where, params = self._where(filters, PRICE_FILTERS, ["report_date >= ?"], [cutoff])
+            df = self.query(f"SELECT * FROM {TABLE_NAME}{where} "
+                            f"ORDER BY report_date DESC{limit_sql}", params)
+            if not df.empty:
+                return df
+        where, params = self._where(filters, PRICE_FILTERS)
+        return self.query(f"SELECT * FROM {TABLE_NAME}{where} ORDER BY report_date DESC{limit_sql}", params)
+
+    def get_prices_by_date_range(self, filters: dict, start_date, end_date) -> pd.DataFrame:
+        """getPricesByDateRange: every row reported on days start_date..end_date."""
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+        where, params = self._where(filters, RANGE_FILTERS,
+                                    ["report_date >= ?", "report_date < ?"],
+                                    [start.to_pydatetime(), end.to_pydatetime()])
+        return self.query(f"SELECT * FROM {TABLE_NAME}{where} ORDER BY report_date DESC", params)
+
+    def get_time_series_data(self, commodity: str, filters: dict = None) -> pd.DataFrame:
+        """getTimeSeriesData: a commodity's full history, oldest first, chart columns only."""
+        cols = ", ".join(c for c in SERIES_COLUMNS if c in self.columns)
+        where, params = self._where(filters, SERIES_FILTERS,
+                                    ["commodity = ?", "report_date IS NOT NULL"], [commodity])
+        return self.query(f"SELECT {cols} FROM {TABLE_NAME}{where} ORDER BY report_date", params)
+
+    def get_stats(self, commodity: str, as_of: datetime = None) -> dict:
+        """
+        getStats: last-week vs previous-week averages per market type, dominant
+        package, terminal - shipping spread and latest market note. Averages use
+        price_avg (getStats reads price_retail / price_max, which the table lacks).
+        `as_of` moves "now" back, for snapshots that stop before today.
+        """
+        since = (as_of or datetime.utcnow()) - timedelta(days=14)
+        df = self.query(
+            f"SELECT report_date, market_type, package, price_avg, market_tone_comments "
+            f"FROM {TABLE_NAME} WHERE commodity = ? AND report_date >= ? "
+            f"ORDER BY report_date DESC", [commodity, since])
+        if df.empty:
+            return {"error": "No data found"}
+
+        packages = df["package"].dropna()
+        packages = packages[packages != ""]
+        latest = df["report_date"].iloc[0]
+        current = df["report_date"] >= latest - timedelta(days=7)
+
+        def avg(rows, market):
+            prices = rows.loc[rows["market_type"].fillna("").str.contains(market, regex=False),
+                              "price_avg"].dropna()
+            return prices.mean() if len(prices) else None
+
+        def pct(curr, prev):
+            return ((curr or 0) - prev) / prev * 100 if prev else 0
+
+        out = {"date": latest.isoformat(),
+               "package_unit": packages.value_counts().idxmax() if len(packages) else "lb"}
+        avgs = {}
+        for market in ("Terminal", "Shipping", "Retail"):
+            curr, prev = avg(df[current], market), avg(df[~current], market)
+            avgs[market] = curr
+            out[market.lower()] = {"avg": curr or 0, "pct_change": pct(curr, prev)}
+        t, s = avgs["Terminal"], avgs["Shipping"]
+        out["spread"] = t - s if t and s else None
+        notes = df["market_tone_comments"].dropna()
+        notes = notes[notes.str.strip() != ""]
+        out["market_note"] = notes.iloc[0] if len(notes) else None
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local DuckDB analytics over UnifiedCropPrice")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--build", action="store_true",
+                       help="Rebuild the Parquet store from the local CSV files")
+    group.add_argument("--sql", help="Run a query against the store and print the result")
+    group.add_argument("--info", action="store_true", help="Row counts per year")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Query the snapshot synced from Supabase (snapshot.py) instead")
+    args = parser.parse_args()
+
+    if args.build:
+        build_store()
+        return
+
+    if args.snapshot:
+        from snapshot import SNAPSHOT_DIR
+        db = LocalAnalytics(SNAPSHOT_DIR)
+    else:
+        db = LocalAnalytics()
+    t0 = time.perf_counter()
+    if args.info:
+        df = db.query(f"SELECT year, count(*) AS rows, min(report_date) AS first, "
+                      f"max(report_date) AS last FROM {TABLE_NAME} GROUP BY 1 ORDER BY 1")
+    else:
+        df = db.query(args.sql)
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(df.to_string(index=False))
+    print(f"\n{len(df):,} rows ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
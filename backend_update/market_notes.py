@@ -0,0 +1,258 @@
+"""
+Full-text search over the USDA comment fields.
+
+The five comment columns (supply / demand / market tone, offerings, commodity)
+can only be filtered by equality through REST, so looking for a word means
+downloading every note in a date range. The same note is also repeated on
+every row of the report it came from.
+
+MarketNotes keeps each distinct note once per report day, commodity, market
+type and field, with the number of rows that carried it and a tsvector
+(english) behind a GIN index. search_market_notes() answers keyword and
+phrase queries scoped by commodity, date range and field:
+
+    steady                  keyword (stemmed: also matches "steadier")
+    "demand exceeds"        phrase
+    higher OR firm          either
+    lower -storage          exclude a word
+
+The pipeline keeps the table current with refresh_market_notes(from, to),
+which rebuilds every report day in the window; both upload paths call it for
+the days they wrote.
+
+Usage:
+    python market_notes.py --ddl                  # print table + function SQL
+    python market_notes.py --apply                # create them via DB_CONNECTION_STRING
+    python market_notes.py --rebuild              # rebuild every day
+    python market_notes.py --search '"good demand"' --commodity Apples --from 2024-01-01
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from rollups import full_range_pg, month_slices
+
+TABLE_NAME = "UnifiedCropPrice"
+
+NOTES_TABLE = "MarketNotes"
+
+COMMENT_FIELDS = (
+    "supply_tone_comments",
+    "demand_tone_comments",
+    "market_tone_comments",
+    "offerings_comments",
+    "commodity_comments",
+)
+
+TEXT_CONFIG = "english"
+
+REFRESH_FUNCTION = "refresh_market_notes"
+SEARCH_FUNCTION = "search_market_notes"
+
+RESULT_COLUMNS = ("report_day", "commodity", "market_type", "field", "note", "row_count", "rank")
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def _table_sql() -> list[str]:
+    roles = ", ".join(READ_ROLES)
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{NOTES_TABLE}" (\n'
+        f"    report_day date NOT NULL,\n    commodity text NOT NULL,\n"
+        f"    market_type text NOT NULL,\n    field text NOT NULL,\n    note text NOT NULL,\n"
+        f"    row_count integer NOT NULL,\n"
+        f"    tsv tsvector GENERATED ALWAYS AS (to_tsvector('{TEXT_CONFIG}', note)) STORED\n)",
+        f'CREATE INDEX IF NOT EXISTS "{NOTES_TABLE}_tsv" ON "{NOTES_TABLE}" USING gin (tsv)',
+        f'CREATE INDEX IF NOT EXISTS "{NOTES_TABLE}_commodity_day" '
+        f'ON "{NOTES_TABLE}" (commodity, report_day)',
+        f'CREATE INDEX IF NOT EXISTS "{NOTES_TABLE}_day" ON "{NOTES_TABLE}" (report_day)',
+        f'ALTER TABLE "{NOTES_TABLE}" ENABLE ROW LEVEL SECURITY',
+        f'DROP POLICY IF EXISTS "{NOTES_TABLE} read" ON "{NOTES_TABLE}"',
+        f'CREATE POLICY "{NOTES_TABLE} read" ON "{NOTES_TABLE}" FOR SELECT TO {roles} USING (true)',
+        f'GRANT SELECT ON "{NOTES_TABLE}" TO {roles}',
+    ]
+
+
+def refresh_function_sql() -> str:
+    """refresh_market_notes(from_date, to_date): rebuild every report day in [from, to]."""
+    values = ",\n          ".join(f"('{f}', u.{f})" for f in COMMENT_FIELDS)
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}(from_date date, to_date date)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+SET timezone = 'UTC'
+AS $$
+DECLARE
+    n integer;
+BEGIN
+    DELETE FROM "{NOTES_TABLE}" WHERE report_day >= from_date AND report_day <= to_date;
+    INSERT INTO "{NOTES_TABLE}" (report_day, commodity, market_type, field, note, row_count)
+      SELECT u.report_date::date, u.commodity, coalesce(u.market_type, ''), f.field,
+             btrim(f.note), count(*)
+      FROM "{TABLE_NAME}" u
+      CROSS JOIN LATERAL (VALUES
+          {values}) f(field, note)
+      WHERE u.report_date >= from_date AND u.report_date < to_date + 1
+        AND u.commodity IS NOT NULL AND btrim(f.note) NOT IN ('', 'N/A')
+      GROUP BY 1, 2, 3, 4, 5;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$"""
+
+
+def search_function_sql() -> str:
+    """search_market_notes(query, ...): matching notes, newest first."""
+    return f"""CREATE OR REPLACE FUNCTION {SEARCH_FUNCTION}(
+    p_query text, p_commodity text DEFAULT NULL, p_from date DEFAULT NULL,
+    p_to date DEFAULT NULL, p_fields text[] DEFAULT NULL, p_limit integer DEFAULT 100)
+RETURNS TABLE (report_day date, commodity text, market_type text, field text, note text,
+               row_count integer, rank real)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT n.report_day, n.commodity, n.market_type, n.field, n.note, n.row_count,
+         ts_rank(n.tsv, q)
+  FROM "{NOTES_TABLE}" n, websearch_to_tsquery('{TEXT_CONFIG}', p_query) q
+  WHERE n.tsv @@ q
+    AND (p_commodity IS NULL OR p_commodity = '' OR n.commodity = p_commodity)
+    AND (p_from IS NULL OR n.report_day >= p_from)
+    AND (p_to IS NULL OR n.report_day <= p_to)
+    AND (p_fields IS NULL OR n.field = ANY (p_fields))
+  ORDER BY n.report_day DESC, 7 DESC
+  LIMIT p_limit
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = _table_sql()
+    stmts.append(refresh_function_sql())
+    refresh = f"{REFRESH_FUNCTION}(date, date)"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {refresh} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {refresh} TO {WRITE_ROLE}")
+    stmts.append(search_function_sql())
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {SEARCH_FUNCTION}(text, text, date, date, text[], integer) "
+                 f"TO {', '.join(READ_ROLES)}")
+    return stmts
+
+
+def refresh_notes_pg(conn, start: date, end: date) -> int:
+    """Rebuild MarketNotes for report days in [start, end], one month per transaction."""
+    total = 0
+    t0 = time.time()
+    with conn.cursor() as cur:
+        for lo, hi in month_slices(start, end):
+            cur.execute(f"SELECT {REFRESH_FUNCTION}(%s, %s)", (lo, hi))
+            total += cur.fetchone()[0]
+            conn.commit()
+    print(f"  ✔ {NOTES_TABLE} refreshed for {start}..{end}: {total:,} notes "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_notes_rest(client, start: date, end: date) -> int:
+    """Same as refresh_notes_pg, through PostgREST RPC."""
+    total = 0
+    t0 = time.time()
+    for lo, hi in month_slices(start, end):
+        res = client.rpc(REFRESH_FUNCTION, {
+            "from_date": lo.isoformat(), "to_date": hi.isoformat(),
+        }).execute()
+        total += int(res.data or 0)
+    print(f"  ✔ {NOTES_TABLE} refreshed for {start}..{end}: {total:,} notes "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def search_notes_pg(conn, query: str, commodity: str = None, start: date = None,
+                    end: date = None, fields=None, limit: int = 100) -> pd.DataFrame:
+    """Notes matching a websearch-style query, newest first."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {SEARCH_FUNCTION}(%s, %s, %s, %s, %s, %s)",
+                    (query, commodity, start, end, list(fields) if fields else None, limit))
+        rows = cur.fetchall()
+    conn.commit()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def search_notes_rest(client, query: str, commodity: str = None, start: date = None,
+                      end: date = None, fields=None, limit: int = 100) -> pd.DataFrame:
+    """Same as search_notes_pg, through PostgREST RPC."""
+    res = client.rpc(SEARCH_FUNCTION, {
+        "p_query": query, "p_commodity": commodity,
+        "p_from": start.isoformat() if start else None,
+        "p_to": end.isoformat() if end else None,
+        "p_fields": list(fields) if fields else None, "p_limit": limit,
+    }).execute()
+    return pd.DataFrame(res.data or [], columns=RESULT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over USDA comment fields")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the table and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Rebuild MarketNotes from the base table")
+    group.add_argument("--search", metavar="QUERY", help='Keywords or "quoted phrases"')
+    parser.add_argument("--commodity")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat)
+    parser.add_argument("--field", action="append", choices=COMMENT_FIELDS,
+                        help="Limit to a comment field (repeatable)")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {NOTES_TABLE}, {REFRESH_FUNCTION}() and {SEARCH_FUNCTION}()")
+            print("    Run `python market_notes.py --rebuild` once to fill it.")
+            return
+
+        if args.rebuild:
+            window = full_range_pg(conn)
+            if window is None:
+                print(f"  {TABLE_NAME} is empty — nothing to index")
+                return
+            refresh_notes_pg(conn, args.start or window[0], args.end or window[1] + timedelta(days=7))
+            return
+
+        t0 = time.perf_counter()
+        df = search_notes_pg(conn, args.search, args.commodity, args.start, args.end,
+                             args.field, args.limit)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with pd.option_context("display.max_colwidth", 100, "display.width", 200):
+            print(df.drop(columns="rank").to_string(index=False) if not df.empty else "No matches")
+        print(f"\n{len(df)} notes ({elapsed:.0f} ms)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Per-stage metrics and a run ledger for the pipeline entry points.
+
+update_daily.py, update_recent.py and upload_historical.py only print as they
+go, so nothing remains of a run once its log has scrolled away. This module
+times the stages of a run (fetch, flatten, format, delete, upload, refresh),
+per slug where there is one, with their counters (rows, bytes) and the process
+memory high-water mark. At the end it appends the run to LEDGER_PATH (JSONL).
+
+    with recorded_run("update_daily") as run:
+        with stage("fetch", slug="2306"):
+            data = safe_request(url, params)      # calls count(bytes=...) itself
+        run.ok = upload(...)
+
+stage() and count() do nothing outside recorded_run(), so the instrumented
+functions cost nothing when imported elsewhere. Stages are tracked per
+thread, so parallel backfill workers each record their own (a stage's total
+is then summed over the workers and can exceed the run's wall time).
+
+    python metrics.py                       # recent runs, flagged against the ones before
+    python metrics.py --stage fetch         # one stage's trend, per slug
+    python metrics.py --entry update_daily --last 30
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, memory is not recorded
+    resource = None
+
+# Runs are appended here, one JSON object per line.
+LEDGER_PATH = os.getenv(
+    "RUN_LEDGER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "runs.jsonl"),
+)
+
+# A stage slower (or a rate lower) than this multiple of its median over the
+# previous runs is flagged by the summary.
+REGRESSION_RATIO = 1.5
+
+STAGES = ("fetch", "flatten", "merge", "read", "format", "delete", "upload", "refresh")
+
+_active = None
+_local = threading.local()
+_stage_hooks = []
+
+
+def peak_rss_mb() -> float | None:
+    """The process's resident-memory high-water mark so far, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1_048_576 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Run:
+    """One recorded run: its stages in order of completion. Thread-safe."""
+
+    def __init__(self, entry: str, argv: list[str] = None):
+        self.entry = entry
+        self.argv = argv if argv is not None else sys.argv[1:]
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.ok = True
+        self.stages: list[dict] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.stages.append(record)
+
+    def totals(self) -> dict[str, dict]:
+        """Stage name -> summed seconds and counters, peak memory, slug count."""
+        out = {}
+        with self._lock:
+            for s in self.stages:
+                t = out.setdefault(s["stage"], {"seconds": 0.0, "calls": 0, "slugs": set()})
+                t["seconds"] += s["seconds"]
+                t["calls"] += 1
+                if s.get("slug"):
+                    t["slugs"].add(s["slug"])
+                for key, value in s["counters"].items():
+                    t[key] = t.get(key, 0) + value
+                if s.get("peak_mb") is not None:
+                    t["peak_mb"] = max(t.get("peak_mb", 0), s["peak_mb"])
+        for t in out.values():
+            t["seconds"] = round(t["seconds"], 3)
+            t["slugs"] = len(t["slugs"])
+        return out
+
+    def record(self) -> dict:
+        return {
+            "run": self.started_at,
+            "entry": self.entry,
+            "argv": self.argv,
+            "commit": _git_commit(),
+            "ok": bool(self.ok),
+            "seconds": round(time.perf_counter() - self._t0, 3),
+            "peak_mb": peak_rss_mb(),
+            "totals": self.totals(),
+            "stages": self.stages,
+        }
+
+    def report(self, ledger_path: str = LEDGER_PATH):
+        """Print the per-stage totals and append the run to ledger_path."""
+        rec = self.record()
+        print(f"\n  [metrics] {self.entry} {'ok' if rec['ok'] else 'FAILED'} in "
+              f"{rec['seconds']:.1f}s, peak {rec['peak_mb'] or '?'} MB")
+        for name, t in rec["totals"].items():
+            rows = t.get("rows")
+            line = f"    {name:<8} {t['seconds']:8.1f}s"
+            if rows is not None:
+                line += f"  {rows:>10,} rows"
+                if t["seconds"]:
+                    line += f", {rows / t['seconds']:,.0f} rows/s"
+            if t.get("bytes"):
+                line += f", {t['bytes'] / 1_048_576:.2f} MB"
+            print(line)
+
+        if not ledger_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(ledger_path), exist_ok=True)
+            with open(ledger_path, "a") as f:
+                f.write(json.dumps(rec) + "\n")
+        except OSError as e:
+            print(f"  ⚠ Could not write run ledger {ledger_path}: {e}")
+
+
+@contextmanager
+def recorded_run(entry: str, ledger_path: str = LEDGER_PATH):
+    """
+    Record the stages run inside the block and append them to the ledger.
+
+    The run is marked failed if the block raises (or sets run.ok = False); a
+    SystemExit with a non-zero code counts as a failure too.
+    """
+    global _active
+    run = Run(entry)
+    previous, _active = _active, run
+    try:
+        yield run
+    except SystemExit as e:
+        run.ok = run.ok and not e.code
+        raise
+    except BaseException:
+        run.ok = False
+        raise
+    finally:
+        _active = previous
+        run.report(ledger_path)
+
+
+class _Stage:
+    __slots__ = ("counters",)
+
+    def __init__(self, counters: dict):
+        self.counters = counters
+
+    def count(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+def add_stage_hook(hook):
+    """Enter hook(name, slug) — a context manager — around every stage (profiling.py)."""
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook):
+    _stage_hooks.remove(hook)
+
+
+@contextmanager
+def stage(name: str, slug: str = None, **counters):
+    """Time the block as one stage of the active run; counters start at the given values."""
+    run = _active
+    current = _Stage(dict(counters))
+    if run is None and not _stage_hooks:
+        yield current
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(current)
+    t0 = time.perf_counter()
+    before = peak_rss_mb()
+    ok = False
+    try:
+        with ExitStack() as hooks:
+            for hook in list(_stage_hooks):
+                hooks.enter_context(hook(name, slug))
+            yield current
+        ok = True
+    finally:
+        stack.pop()
+        seconds = time.perf_counter() - t0
+        peak = peak_rss_mb()
+        if run is not None:
+            run.add({
+                "stage": name,
+                "slug": str(slug) if slug is not None else None,
+                "seconds": round(seconds, 4),
+                "ok": ok,
+                "counters": current.counters,
+                "peak_mb": peak,
+                "grew_mb": round(peak - before, 1) if peak is not None else None,
+            })
+
+
+def count(**counters):
+    """Add to the counters of this thread's innermost open stage, if any."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].count(**counters)
+
+
+# ── Ledger summary ────────────────────────────────────────────────────────────
+
+def load_ledger(path: str = LEDGER_PATH, entry: str = None) -> list[dict]:
+    """Every run in the ledger (optionally of one entry point), oldest first."""
+    if not os.path.exists(path):
+        return []
+    runs = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if entry is None or rec.get("entry") == entry:
+                runs.append(rec)
+    return runs
+
+
+def _flag(value, history, higher_is_worse=True) -> str:
+    """▲ when value is REGRESSION_RATIO worse than the median of history."""
+    history = [h for h in history if h]
+    if not value or len(history) < 2:
+        return " "
+    median = statistics.median(history)
+    worse = value > REGRESSION_RATIO * median if higher_is_worse else value * REGRESSION_RATIO < median
+    return "▲" if worse else " "
+
+
+def _rate(t: dict | None) -> float | None:
+    if not t or not t.get("rows") or not t.get("seconds"):
+        return None
+    return t["rows"] / t["seconds"]
+
+
+def print_runs(runs: list[dict], last: int):
+    """One line per run: total and per-stage seconds, each flagged against the runs before."""
+    stages = [s for s in STAGES if any(s in r.get("totals", {}) for r in runs)]
+    header = f"{'run':<19} {'entry':<18} {'ok':<3} {'total s':>8} {'peak MB':>8}"
+    header += "".join(f" {s + ' s':>10}" for s in stages) + f" {'rows':>10}"
+    print(header)
+    for i in range(max(0, len(runs) - last), len(runs)):
+        r = runs[i]
+        before = [p for p in runs[max(0, i - last):i] if p["entry"] == r["entry"] and p["ok"]]
+        line = (f"{r['run']:<19} {r['entry']:<18} {'✔' if r['ok'] else '✘':<3} "
+                f"{r['seconds']:>7.1f}{_flag(r['seconds'], [p['seconds'] for p in before])}"
+                f" {r.get('peak_mb') or 0:>7.0f}{_flag(r.get('peak_mb'), [p.get('peak_mb') for p in before])}")
+        for s in stages:
+            t = r["totals"].get(s)
+            if t is None:
+                line += f" {'-':>10}"
+                continue
+            hist = [p["totals"][s]["seconds"] for p in before if s in p["totals"]]
+            line += f" {t['seconds']:>9.1f}{_flag(t['seconds'], hist)}"
+        rows = r["totals"].get("upload", {}).get("rows") or r["totals"].get("format", {}).get("rows")
+        line += f" {rows or 0:>10,}"
+        print(line)
+    print(f"\n▲ = more than {REGRESSION_RATIO}× the median of the previous successful runs")
+
+
+def print_stage(runs: list[dict], name: str, last: int):
+    """The stage's seconds, rows/s and bytes per slug over the last runs."""
+    runs = runs[-last:]
+    for r in runs:
+        per_slug = {}
+        for s in r.get("stages", []):
+            if s["stage"] != name:
+                continue
+            t = per_slug.setdefault(s.get("slug") or "-", {"seconds": 0.0})
+            t["seconds"] += s["seconds"]
+            for key, value in s["counters"].items():
+                t[key] = t.get(key, 0) + value
+        r["_per_slug"] = per_slug
+
+    slugs = sorted({slug for r in runs for slug in r["_per_slug"]})
+    if not slugs:
+        print(f"No '{name}' stages in the last {len(runs)} runs.")
+        return
+    for slug in slugs:
+        print(f"\n{name} — slug {slug}")
+        print(f"{'run':<19} {'entry':<18} {'seconds':>9} {'rows':>10} {'rows/s':>10} {'MB':>8}")
+        history_s, history_rate = [], []
+        for r in runs:
+            t = r["_per_slug"].get(slug)
+            if t is None:
+                continue
+            rate = _rate(t)
+            print(f"{r['run']:<19} {r['entry']:<18} {t['seconds']:>8.2f}{_flag(t['seconds'], history_s)}"
+                  f" {t.get('rows', 0):>10,} "
+                  f"{rate or 0:>9,.0f}{_flag(rate, history_rate, higher_is_worse=False)}"
+                  f" {t.get('bytes', 0) / 1_048_576:>8.2f}")
+            if r["ok"]:
+                history_s.append(t["seconds"])
+                history_rate.append(rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the pipeline run ledger")
+    parser.add_argument("--entry", help="Only runs of this entry point (e.g. update_daily)")
+    parser.add_argument("--stage", choices=STAGES, help="Per-slug trend of one stage")
+    parser.add_argument("--last", type=int, default=15, help="Runs to show (default: 15)")
+    parser.add_argument("--ledger", default=LEDGER_PATH, help=f"Ledger file (default: {LEDGER_PATH})")
+    args = parser.parse_args()
+
+    runs = load_ledger(args.ledger, args.entry)
+    if not runs:
+        print(f"No runs recorded in {args.ledger}")
+        sys.exit(0)
+    if args.stage:
+        print_stage(runs, args.stage, args.last)
+    else:
+        print_runs(runs, args.last)
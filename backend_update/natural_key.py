@@ -0,0 +1,243 @@
+"""
+Natural key for UnifiedCropPrice rows, and the idempotent upsert it enables.
+
+A price observation is identified by what USDA reported, not by our serial id:
+every column format_data emits except the prices, the comments and the
+measures derived from the package,
+
+    slug_id, slug_name, report_date (day), market_type, market_location_name,
+    district, category, commodity, variety, package, origin, item_size, organic
+
+plus its occurrence: USDA reports rows that agree on all of these and differ
+only in what format_data does not keep (grade, quality, condition,
+properties) or in price. The n-th such row of a write gets ordinal n, so no
+two rows share a key and none is dropped. The set of keys of a report day
+depends only on how many rows it has, not on their order, so re-writing a day
+from either source lands on the same keys.
+
+row_key is the md5 of those values and the ordinal joined with the ASCII unit
+separator (NULL -> empty string). The same expression exists in SQL
+(_key_sql) so rows written before keys existed can be keyed in place, their
+ordinal taken in id (insertion) order.
+
+Every write keys its rows once the column exists, in replace and swap mode
+too: a NULL key never conflicts, so unkeyed rows would become duplicates the
+unique index cannot catch as soon as upsert mode re-writes their day.
+
+The unique index is (report_date, row_key): report_date leads so the index is
+also usable for date-range scans, and a unique index on a table partitioned by
+report_date must include the partition key anyway.
+
+With the index in place both write paths can use
+INSERT ... ON CONFLICT (report_date, row_key) DO UPDATE, so re-running a day or
+overlapping two windows converges on the same rows with no delete pass.
+
+Usage:
+    python natural_key.py --ddl      # print the migration SQL
+    python natural_key.py --apply    # run it via DB_CONNECTION_STRING (sliced by month)
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+TABLE_NAME = "UnifiedCropPrice"
+
+KEY_COLUMN = "row_key"
+
+NATURAL_KEY_COLUMNS = (
+    "slug_id", "slug_name", "report_date", "market_type", "market_location_name", "district",
+    "category", "commodity", "variety", "package", "origin", "item_size", "organic",
+)
+
+CONFLICT_COLUMNS = ("report_date", KEY_COLUMN)
+
+INDEX_NAME = f"{TABLE_NAME}_natural_key"
+
+_SEP = "\x1f"
+
+
+def _sql_part(col: str) -> str:
+    if col == "report_date":
+        return "coalesce(to_char(report_date AT TIME ZONE 'UTC', 'YYYY-MM-DD'), '')"
+    return f"coalesce({col}::text, '')"
+
+
+# The joined key columns, without the ordinal.
+_BASE_SQL = "concat_ws(chr(31), " + ", ".join(_sql_part(c) for c in NATURAL_KEY_COLUMNS) + ")"
+
+
+def _key_sql() -> str:
+    """md5 over the same joined string compute_row_keys() hashes, ordinal in id order."""
+    return (f"md5(concat_ws(chr(31), {_BASE_SQL}, "
+            f"(row_number() OVER (PARTITION BY {_BASE_SQL} ORDER BY id) - 1)::text))")
+
+
+def compute_row_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Return the row_key for every row of a formatted UnifiedCropPrice frame.
+
+    Columns are stringified and joined whole-column; only the md5 itself runs
+    per row. Missing key columns count as NULL. Rows that agree on every key
+    column are numbered 0, 1, ... in frame order, so the keys are unique.
+    """
+    parts = []
+    for col in NATURAL_KEY_COLUMNS:
+        if col not in df.columns:
+            parts.append(pd.Series("", index=df.index))
+            continue
+        s = df[col]
+        if col == "report_date":
+            s = s.astype("string").str.slice(0, 10)
+        else:
+            s = s.astype("string")
+        parts.append(s.fillna(""))
+
+    joined = parts[0].str.cat(parts[1:], sep=_SEP)
+    ordinal = joined.groupby(joined, sort=False).cumcount().astype("string")
+    joined = joined.str.cat(ordinal, sep=_SEP)
+    return pd.Series(
+        [hashlib.md5(v.encode("utf-8")).hexdigest() for v in joined],
+        index=df.index, dtype="object",
+    )
+
+
+def with_row_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """df with its row_key column; every row is kept."""
+    if df.empty:
+        return df
+    return df.assign(**{KEY_COLUMN: compute_row_keys(df)})
+
+
+def table_has_key_rest(client, table: str = TABLE_NAME) -> bool:
+    """Whether the table has the row_key column yet (natural_key.py --apply)."""
+    try:
+        client.table(table).select(KEY_COLUMN).limit(1).execute()
+        return True
+    except Exception:
+        return False
+
+
+def upsert_sql(table_cols: list[str]) -> str:
+    """INSERT ... ON CONFLICT DO UPDATE for psycopg2 execute_values."""
+    col_names = ", ".join(f'"{c}"' for c in table_cols)
+    conflict = ", ".join(f'"{c}"' for c in CONFLICT_COLUMNS)
+    updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in table_cols if c not in CONFLICT_COLUMNS)
+    return (f'INSERT INTO "{TABLE_NAME}" ({col_names}) VALUES %s '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}')
+
+
+def _backfill_sql(windowed: bool = False) -> list[str]:
+    """
+    Key every row whose row_key is missing or stale (rows written before keys,
+    or under an older key definition). Stale keys are cleared first, so no
+    intermediate state of the UPDATE can collide with the unique index.
+    """
+    window = " WHERE report_date >= %s AND report_date < %s" if windowed else ""
+    keyed = (f'SELECT id, {_key_sql()} AS key FROM "{TABLE_NAME}"{window}')
+    stale = f"k.key IS DISTINCT FROM t.{KEY_COLUMN}"
+    return [
+        "CREATE TEMP TABLE IF NOT EXISTS row_keys (id bigint PRIMARY KEY, key text)",
+        "TRUNCATE row_keys",
+        f"INSERT INTO row_keys SELECT k.id, k.key FROM ({keyed}) k "
+        f'JOIN "{TABLE_NAME}" t USING (id) WHERE {stale}',
+        f'UPDATE "{TABLE_NAME}" t SET {KEY_COLUMN} = NULL FROM row_keys k '
+        f"WHERE t.id = k.id AND t.{KEY_COLUMN} IS NOT NULL",
+        f'UPDATE "{TABLE_NAME}" t SET {KEY_COLUMN} = k.key FROM row_keys k WHERE t.id = k.id',
+    ]
+
+
+def migration_sql() -> list[str]:
+    """Statements that add, backfill and uniquely index row_key. No row is deleted."""
+    conflict = ", ".join(CONFLICT_COLUMNS)
+    return [
+        f'ALTER TABLE "{TABLE_NAME}" ADD COLUMN IF NOT EXISTS {KEY_COLUMN} text;',
+        *(sql + ";" for sql in _backfill_sql()),
+        f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{INDEX_NAME}" '
+        f'ON "{TABLE_NAME}" ({conflict});',
+    ]
+
+
+def _utc_month(value) -> pd.Period:
+    # report_date is timestamptz; month windows are taken in UTC.
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_period("M")
+
+
+def apply_migration(conn):
+    """
+    Run migration_sql() against a live database.
+
+    The backfill runs one month at a time, each month in its own transaction,
+    so no single statement approaches the statement timeout. Ordinals are
+    numbered within a report day, which never spans two months, so they match
+    a whole-table run. CREATE INDEX CONCURRENTLY needs
+    autocommit anyway; a partitioned table cannot be indexed concurrently, so
+    there it is built in place.
+    """
+    from partitioning import is_partitioned
+
+    add_col, create_index = migration_sql()[0], migration_sql()[-1]
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        if is_partitioned(cur, TABLE_NAME):
+            create_index = create_index.replace(" CONCURRENTLY", "")
+        cur.execute(add_col)
+        # Month windows must hold whole UTC days, or a day's ordinals would be
+        # numbered twice.
+        cur.execute("SET timezone = 'UTC'")
+        cur.execute(f'SELECT min(report_date), max(report_date) FROM "{TABLE_NAME}"')
+        lo, hi = cur.fetchone()
+        if lo is not None:
+            month = _utc_month(lo)
+            last = _utc_month(hi)
+            while month <= last:
+                window = (month.start_time.date(), (month + 1).start_time.date())
+                t0 = time.time()
+                cur.execute("BEGIN")
+                for sql in _backfill_sql(windowed=True):
+                    cur.execute(sql, window if "%s" in sql else None)
+                keyed = cur.rowcount
+                cur.execute("COMMIT")
+                print(f"  {month}: keyed {keyed:,} row(s) ({time.time() - t0:.1f}s)")
+                month += 1
+        print(f"  Building unique index {INDEX_NAME}...")
+        cur.execute(create_index)
+    print("  ✔ Natural key ready — upsert mode can be enabled")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UnifiedCropPrice natural-key migration")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the migration SQL")
+    group.add_argument("--apply", action="store_true", help="Run the migration via DB_CONNECTION_STRING")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print("\n\n".join(migration_sql()))
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env for --apply")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        apply_migration(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -28,16 +28,38 @@ def get_supabase_client() -> Client:
 
 import time
 
-
-def delete_recent_rows(client: Client, table_name: str, days: int, chunk_days: int = 1):
+from batching import AdaptiveBatcher
+from metrics import count, stage
+from natural_key import CONFLICT_COLUMNS, KEY_COLUMN, table_has_key_rest, with_row_keys
+from rest_writer import RestWriter
+from filter_index import INDEX_TABLE, merge_filter_index
+from rollups import refresh_rollups_rest, touched_window
+from cpi import refresh_real_prices_rest
+from segment_cube import CUBE_TABLE, refresh_cube_rest
+from price_summary import STATS_TABLE, refresh_summary_rest
+from market_notes import NOTES_TABLE, refresh_notes_rest
+from sentiment import SENTIMENT_TABLE, refresh_sentiment_rest
+
+# Upper bounds for the adaptive controllers. REST inserts are also bounded by
+# request body size; delete slices by how far one statement should reach.
+REST_MAX_BATCH_SIZE = 2000
+MAX_CHUNK_DAYS = 31
+
+
+def delete_recent_rows(client: Client, table_name: str, days: int, chunk_days: int = 1,
+                       writer: RestWriter = None):
     """
     Delete only the rows whose report_date falls within the last `days` days.
     Historical data outside that window is left untouched.
 
-    The window is removed one `chunk_days`-sized slice at a time. Deleting the
-    whole window in a single statement touches ~20k rows and all nine indexes on
-    the table, which overruns Postgres' statement_timeout; per-day slices keep
-    each statement small enough to finish comfortably inside it.
+    The window is removed one slice at a time. Deleting the whole window in a
+    single statement touches ~20k rows and all nine indexes on the table, which
+    overruns Postgres' statement_timeout. Slices start at `chunk_days` and an
+    AdaptiveBatcher widens them while deletes stay well inside the timeout and
+    narrows them again after a slow or timed-out slice.
+
+    Deletes go through a RestWriter, so PostgREST reports only the number of
+    rows removed instead of sending each deleted row back.
     """
     from datetime import datetime, timedelta
 
@@ -47,23 +69,33 @@ def delete_recent_rows(client: Client, table_name: str, days: int, chunk_days: i
     end = today + timedelta(days=7)
 
     print(f"Deleting rows in {table_name} with report_date >= {cutoff} "
-          f"(in {chunk_days}-day slices)...")
+          f"(adaptive slices, starting at {chunk_days} day(s))...")
 
+    writer = writer or RestWriter(client)
+    batcher = AdaptiveBatcher("rest_delete", initial=chunk_days, minimum=1,
+                              maximum=MAX_CHUNK_DAYS, unit="days")
     max_retries = 3
     total_deleted = 0
     current = cutoff
 
     while current < end:
-        nxt = min(current + timedelta(days=chunk_days), end)
         for attempt in range(1, max_retries + 1):
+            # Never span a year boundary: on the partitioned table each
+            # slice then prunes to a single year partition.
+            year_end = current.replace(year=current.year + 1, month=1, day=1)
+            nxt = min(current + timedelta(days=batcher.size), end, year_end)
+            span = (nxt - current).days
+            t0 = time.perf_counter()
             try:
-                res = (client.table(table_name).delete()
-                       .gte('report_date', current.isoformat())
-                       .lt('report_date', nxt.isoformat())
-                       .execute())
-                total_deleted += len(res.data or [])
+                deleted = writer.delete(table_name, {
+                    'report_date': [f'gte.{current.isoformat()}', f'lt.{nxt.isoformat()}'],
+                })
+                batcher.record(span, time.perf_counter() - t0)
+                count(rows=deleted)
+                total_deleted += deleted
                 break
             except Exception as e:
+                batcher.record(span, time.perf_counter() - t0, ok=False, exc=e)
                 if attempt == max_retries:
                     print(f"  ✘ Failed deleting {current}..{nxt} after "
                           f"{max_retries} attempts: {e}")
@@ -75,6 +107,7 @@ def delete_recent_rows(client: Client, table_name: str, days: int, chunk_days: i
         current = nxt
 
     print(f"  ✔ Removed {total_deleted:,} recent rows (>= {cutoff})")
+    batcher.report()
 
 
 def detect_new_columns(client: Client, table_name: str, df: pd.DataFrame) -> pd.DataFrame:
@@ -111,15 +144,28 @@ def detect_new_columns(client: Client, table_name: str, df: pd.DataFrame) -> pd.
         return df
 
 
-def upload_dataframe(client: Client, table_name: str, df: pd.DataFrame, batch_size: int = 100):
+def upload_dataframe(client: Client, table_name: str, df: pd.DataFrame, batch_size: int = 100,
+                     batcher: AdaptiveBatcher = None, on_conflict: str = None,
+                     writer: RestWriter = None):
     """
     Upload a DataFrame to a Supabase table in batches with retry/backoff.
 
+    Batch size is adaptive: it starts at `batch_size` and an AdaptiveBatcher
+    grows it while inserts return well inside the statement timeout, then backs
+    off after a slow call, a timeout or an error (the failed rows are retried
+    in the smaller batch).
+
     Args:
         client: Supabase client
         table_name: Name of the table to upload to
         df: DataFrame with data to upload
-        batch_size: Number of records per batch (default 100 to stay well within timeouts)
+        batch_size: Initial records per batch (default 100 to stay well within timeouts)
+        batcher: Optional controller to share across calls (e.g. one per backfill run);
+            when omitted a fresh one is created and its summary printed at the end.
+        on_conflict: Comma-separated unique columns; when set, rows are upserted
+            (INSERT ... ON CONFLICT DO UPDATE) instead of plainly inserted.
+        writer: Optional RestWriter to share across calls; batches are sent with
+            return=minimal, so nothing is echoed back.
     """
     if df.empty:
         print(f"No data to upload to {table_name}")
@@ -142,43 +188,155 @@ def upload_dataframe(client: Client, table_name: str, df: pd.DataFrame, batch_si
                 clean_record[key] = value
         records.append(clean_record)
 
-    print(f"Uploading {len(records):,} records to {table_name} (batch_size={batch_size})...")
+    owns_writer = writer is None
+    if owns_writer:
+        writer = RestWriter(client)
+
+    owns_batcher = batcher is None
+    if owns_batcher:
+        batcher = AdaptiveBatcher("rest_insert", initial=batch_size,
+                                  minimum=min(batch_size, 50), maximum=REST_MAX_BATCH_SIZE)
+
+    print(f"Uploading {len(records):,} records to {table_name} (initial batch_size={batcher.size})...")
 
     total_uploaded = 0
     max_retries = 3
+    i = 0
 
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i + batch_size]
+    while i < len(records):
         for attempt in range(1, max_retries + 1):
+            batch = records[i:i + batcher.size]
+            t0 = time.perf_counter()
             try:
-                client.table(table_name).insert(batch).execute()
+                writer.insert(table_name, batch, on_conflict=on_conflict)
+                batcher.record(len(batch), time.perf_counter() - t0)
+                count(rows=len(batch))
+                before = total_uploaded
                 total_uploaded += len(batch)
-                if total_uploaded % 5000 == 0 or total_uploaded == len(records):
+                if total_uploaded // 5000 > before // 5000 or total_uploaded == len(records):
                     print(f"  Progress: {total_uploaded:,}/{len(records):,} records uploaded")
                 time.sleep(0.05)
                 break  # success — move to next batch
             except Exception as e:
+                batcher.record(len(batch), time.perf_counter() - t0, ok=False, exc=e)
                 wait = attempt * 5
-                print(f"  ⚠ Batch {i//batch_size + 1} attempt {attempt} failed: {e}. "
-                      f"Retrying in {wait}s...")
+                print(f"  ⚠ Batch at row {i:,} attempt {attempt} failed: {e}. "
+                      f"Retrying in {wait}s with batch_size={batcher.size}...")
                 time.sleep(wait)
                 if attempt == max_retries:
                     print(f"  ✘ Batch permanently failed after {max_retries} attempts.")
                     raise
+        i += len(batch)
 
     print(f"  ✔ Successfully uploaded {total_uploaded:,} records to {table_name}")
+    if owns_batcher:
+        batcher.report()
+    if owns_writer:
+        writer.report()
+
+
+def refresh_real_prices(client: Client, window):
+    """Deflate the rows just written by the CPI of their month (non-fatal)."""
+    if window is None:
+        return
+    print(f"\n=== Refreshing real prices for {window[0]}..{window[1]} ===")
+    try:
+        refresh_real_prices_rest(client, *window)
+    except Exception as e:
+        print(f"  ⚠️  Real price refresh failed: {e}")
+        print("  Run `python cpi.py --apply` and `python cpi.py --sync` once if CpiMonthly does not exist yet.")
+
+
+def refresh_rollups(client: Client, window):
+    """
+    Recompute the day/week/month rollups over the window just written.
+
+    A failure is reported but does not fail the upload; `python rollups.py
+    --rebuild` catches the rollups up later.
+    """
+    if window is None:
+        return
+    print(f"\n=== Refreshing rollups for {window[0]}..{window[1]} ===")
+    try:
+        refresh_rollups_rest(client, *window)
+    except Exception as e:
+        print(f"  ⚠️  Rollup refresh failed: {e}")
+        print("  Run `python rollups.py --apply` once if the rollup tables do not exist yet.")
+
+
+def refresh_segment_cube(client: Client, start):
+    """Recompute the price-bridge segment cube from the first day written (non-fatal)."""
+    if start is None:
+        return
+    print(f"\n=== Refreshing {CUBE_TABLE} from {start} ===")
+    try:
+        refresh_cube_rest(client, start)
+    except Exception as e:
+        print(f"  ⚠️  {CUBE_TABLE} refresh failed: {e}")
+        print("  Run `python segment_cube.py --apply` once if the cube does not exist yet.")
+
+
+def refresh_price_summary(client: Client):
+    """Rebuild the dashboard card tables from the refreshed data (non-fatal)."""
+    print(f"\n=== Refreshing price summary and {STATS_TABLE} ===")
+    try:
+        refresh_summary_rest(client)
+    except Exception as e:
+        print(f"  ⚠️  Price summary refresh failed: {e}")
+        print("  Run `python price_summary.py --apply` once if the tables do not exist yet.")
+
 
+def refresh_market_notes(client: Client, window):
+    """Re-index the comment fields of the report days just written (non-fatal)."""
+    if window is None:
+        return
+    print(f"\n=== Refreshing {NOTES_TABLE} for {window[0]}..{window[1]} ===")
+    try:
+        refresh_notes_rest(client, *window)
+    except Exception as e:
+        print(f"  ⚠️  {NOTES_TABLE} refresh failed: {e}")
+        print("  Run `python market_notes.py --apply` once if the table does not exist yet.")
 
-def overwrite_supabase_data(unified_crop_price_df: pd.DataFrame):
+
+def refresh_sentiment(client: Client, window):
+    """Re-tally the market-tone keywords of the report days just indexed (non-fatal)."""
+    if window is None:
+        return
+    print(f"\n=== Refreshing {SENTIMENT_TABLE} for {window[0]}..{window[1]} ===")
+    try:
+        refresh_sentiment_rest(client, *window)
+    except Exception as e:
+        print(f"  ⚠️  {SENTIMENT_TABLE} refresh failed: {e}")
+        print("  Run `python sentiment.py --apply` once if the table does not exist yet.")
+
+
+def refresh_filter_index(writer: RestWriter, df: pd.DataFrame):
+    """Merge the filter combinations just uploaded into FilterIndex (non-fatal)."""
+    print(f"\n=== Merging filter combinations into {INDEX_TABLE} ===")
+    try:
+        merged = merge_filter_index(writer, df)
+        print(f"  ✔ {merged:,} combinations merged")
+    except Exception as e:
+        print(f"  ⚠️  {INDEX_TABLE} merge failed: {e}")
+        print("  Run `python filter_index.py --apply` once if the index does not exist yet.")
+
+
+def overwrite_supabase_data(unified_crop_price_df: pd.DataFrame, mode: str = None):
     """
     Main function to overwrite all data in the UnifiedCropPrice Supabase table.
 
     Args:
         unified_crop_price_df: DataFrame formatted for UnifiedCropPrice table
+        mode: "replace" deletes the data window and re-inserts it; "upsert" skips
+            the delete and writes ON CONFLICT on the natural key (requires
+            `python natural_key.py --apply` first). Defaults to $UPLOAD_MODE or
+            "replace".
 
     Returns:
         bool: True if successful, False otherwise
     """
+    mode = (mode or os.getenv("UPLOAD_MODE") or "replace").lower()
+
     if 'organic' in unified_crop_price_df.columns:
         before_count = len(unified_crop_price_df)
         unified_crop_price_df = unified_crop_price_df[unified_crop_price_df['organic'] != 'N/A']
@@ -189,25 +347,75 @@ def overwrite_supabase_data(unified_crop_price_df: pd.DataFrame):
     try:
         client = get_supabase_client()
 
+        # Key every row once the table has row_key, in replace mode too: a NULL
+        # key never conflicts, so a later upsert of the window would duplicate it.
+        if mode == "upsert" or table_has_key_rest(client, "UnifiedCropPrice"):
+            unified_crop_price_df = with_row_keys(unified_crop_price_df)
+
+        # One writer for the whole run, so its byte counts cover delete + upload.
+        writer = RestWriter(client)
+
         # Detect new columns BEFORE clearing (table must have rows to infer schema)
         print("\n=== Checking schema ===")
         unified_crop_price_df = detect_new_columns(client, "UnifiedCropPrice", unified_crop_price_df)
 
+        if mode == "upsert":
+            if KEY_COLUMN not in unified_crop_price_df.columns:
+                print(f"✘ Upsert mode needs the {KEY_COLUMN} column and unique index — "
+                      "run `python natural_key.py --apply` first.")
+                return False
+            print(f"\n=== Upserting on natural key ({', '.join(CONFLICT_COLUMNS)}) — no delete pass ===")
+            with stage("upload") as s:
+                sent = writer.sent_bytes
+                upload_dataframe(client, "UnifiedCropPrice", unified_crop_price_df,
+                                 on_conflict=",".join(CONFLICT_COLUMNS), writer=writer)
+                s.count(bytes=writer.sent_bytes - sent)
+            window = touched_window(unified_crop_price_df)
+            with stage("refresh"):
+                refresh_real_prices(client, window)
+                refresh_rollups(client, window)
+                refresh_segment_cube(client, window and window[0])
+                refresh_price_summary(client)
+                refresh_market_notes(client, window)
+                refresh_sentiment(client, window)
+                refresh_filter_index(writer, unified_crop_price_df)
+            writer.report()
+            print("\n✔ Supabase upload completed successfully!")
+            return True
+
         # Delete exactly the window we are about to re-insert, derived from the
         # data itself. Hardcoding the window here would let it drift out of sync
         # with the fetch window in update_daily.py and leave stale duplicates
         # behind. Historical data outside the window is preserved.
-        from datetime import datetime
+        from datetime import datetime, timedelta
 
         oldest = pd.to_datetime(unified_crop_price_df['report_date']).min().date()
         days = max((datetime.utcnow().date() - oldest).days, 0)
 
         print(f"\n=== Deleting data window being replaced (back to {oldest}) ===")
-        delete_recent_rows(client, "UnifiedCropPrice", days=days)
+        with stage("delete"):
+            delete_recent_rows(client, "UnifiedCropPrice", days=days, writer=writer)
 
         # Upload new data
         print("\n=== Uploading new data ===")
-        upload_dataframe(client, "UnifiedCropPrice", unified_crop_price_df)
+        with stage("upload") as s:
+            sent = writer.sent_bytes
+            upload_dataframe(client, "UnifiedCropPrice", unified_crop_price_df, writer=writer)
+            s.count(bytes=writer.sent_bytes - sent)
+
+        # The delete reached past the new data (up to a week ahead), so the
+        # real prices, rollups, note index and sentiment are recomputed over the whole replaced window.
+        window = touched_window(unified_crop_price_df)
+        replaced = (oldest, max(window[1], datetime.utcnow().date() + timedelta(days=7)))
+        with stage("refresh"):
+            refresh_real_prices(client, replaced)
+            refresh_rollups(client, replaced)
+            refresh_segment_cube(client, oldest)
+            refresh_price_summary(client)
+            refresh_market_notes(client, replaced)
+            refresh_sentiment(client, replaced)
+            refresh_filter_index(writer, unified_crop_price_df)
+        writer.report()
 
         print("\n✔ Supabase upload completed successfully!")
         return True
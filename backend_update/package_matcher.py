@@ -0,0 +1,265 @@
+"""
+Indexed fuzzy matching of (commodity, package) against a package reference.
+
+backend/update_weight_column.py and backend/find_missing_packages.py match a
+key that has no exact entry by scanning every reference entry and testing
+substring containment both ways:
+
+    (crop in commodity or commodity in crop) and
+    (pkg == package or pkg in package or package in pkg)
+
+which costs rows x entries. PackageMatcher indexes the reference once, on the
+character trigrams of each crop and package, and answers from the posting
+lists instead:
+
+  - `first(commodity, package)` is that scan's answer, the first entry in
+    reference order that passes the test (compatibility mode). "ref in query"
+    candidates are the entries all of whose trigrams occur in the query, "query
+    in ref" candidates the intersection of the query trigrams' postings; only
+    those are checked with `in`.
+  - `candidates(commodity, package, limit)` ranks entries by trigram overlap
+    (Dice coefficient) of crop and package, for suggesting the closest
+    reference entry when containment finds nothing.
+
+Strings under three characters have no trigrams and are checked directly.
+
+    matcher = PackageMatcher.from_entries(package_units)   # [{"crop", "package_size", ...}]
+    entry = matcher.first("Apples", "cartons tray pack")
+    ranked = matcher.candidates("Apples", "cartons tray pack", limit=5)
+
+Usage:
+    python package_matcher.py --benchmark   # scan vs index on missing_packages.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from package_weights import PACKAGE_UNITS_PATH
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+NGRAM = 3
+
+
+def normalize(value) -> str:
+    """Lower-case, as the matching scripts compare keys."""
+    return str(value or "").lower()
+
+
+def ngrams(s: str) -> set[str]:
+    return {s[i:i + NGRAM] for i in range(len(s) - NGRAM + 1)}
+
+
+def dice(a: set, b: set, shared: int) -> float:
+    return 2.0 * shared / (len(a) + len(b)) if a or b else 1.0
+
+
+class _Field:
+    """Trigram index over one column of the reference (crops or packages)."""
+
+    def __init__(self, values: list[str]):
+        self.values = values
+        self.grams = [ngrams(v) for v in values]
+        self.postings = defaultdict(set)
+        for i, grams in enumerate(self.grams):
+            for g in grams:
+                self.postings[g].add(i)
+        # Each entry is also filed under its rarest trigram: `v in query` needs
+        # every trigram of v in the query, so that one is enough to find it.
+        self.signatures = defaultdict(list)
+        self.short = []  # entries with no trigrams: always checked
+        for i, grams in enumerate(self.grams):
+            if grams:
+                self.signatures[min(grams, key=lambda g: (len(self.postings[g]), g))].append(i)
+            else:
+                self.short.append(i)
+
+    def overlap(self, grams: set[str]) -> dict[int, int]:
+        """entry -> number of the query's trigrams it shares."""
+        counts = defaultdict(int)
+        for g in grams:
+            for i in self.postings.get(g, ()):
+                counts[i] += 1
+        return counts
+
+    def containing(self, query: str) -> list[int]:
+        """Entries v with `v in query` or `query in v`, in reference order."""
+        grams = ngrams(query)
+        if not grams:
+            found = range(len(self.values))
+        else:
+            # v in query: filed under one of the query's trigrams.
+            found = set(self.short)
+            for g in grams:
+                found.update(self.signatures.get(g, ()))
+            # query in v: v holds every trigram of the query.
+            lists = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            if lists[0]:
+                found |= set.intersection(*lists)
+        return sorted(i for i in found if self.values[i] in query or query in self.values[i])
+
+
+class PackageMatcher:
+    """
+    Trigram index over reference (crop, package) pairs.
+
+    Args:
+        keys: (crop, package) per reference entry, in priority order.
+        values: the payload returned for each entry (same length as keys).
+    """
+
+    def __init__(self, keys: list[tuple[str, str]], values: list = None):
+        self.keys = [(normalize(c), normalize(p)) for c, p in keys]
+        self.values = list(values) if values is not None else list(keys)
+        self.exact = {}
+        for i, key in enumerate(self.keys):
+            self.exact.setdefault(key, i)
+        self.crops = _Field([c for c, _ in self.keys])
+        self.packages = _Field([p for _, p in self.keys])
+
+    @classmethod
+    def from_entries(cls, entries: list[dict], crop_key: str = "crop",
+                     package_key: str = "package_size") -> "PackageMatcher":
+        """Index package_units.json-style entries; lookups return the entry dicts."""
+        return cls([(e[crop_key], e[package_key]) for e in entries], entries)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, commodity, package):
+        """The entry for an exact (normalized) key, or None."""
+        i = self.exact.get((normalize(commodity), normalize(package)))
+        return None if i is None else self.values[i]
+
+    def first_index(self, commodity, package) -> int | None:
+        """Position of the first entry the substring scan would pick, or None."""
+        commodity, package = normalize(commodity), normalize(package)
+        for i in self.crops.containing(commodity):
+            pkg = self.keys[i][1]
+            if pkg == package or pkg in package or package in pkg:
+                return i
+        return None
+
+    def first(self, commodity, package):
+        """Compatibility mode: the entry the old substring scan returns, or None."""
+        i = self.first_index(commodity, package)
+        return None if i is None else self.values[i]
+
+    def scan(self, commodity, package):
+        """The original O(entries) substring scan, for comparison."""
+        commodity, package = normalize(commodity), normalize(package)
+        for i, (crop, pkg) in enumerate(self.keys):
+            if (crop in commodity or commodity in crop) and \
+                    (pkg == package or pkg in package or package in pkg):
+                return self.values[i]
+        return None
+
+    def candidates(self, commodity, package, limit: int = 5) -> list[tuple[float, object]]:
+        """
+        Up to `limit` (score, entry) pairs, best first. The score averages the
+        crop and package trigram Dice coefficients; an entry must share at
+        least one crop trigram with the commodity.
+        """
+        commodity, package = normalize(commodity), normalize(package)
+        c_grams, p_grams = ngrams(commodity), ngrams(package)
+        crop_hits = self.crops.overlap(c_grams)
+        pkg_hits = self.packages.overlap(p_grams)
+        scored = []
+        for i, shared in crop_hits.items():
+            if self.exact[self.keys[i]] != i:
+                continue  # a later duplicate of a key; the first one is scored
+            score = (dice(c_grams, self.crops.grams[i], shared)
+                     + dice(p_grams, self.packages.grams[i], pkg_hits.get(i, 0))) / 2
+            scored.append((score, -i))
+        scored.sort(reverse=True)
+        return [(round(score, 3), self.values[-i]) for score, i in scored[:limit]]
+
+
+def load_reference(path: str = None) -> list[dict]:
+    with open(path or PACKAGE_UNITS_PATH) as f:
+        return json.load(f)
+
+
+def _bench_case(label: str, queries: list[tuple], reference: list[dict], repeat: int):
+    t0 = time.perf_counter()
+    matcher = PackageMatcher.from_entries(reference)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    def timed(fn):
+        t = time.perf_counter()
+        for _ in range(repeat):
+            out = [fn(c, p) for c, p in queries]
+        return out, (time.perf_counter() - t) / (repeat * len(queries)) * 1e6
+
+    scanned, scan_us = timed(matcher.scan)
+    indexed, index_us = timed(matcher.first)
+    _, rank_us = timed(matcher.candidates)
+    differences = sum(a is not b for a, b in zip(scanned, indexed))
+    matched = sum(a is not None for a in indexed)
+    print(f"\n{label}: {len(queries)} keys x {len(matcher):,} entries "
+          f"(index built in {build_ms:.1f} ms, {matched} matched)")
+    print(f"  substring scan   : {scan_us:8.1f} µs/key")
+    print(f"  indexed first()  : {index_us:8.1f} µs/key  ({scan_us / index_us:.1f}x, "
+          f"{differences} differences)")
+    print(f"  candidates(5)    : {rank_us:8.1f} µs/key")
+    return matcher
+
+
+def benchmark(repeat: int = 20):
+    """
+    Old scan vs indexed lookup on the real missing_packages.json keys, against
+    the reference as it is now (package_units.json + package_guess.json, which
+    cover those keys, so the scan stops early), as it was when they were
+    missing (their entries removed, so most scans run to the end), and with
+    that reference grown tenfold by suffixing the crop names.
+    """
+    with open(os.path.join(BACKEND_DIR, "missing_packages.json")) as f:
+        queries = [(m["commodity"], m["package"]) for m in json.load(f)]
+    reference = load_reference()
+    guesses_path = os.path.join(BACKEND_DIR, "package_guess.json")
+    if os.path.exists(guesses_path):
+        with open(guesses_path) as f:
+            reference += json.load(f)
+
+    missing = {(normalize(c), normalize(p)) for c, p in queries}
+    before = [e for e in reference
+              if (normalize(e["crop"]), normalize(e["package_size"])) not in missing]
+    grown = before + [dict(e, crop=f"{e['crop']} {n}") for n in range(1, 10) for e in before]
+
+    matcher = _bench_case("Current reference", queries, reference, repeat)
+    _bench_case("Before the missing keys were added", queries, before, repeat)
+    _bench_case("That reference x10", queries, grown, repeat)
+
+    print("\nClosest entries:")
+    for c, p in queries[:5]:
+        top = ", ".join(f"{e['crop']} / {e['package_size']} ({s})"
+                        for s, e in matcher.candidates(c, p, limit=2))
+        print(f"  {c}: {p}  ->  {top}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed fuzzy package matcher")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare the substring scan with the index on missing_packages.json")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("commodity", nargs="?")
+    parser.add_argument("package", nargs="?")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.repeat)
+        return
+    if not args.commodity or args.package is None:
+        parser.error("give COMMODITY PACKAGE, or --benchmark")
+
+    matcher = PackageMatcher.from_entries(load_reference())
+    print(f"first: {matcher.first(args.commodity, args.package)}")
+    for score, entry in matcher.candidates(args.commodity, args.package):
+        print(f"  {score:.3f}  {entry['crop']} / {entry['package_size']}  {entry.get('weight_lbs')} lb")
+
+
+if __name__ == "__main__":
+    main()
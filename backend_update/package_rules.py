@@ -0,0 +1,223 @@
+"""
+Rule-based weight guesses for packages no source can weigh.
+
+When a (commodity, package) is neither measurable from its description nor in
+package_units.json (see package_weights.py), backend/generate_package_guesses.py
+and backend/add_missing_packages.py estimate a net weight from the package
+type and, for some types, the commodity. Both scripts used to carry their own
+copy of these rules as if-chains. They now live here, as two tables
+evaluated in order, where the first matching rule wins:
+
+    EXTRACT_RULES  read a figure from the description ("30 lb", "12 6-oz",
+                   "12 1-pint" at ~0.9 lb per pint) and scale it
+    GUESS_RULES    standard weights by package type, optionally narrowed by
+                   a commodity pattern (USDA Handbook 697 where it has one)
+
+RuleEngine evaluates both tables over whole columns. Each rule is a
+vectorized regex test over the distinct pairs still unmatched, not a Python
+loop per entry. Results are memoized by (commodity, package), since some
+rules depend on the commodity, and record the name of the rule that matched.
+
+    engine = RuleEngine()
+    guesses = engine.evaluate(df["commodity"], df["package"])
+    # -> weight_lbs, weight_kg, units, rule, source per row
+
+Usage:
+    python package_rules.py                 # guesses for backend/missing_packages.json
+    python package_rules.py --rules         # print the rule tables
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+KG_PER_LB = 0.453592
+LB_PER_KG = 2.20462
+
+RESULT_COLUMNS = ("weight_lbs", "weight_kg", "units", "rule", "source")
+
+# (name, package regex with captured numbers, lbs per captured unit, source).
+# The weight is the product of the captured numbers times the factor.
+EXTRACT_RULES = [
+    ("lb", r"(\d+(?:\.\d+)?)\s*(?:lb|lbs)", 1.0, "Derived from package name"),
+    ("kg", r"(\d+(?:\.\d+)?)\s*kg", LB_PER_KG, "Derived from package name"),
+    ("count_1_lb", r"(\d+)\s+1-lb", 1.0, "Derived from package name"),
+    ("count_x_lb", r"(\d+)\s+(\d+)-lb", 1.0, "Derived from package name"),
+    ("count_x_oz", r"(\d+)\s+(\d+(?:\.\d+)?)-oz", 1 / 16, "Derived from package name"),
+    ("count_pint", r"(\d+)\s+(?:\d+/\d+-)?(?:pint|1-pint)", 0.9, "Derived from package name"),
+]
+
+HERBS = ["basil", "bay leaves", "chervil", "chives", "cilantro", "dill", "epasote", "epazote",
+         "fenugreek", "marjoram", "mint", "oregano", "parsley", "rosemary", "sage",
+         "savory", "sorrel", "tarragon", "thyme", "watercress", "verdolaga"]
+
+# Extractions whose pounds are a conversion (kilograms, ounces, pints); these
+# are kept to one decimal. Figures stated in pounds are kept as stated.
+CONVERTED_RULES = {"kg", "count_x_oz", "count_pint"}
+
+LEAFY_GREENS = ["greens", "collard", "dandelion", "kale", "mustard", "swiss chard"]
+
+
+def _any(words) -> str:
+    return "|".join(words)
+
+
+# Plain cartons; "cartons ... bunched" that the bunched rules miss is not one.
+_CARTONS = r"^(?!.*bunched).*cartons"
+
+# (name, package regex, commodity regex or None, weight_lbs, source)
+GUESS_RULES = [
+    ("bushel_1_1_9_peppers", r"1[ -]1/9 bushel", r"pepper", 28, "USDA Handbook 697 - 1 1/9 bushel peppers"),
+    ("bushel_1_1_9_peas", r"1[ -]1/9 bushel", r"pea", 28, "USDA Handbook 697 - 1 1/9 bushel peas"),
+    ("bushel_1_1_9_squash", r"1[ -]1/9 bushel", r"squash", 35, "USDA Handbook 697 - 1 1/9 bushel squash"),
+    ("bushel_1_1_9_eggplant", r"1[ -]1/9 bushel", r"eggplant", 33, "USDA Handbook 697 - 1 1/9 bushel eggplant"),
+    ("bushel_1_1_9", r"1[ -]1/9 bushel", None, 30, "USDA Handbook 697 - 1 1/9 bushel default"),
+    ("bushel_4_7", r"4/7 bushel", None, 21, "USDA Handbook 697 - 4/7 bushel"),
+    ("bushel", r"bushel", None, 30, "USDA Handbook 697 - standard bushel"),
+    ("bunched_herbs", r"(?:cartons|crates) bunched", _any(HERBS), 5, "Herb bunched carton estimate"),
+    ("bunched_greens", r"(?:cartons|crates) bunched", _any(LEAFY_GREENS), 25,
+     "Leafy greens bunched carton - USDA standard"),
+    ("bunched", r"(?:cartons|crates) bunched", None, 12, "Bunched carton estimate"),
+    ("film_bags_bunched", r"film bags bunched", None, 5, "Film bags bunched estimate"),
+    ("film_bag_1_lb", r"1 lb film bags", None, 1, "Single 1 lb film bag"),
+    ("film_lined_lettuce", r"cartons film lined", r"lettuce", 24, "USDA Handbook 697 - Lettuce cartons"),
+    ("film_lined", r"cartons film lined", None, 24, "Film-lined carton estimate"),
+    ("cartons_lettuce", _CARTONS, r"lettuce", 24, "USDA Handbook 697 - Lettuce cartons"),
+    ("cartons_endive", _CARTONS, r"endive|escarole", 18, "Endive/Escarole carton estimate"),
+    ("cartons_mushroom", _CARTONS, r"mushroom", 10, "Mushroom carton estimate"),
+    ("cartons_artichoke", _CARTONS, r"artichoke", 22, "Artichoke carton - USDA standard"),
+    ("cartons_anise", _CARTONS, r"anise", 20, "Anise carton estimate"),
+    ("cartons_tomato", _CARTONS, r"tomato", 25, "USDA Handbook 697 - Tomato cartons"),
+    ("cartons", _CARTONS, None, 25, "Generic carton estimate"),
+    ("layer_radicchio", r"layer", r"radicchio", 12, "Radicchio layer container estimate"),
+    ("layer_tomato", r"layer", r"tomato", 20, "Tomato flat layer estimate"),
+    ("layer", r"layer", None, 15, "Layer container estimate"),
+    ("flats", r"flats", None, 12, "Flat estimate"),
+    ("crate", r"crate", None, 35, "Crate estimate"),
+    ("container", r"container", None, 25, "Generic container estimate"),
+    ("sack", r"sack", None, 50, "Sack estimate"),
+    ("rpc", r"rpc|reusable plastic", None, 30, "RPC estimate"),
+    ("lug", r"lug", None, 25, "Lug estimate"),
+    ("default", None, None, 25, "Default estimate"),
+]
+
+# Guesses whose kilograms are not their pounds converted to one decimal.
+GUESS_KG = {"film_bag_1_lb": 0.45}
+
+
+class RuleEngine:
+    """
+    EXTRACT_RULES then GUESS_RULES over columns of (commodity, package),
+    memoized by pair.
+    """
+
+    def __init__(self, extract_rules=EXTRACT_RULES, guess_rules=GUESS_RULES):
+        self.extract_rules = list(extract_rules)
+        self.guess_rules = list(guess_rules)
+        self.memo = {}
+
+    def _evaluate_unique(self, comm: pd.Series, pkg: pd.Series) -> pd.DataFrame:
+        """Rules over distinct, lower-cased pairs; one vectorized test per rule."""
+        n = len(pkg)
+        lbs = np.full(n, np.nan)
+        rule = np.full(n, None, dtype=object)
+        source = np.full(n, None, dtype=object)
+        stated_kg = np.full(n, np.nan)
+        open_ = np.ones(n, dtype=bool)
+
+        for name, pattern, factor, src in self.extract_rules:
+            if not open_.any():
+                break
+            found = pkg[open_].str.extract(pattern, expand=True).astype(float)
+            product = found.prod(axis=1, skipna=False)
+            hit = product.notna()
+            idx = np.flatnonzero(open_)[hit.to_numpy()]
+            lbs[idx] = product[hit].to_numpy() * factor
+            rule[idx], source[idx] = name, src
+            if name == "kg":
+                stated_kg[idx] = product[hit].to_numpy()
+            open_[idx] = False
+
+        for name, pattern, comm_pattern, weight, src in self.guess_rules:
+            if not open_.any():
+                break
+            match = open_.copy()
+            if pattern is not None:
+                match &= pkg.str.contains(pattern, regex=True).to_numpy()
+            if comm_pattern is not None:
+                match &= comm.str.contains(comm_pattern, regex=True).to_numpy()
+            idx = np.flatnonzero(match)
+            lbs[idx] = weight
+            rule[idx], source[idx] = name, src
+            open_[idx] = False
+
+        # Kilograms are the pounds converted to one decimal and converted pounds
+        # are kept to one decimal, as the scripts wrote them; a kilogram figure
+        # read from the name is kept as stated.
+        rules = pd.Series(rule, dtype=object)
+        kg = np.where(np.isnan(stated_kg), np.round(lbs * KG_PER_LB, 1), stated_kg)
+        lbs = np.where(rules.isin(CONVERTED_RULES).to_numpy(), np.round(lbs, 1), lbs)
+        kg = np.where(rules.isin(GUESS_KG).to_numpy(), rules.map(GUESS_KG).to_numpy(dtype=float), kg)
+        return pd.DataFrame({"weight_lbs": lbs, "weight_kg": kg, "units": None,
+                             "rule": rule, "source": source})
+
+    def evaluate(self, commodities, packages) -> pd.DataFrame:
+        """RESULT_COLUMNS for each (commodity, package), aligned with `packages`."""
+        packages = pd.Series(packages)
+        index = packages.index
+        commodities = pd.Series(np.asarray(commodities, dtype=object), index=index)
+        keys = pd.Series(list(zip(
+            commodities.fillna("").astype(str).str.lower().str.strip(),
+            packages.fillna("").astype(str).str.lower().str.strip())), index=index, dtype=object)
+        codes, uniques = pd.factorize(keys)
+        todo = [k for k in uniques if k not in self.memo]
+        if todo:
+            comm = pd.Series([c for c, _ in todo], dtype=object)
+            pkg = pd.Series([p for _, p in todo], dtype=object)
+            fresh = self._evaluate_unique(comm, pkg)
+            for key, row in zip(todo, fresh.itertuples(index=False, name=None)):
+                self.memo[key] = row
+        out = pd.DataFrame([self.memo[k] for k in uniques], columns=list(RESULT_COLUMNS))
+        out = out.iloc[codes].set_index(index)
+        out["weight_lbs"] = out["weight_lbs"].astype(float)
+        out["weight_kg"] = out["weight_kg"].astype(float)
+        out["units"] = None
+        return out
+
+    def guess(self, commodity, package) -> tuple:
+        """One pair: (weight_lbs, weight_kg, units, rule, source)."""
+        return tuple(self.evaluate([commodity], [package]).iloc[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule-based package weight guesses")
+    parser.add_argument("--rules", action="store_true", help="Print the rule tables")
+    parser.add_argument("--input", default=os.path.join(BACKEND_DIR, "missing_packages.json"),
+                        help="JSON list of {commodity, package} (default: backend/missing_packages.json)")
+    args = parser.parse_args()
+
+    if args.rules:
+        for name, pattern, factor, src in EXTRACT_RULES:
+            print(f"  {name:<22} /{pattern}/ x {factor:.4g} lb  ({src})")
+        for name, pattern, comm_pattern, weight, src in GUESS_RULES:
+            when = f" if commodity ~ /{comm_pattern}/" if comm_pattern else ""
+            print(f"  {name:<22} /{pattern or '.*'}/{when} -> {weight} lb  ({src})")
+        return
+
+    with open(args.input) as f:
+        df = pd.DataFrame(json.load(f))
+    t0 = time.perf_counter()
+    guesses = RuleEngine().evaluate(df["commodity"], df["package"])
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(guesses["rule"].value_counts().to_string())
+    print(f"\n{len(df):,} packages guessed in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
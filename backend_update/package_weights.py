@@ -0,0 +1,386 @@
+"""
+Package weight resolution shared by every pipeline.
+
+A (commodity, package) pair gets its (weight_lbs, weight_kgs, units) from the
+first of these sources that knows it:
+
+    parsed     the package description itself ("25 lb sacks", "flats 12
+               1-pint baskets", "each"), via parse_package_measures
+    reference  package_units.json, exact (crop, package) match — USDA Handbook
+               697 plus explicit report weights, for bare descriptions like
+               "cartons tray pack" that carry no figure
+    guess      backend/package_guess.json, exact match — the estimates
+               generate_package_guesses.py writes for keys still missing
+
+The uploads (format_data), the bulk recompute (recompute_columns.py) and the
+backend scripts all go through PackageWeights, so a key resolves the same way
+everywhere. There is one package_units.json, next to this module.
+
+The two JSON files are compiled into exact-match dicts once, and every
+resolved pair is memoized. Both are pickled to CACHE_PATH and reloaded while
+the source files and this module are unchanged, so a run starts with what
+earlier runs already resolved.
+
+    from package_weights import get_resolver
+    weights = get_resolver()
+    weights.measures("Apples", "cartons tray pack")      # (40.0, 18.14, None)
+    weights.resolve("Apples", "cartons tray pack")       # (..., "reference")
+    weights.resolve_frame(df)                            # whole columns at once
+
+Usage:
+    python package_weights.py Apples "cartons tray pack"
+    python package_weights.py --stats
+"""
+
+import argparse
+import atexit
+import json
+import os
+import pickle
+import re
+import time
+
+import pandas as pd
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+PACKAGE_UNITS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "package_units.json")
+PACKAGE_GUESS_PATH = os.path.join(BACKEND_DIR, "package_guess.json")
+
+CACHE_PATH = os.getenv(
+    "PACKAGE_WEIGHTS_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "package_weights.pickle"),
+)
+
+SOURCES = ("parsed", "reference", "guess")
+
+RESULT_COLUMNS = ("weight_lbs", "weight_kgs", "units", "weight_source")
+
+# Conversion constant
+LB_PER_KG = 2.20462
+
+
+# ─── Parsing package descriptions ───────────────────────────────────────────
+
+def _parse_mixed_number(s):
+    """
+    Parse a USDA numeric token that may contain whole + fractional parts.
+
+    Handles: '5', '19.8', '1/2', '1 1/9', '2-1/2', '3 1/2'.
+    The dash form ('2-1/2') and space form ('3 1/2') both mean whole + fraction.
+    """
+    s = s.strip().replace('-', ' ')
+    total = 0.0
+    for tok in s.split():
+        if '/' in tok:
+            num, den = tok.split('/')
+            total += float(num) / float(den)
+        else:
+            total += float(tok)
+    return total
+
+
+def _lbs_kgs(lbs):
+    """Return (weight_lbs, weight_kgs) rounded, derived from a pound figure."""
+    return round(lbs, 2), round(lbs / LB_PER_KG, 2)
+
+
+def _kgs_lbs(kgs):
+    """Return (weight_lbs, weight_kgs) rounded, derived from a kilogram figure."""
+    return round(kgs * LB_PER_KG, 2), round(kgs, 2)
+
+
+def parse_package_measures(package):
+    """
+    Derive (weight_lbs, weight_kgs, units) from a USDA package description.
+
+    weight_lbs / weight_kgs are the TOTAL net product weight of the package (kg is
+    derived from lbs and vice-versa so both columns are populated whenever either is
+    known). `units` is the count of individual sellable sub-units in the package
+    (e.g. the 12 in 'flats 12 1-pint baskets', or 1 for 'each'). Any value that
+    cannot be derived from the string is returned as None.
+
+    Patterns covered, in priority order:
+      1. Combined kg + lb        -> '5 kg/11 lb cartons', '9 kg (19.8 lb) containers'
+      2. Priced per pound        -> 'per lb', 'per pound'                  (weight=1 lb)
+      3. Count x per-unit measure-> 'cartons 12 1-lb film bags', 'flats 12 5-oz cups',
+                                     'cartons 4 2-1/2 lb film bags', 'flats 12 125-gm cups'
+      4. Leading kilograms       -> '10 kg containers', '3.5 kg containers'
+      5. Leading pounds (+range) -> '25 lb sacks', '30-35 lb cartons', '2 pound bags'
+      6. Leading ounces (+range) -> '6 oz package', '5-9 oz package'
+      7. Leading grams           -> '100 gm packages'
+      8. Per-item pricing        -> 'each', 'per bunch', 'per sleeve'      (units=1)
+      9. Leading count/volume    -> bare 'N pint' / 'N count'
+
+    Bushels and bare containers ('cartons', 'bins', 'lugs', '1 layer', 'N inch')
+    yield no weight because the figure depends on the commodity, so they stay None.
+    """
+    if package is None or (isinstance(package, float) and pd.isna(package)) or str(package).strip() == "":
+        return None, None, None
+
+    s = str(package).lower().strip()
+
+    # 1. Combined "X kg/Y lb" or "X kg (Y lb)" — both figures are stated explicitly.
+    m = re.search(r'(\d+(?:\.\d+)?)\s*kg\s*[/(]\s*(\d+(?:\.\d+)?)\s*lb', s)
+    if m:
+        return round(float(m.group(2)), 2), round(float(m.group(1)), 2), None
+
+    # 2. Priced by the pound — normalize to a 1 lb basis so price/weight = price/lb.
+    if re.search(r'\bper\s+(?:lbs?|pounds?)\b', s):
+        return (*_lbs_kgs(1.0), None)
+
+    # 3. Count x per-unit measure, e.g. "12 1-lb", "4 2-1/2 lb", "12 18-oz", "12 125-gm".
+    m = re.search(r'(\d+)\s+([\d./\s-]*?\d)\s*-?\s*'
+                  r'(lbs?|pounds?|oz|gms?|grams?|kgs?|pints?|pt|cups?|count|ct)\b', s)
+    if m:
+        count = int(m.group(1))
+        each = _parse_mixed_number(m.group(2))
+        unit = m.group(3)
+        if unit.startswith(('lb', 'pound')):
+            return (*_lbs_kgs(count * each), count)
+        if unit == 'oz':
+            return (*_lbs_kgs(count * each / 16.0), count)
+        if unit.startswith('kg'):
+            return (*_kgs_lbs(count * each), count)
+        if unit.startswith(('gm', 'gram')):
+            return (*_kgs_lbs(count * each / 1000.0), count)
+        if unit in ('count', 'ct'):
+            # "12 3-count packages" -> 36 individual items
+            return None, None, int(count * each) if each else count
+        # pint / pt / cup -> volume measure, weight depends on commodity
+        return None, None, count
+
+    # 4. Leading kilograms, e.g. "10 kg containers".
+    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)\s*kg\b', s)
+    if m:
+        return (*_kgs_lbs(float(m.group(1))), None)
+
+    # 5. Leading pounds, optionally a range "30-35 lb" (use the midpoint).
+    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(?:lbs?|pounds?)\b', s)
+    if m:
+        lo = float(m.group(1))
+        hi = float(m.group(2)) if m.group(2) else lo
+        return (*_lbs_kgs((lo + hi) / 2.0), None)
+
+    # 6. Leading ounces, optionally a range. Skip fluid-ounce volumes ("64 oz (1 gallon)").
+    if 'gallon' not in s:
+        m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*oz\b', s)
+        if m:
+            lo = float(m.group(1))
+            hi = float(m.group(2)) if m.group(2) else lo
+            return (*_lbs_kgs((lo + hi) / 2.0 / 16.0), None)
+
+    # 7. Leading grams, e.g. "100 gm packages".
+    m = re.search(r'(?<![\d.])(\d+(?:\.\d+)?)\s*(?:gms?|grams?)\b', s)
+    if m:
+        return (*_kgs_lbs(float(m.group(1)) / 1000.0), None)
+
+    # 8. Per-item pricing with no weight, e.g. "each", "per bunch", "per sleeve".
+    if s == 'each' or s.startswith('per '):
+        return None, None, 1
+
+    # 9. Bare count / volume with no weight, e.g. "1 pint containers", "3 count".
+    m = re.search(r'(?<![\d.])(\d+)\s*(pints?|pt|count|ct|cups?)\b', s)
+    if m:
+        return None, None, int(m.group(1))
+
+    return None, None, None
+
+
+# ─── Resolver ───────────────────────────────────────────────────────────────
+
+def _key(value) -> str:
+    return str(value).lower().strip() if value is not None else ""
+
+
+def _load_entries(path: str) -> dict:
+    """{(crop_lower, package_lower): (weight_lbs, weight_kgs, units)} from a package JSON file."""
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    ref = {}
+    for entry in entries:
+        crop = _key(entry.get("crop"))
+        pkg = _key(entry.get("package_size"))
+        if not crop or not pkg:
+            continue
+        lbs = entry.get("weight_lbs")
+        kgs = entry.get("weight_kg")
+        if lbs is None:
+            continue
+        lbs = round(float(lbs), 2)
+        kgs = round(float(kgs), 2) if kgs is not None else round(lbs / LB_PER_KG, 2)
+        ref.setdefault((crop, pkg), (lbs, kgs, entry.get("units")))
+    return ref
+
+
+def _signature(paths) -> tuple:
+    """What the compiled index depends on: the source files and this module."""
+    sig = []
+    for path in (*paths, os.path.abspath(__file__)):
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None, None))
+    return tuple(sig)
+
+
+class PackageWeights:
+    """
+    Compiled, memoized (commodity, package) -> measures resolver.
+
+    Args:
+        units_path / guess_path: the reference and guess JSON files.
+        cache_path: pickle of the compiled index and memo (None disables it).
+    """
+
+    def __init__(self, units_path: str = PACKAGE_UNITS_PATH, guess_path: str = PACKAGE_GUESS_PATH,
+                 cache_path: str | None = CACHE_PATH):
+        self.units_path, self.guess_path, self.cache_path = units_path, guess_path, cache_path
+        self.signature = _signature((units_path, guess_path))
+        self.loaded_from_cache = False
+        self._matcher = None
+        if not self._load_cache():
+            self.reference = _load_entries(units_path)
+            self.guess = _load_entries(guess_path)
+            self.memo = {}
+        self._saved_size = len(self.memo) if self.loaded_from_cache else -1
+
+    def _load_cache(self) -> bool:
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return False
+        if state.get("signature") != self.signature:
+            return False
+        self.reference, self.guess, self.memo = state["reference"], state["guess"], state["memo"]
+        self.loaded_from_cache = True
+        return True
+
+    def save(self):
+        """Write the compiled index and memo to cache_path, if anything new was resolved."""
+        if not self.cache_path or len(self.memo) == self._saved_size:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"signature": self.signature, "reference": self.reference,
+                         "guess": self.guess, "memo": self.memo}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.cache_path)
+        self._saved_size = len(self.memo)
+
+    def resolve(self, commodity, package) -> tuple:
+        """(weight_lbs, weight_kgs, units, source) — all None when no source knows the pair."""
+        if package is None or (isinstance(package, float) and pd.isna(package)):
+            package = None
+        key = (_key(commodity), _key(package))
+        hit = self.memo.get(key)
+        if hit is not None:
+            return hit
+
+        weight_lbs, weight_kgs, units = parse_package_measures(package)
+        if weight_lbs is not None or units is not None:
+            hit = (weight_lbs, weight_kgs, units, "parsed")
+        elif package is not None and key in self.reference:
+            hit = (*self.reference[key], "reference")
+        elif package is not None and key in self.guess:
+            hit = (*self.guess[key], "guess")
+        else:
+            hit = (None, None, None, None)
+        self.memo[key] = hit
+        return hit
+
+    def measures(self, commodity, package) -> tuple:
+        """(weight_lbs, weight_kgs, units) for a pair."""
+        return self.resolve(commodity, package)[:3]
+
+    def resolve_many(self, pairs) -> list[tuple]:
+        """resolve() over an iterable of (commodity, package)."""
+        return [self.resolve(c, p) for c, p in pairs]
+
+    def resolve_frame(self, df: pd.DataFrame, commodity_col: str = "commodity",
+                      package_col: str = "package") -> pd.DataFrame:
+        """
+        RESULT_COLUMNS for every row of df (same index), resolving each distinct
+        pair once.
+        """
+        if df.empty:
+            return pd.DataFrame(columns=list(RESULT_COLUMNS), index=df.index)
+        cols = [df[c].astype(object).where(df[c].notna(), None) for c in (commodity_col, package_col)]
+        codes, uniques = pd.factorize(pd.Series(list(zip(*cols)), dtype=object))
+        resolved = pd.DataFrame(self.resolve_many(uniques), columns=list(RESULT_COLUMNS))
+        out = resolved.iloc[codes].set_index(df.index)
+        return out.astype({"weight_lbs": "float64", "weight_kgs": "float64", "units": "float64"})
+
+    def suggest(self, commodity, package, limit: int = 5) -> list[tuple[float, dict]]:
+        """Closest reference / guess entries for a pair no source knows (see package_matcher.py)."""
+        if self._matcher is None:
+            from package_matcher import PackageMatcher
+            keys = list(self.reference) + [k for k in self.guess if k not in self.reference]
+            values = [{"crop": c, "package_size": p,
+                       **dict(zip(("weight_lbs", "weight_kg", "units"), self.reference.get((c, p))
+                                  or self.guess[(c, p)]))} for c, p in keys]
+            self._matcher = PackageMatcher(keys, values)
+        return self._matcher.candidates(commodity, package, limit)
+
+
+_resolver = None
+
+
+def get_resolver() -> PackageWeights:
+    """The process-wide resolver; its memo is saved to the cache at exit."""
+    global _resolver
+    if _resolver is None:
+        _resolver = PackageWeights()
+        atexit.register(_resolver.save)
+    return _resolver
+
+
+def package_measures(commodity, package):
+    """(weight_lbs, weight_kgs, units) for a commodity's package, from the shared resolver."""
+    return get_resolver().measures(commodity, package)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve package weights")
+    parser.add_argument("commodity", nargs="?")
+    parser.add_argument("package", nargs="?")
+    parser.add_argument("--stats", action="store_true", help="Sources, cache state and timings")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    weights = get_resolver()
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    if args.stats:
+        print(f"reference : {len(weights.reference):,} entries ({weights.units_path})")
+        print(f"guess     : {len(weights.guess):,} entries ({weights.guess_path})")
+        print(f"memo      : {len(weights.memo):,} resolved pairs "
+              f"({'from cache' if weights.loaded_from_cache else 'compiled'} in {load_ms:.1f} ms)")
+        counts = {}
+        for *_, source in weights.memo.values():
+            counts[source] = counts.get(source, 0) + 1
+        for source in (*SOURCES, None):
+            print(f"  {source or 'unresolved'}: {counts.get(source, 0):,}")
+        return
+    if not args.commodity or args.package is None:
+        parser.error("give COMMODITY PACKAGE, or --stats")
+
+    weight_lbs, weight_kgs, units, source = weights.resolve(args.commodity, args.package)
+    print(f"{args.commodity} / {args.package}: weight_lbs={weight_lbs} weight_kgs={weight_kgs} "
+          f"units={units} ({source or 'unresolved'})")
+    if source is None:
+        for score, entry in weights.suggest(args.commodity, args.package):
+            print(f"  closest: {score:.3f}  {entry['crop']} / {entry['package_size']}  "
+                  f"{entry['weight_lbs']} lb")
+
+
+if __name__ == "__main__":
+    main()
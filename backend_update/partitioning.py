@@ -0,0 +1,538 @@
+"""
+Yearly range partitioning of UnifiedCropPrice on report_date.
+
+The frontends keep querying "UnifiedCropPrice"; after the migration that name
+is a partitioned table with one partition per calendar year (UTC):
+
+    UnifiedCropPrice            PARTITION BY RANGE (report_date)
+      UnifiedCropPrice_2019     [2019-01-01, 2020-01-01)
+      ...
+      UnifiedCropPrice_default  anything without a year partition yet
+
+Date-bounded deletes and scans are pruned to the partitions they overlap, so
+the daily window only touches the current year, and a whole historical year
+can be rebuilt off to the side and swapped in (YearSwap) instead of deleted
+row by row.
+
+Migration (--apply), run between daily pipeline runs:
+  1. create UnifiedCropPrice_partitioned with the same columns, yearly
+     partitions, grants and row-level security policies;
+  2. copy rows month by month (each month is one committed statement);
+  3. rebuild the existing indexes on it; the primary key becomes
+     (id, report_date) because a partitioned unique key must include the
+     partition key;
+  4. in one short transaction, copy any rows added meanwhile and swap names.
+     The old table is kept as UnifiedCropPrice_legacy until dropped by hand.
+
+Usage:
+    python partitioning.py --ddl      # print the table/index SQL for this database
+    python partitioning.py --apply    # run the migration via DB_CONNECTION_STRING
+    python partitioning.py --ensure   # create partitions through next year
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+TABLE_NAME = "UnifiedCropPrice"
+
+PARTITION_KEY = "report_date"
+
+DEFAULT_PARTITION = f"{TABLE_NAME}_default"
+
+# Names used only while migrating.
+NEW_TABLE = f"{TABLE_NAME}_partitioned"
+LEGACY_TABLE = f"{TABLE_NAME}_legacy"
+
+# ids for the partitioned table; stage tables draw from it too, so ids stay
+# unique across swapped-in years.
+ID_SEQUENCE = f"{TABLE_NAME}_rowid_seq"
+
+# Suffix for indexes built on NEW_TABLE until the names are swapped.
+_NEW_INDEX_SUFFIX = "_part"
+
+_INDEX_DEF = re.compile(r"^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)$")
+
+
+def partition_name(year: int) -> str:
+    return f"{TABLE_NAME}_{year}"
+
+
+def stage_name(year: int) -> str:
+    return f"{TABLE_NAME}_stage_{year}"
+
+
+def year_bounds(year: int) -> tuple[str, str]:
+    """[start, end) of a year partition, pinned to UTC regardless of session TimeZone."""
+    return f"{year}-01-01 00:00:00+00", f"{year + 1}-01-01 00:00:00+00"
+
+
+# ── Introspection ─────────────────────────────────────────────────────────────
+
+def is_partitioned(cur, table: str = TABLE_NAME) -> bool:
+    cur.execute(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = 'public' AND c.relname = %s",
+        (table,),
+    )
+    row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def table_exists(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public."{table}"',))
+    return cur.fetchone()[0]
+
+
+def attached_years(cur) -> set[int]:
+    """Years that currently have their own partition."""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        (f'public."{TABLE_NAME}"',),
+    )
+    prefix = f"{TABLE_NAME}_"
+    return {
+        int(name[len(prefix):]) for (name,) in cur.fetchall()
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    }
+
+
+def table_columns(cur, table: str = TABLE_NAME) -> list[str]:
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position",
+        (table,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def index_definitions(cur, table: str) -> list[dict]:
+    """Indexes on table: name, whether unique/primary, column list and definition."""
+    cur.execute(
+        """
+        SELECT ic.relname, i.indisunique, i.indisprimary,
+               pg_get_indexdef(i.indexrelid),
+               con.conname, pg_get_constraintdef(con.oid),
+               ARRAY(SELECT a.attname FROM unnest(i.indkey) k
+                     JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k)
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid
+        WHERE i.indrelid = %s::regclass
+        ORDER BY ic.relname
+        """,
+        (f'public."{table}"',),
+    )
+    return [
+        {"name": r[0], "unique": r[1], "primary": r[2], "indexdef": r[3],
+         "constraint": r[4], "constraintdef": r[5], "columns": list(r[6])}
+        for r in cur.fetchall()
+    ]
+
+
+def _index_sql(idx: dict, target: str, name: str | None = None) -> str:
+    """Re-target one index (or its backing constraint) at another table."""
+    if idx["constraint"]:
+        named = f'CONSTRAINT "{name}" ' if name else ""
+        return f'ALTER TABLE "{target}" ADD {named}{idx["constraintdef"]}'
+    m = _INDEX_DEF.match(idx["indexdef"])
+    if not m:
+        raise ValueError(f"Unrecognised index definition: {idx['indexdef']}")
+    named = f'"{name}" ' if name else ""
+    return f'CREATE {m.group(1) or ""}INDEX {named}ON "{target}" {m.group(2)}'
+
+
+# ── Partition management ──────────────────────────────────────────────────────
+
+def _create_partition_sql(parent: str, year: int) -> str:
+    lo, hi = year_bounds(year)
+    return (f'CREATE TABLE IF NOT EXISTS "{partition_name(year)}" '
+            f'PARTITION OF "{parent}" FOR VALUES FROM (\'{lo}\') TO (\'{hi}\')')
+
+
+def ensure_partitions(conn, through_year: int = None):
+    """
+    Create any missing year partitions up to through_year (default: next year).
+
+    Rows that already landed in the default partition for such a year are moved
+    into the new partition in the same transaction — Postgres refuses to create
+    a partition whose range the default partition still holds rows for.
+    """
+    through_year = through_year or date.today().year + 1
+    with conn.cursor() as cur:
+        existing = attached_years(cur)
+        start = min(existing) if existing else date.today().year
+        cols = ", ".join(f'"{c}"' for c in table_columns(cur))
+        for year in range(start, through_year + 1):
+            if year in existing:
+                continue
+            lo, hi = year_bounds(year)
+            part = partition_name(year)
+            cur.execute(
+                f'SELECT count(*) FROM "{DEFAULT_PARTITION}" '
+                f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s', (lo, hi))
+            stranded = cur.fetchone()[0]
+            if stranded:
+                cur.execute(f'CREATE TABLE "{part}" (LIKE "{TABLE_NAME}" INCLUDING DEFAULTS)')
+                cur.execute(
+                    f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                    f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s RETURNING *) '
+                    f'INSERT INTO "{part}" ({cols}) SELECT {cols} FROM moved', (lo, hi))
+                cur.execute(f'ALTER TABLE "{TABLE_NAME}" ATTACH PARTITION "{part}" '
+                            f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+            else:
+                cur.execute(_create_partition_sql(TABLE_NAME, year))
+            print(f"  Created partition {part}"
+                  + (f" (moved {stranded:,} rows from default)" if stranded else ""))
+    conn.commit()
+
+
+class YearSwap:
+    """
+    Rebuild whole years of UnifiedCropPrice off to the side and swap them in.
+
+    Each (slug, year) unit is inserted into an unindexed stage table carrying
+    the year's CHECK constraint. finish() then, per year:
+      - copies rows of slugs this run did not reload from the live partition,
+      - builds the partition's indexes on the stage table,
+      - detaches the old partition, attaches the stage table under its name and
+        drops the old one, all in one short transaction.
+
+    Only years entirely before cutoff are swapped; the window the daily
+    pipeline owns is always written in place. Thread-safe, so parallel
+    workers can share one instance.
+    """
+
+    def __init__(self, cutoff: date):
+        self.cutoff = cutoff
+        self._loaded: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def covers(self, year) -> bool:
+        return year is not None and year > 0 and date(year, 12, 31) < self.cutoff
+
+    def stage_table(self, conn, year: int) -> str:
+        """Return the stage table for year, (re)creating it on first use this run."""
+        stage = stage_name(year)
+        with self._lock:
+            if year in self._loaded:
+                return stage
+            lo, hi = year_bounds(year)
+            with conn.cursor() as cur:
+                # A stage table left behind by an interrupted run is stale.
+                cur.execute(f'DROP TABLE IF EXISTS "{stage}"')
+                cur.execute(
+                    f'CREATE TABLE "{stage}" (LIKE "{TABLE_NAME}" INCLUDING DEFAULTS, '
+                    f'CONSTRAINT "{stage}_bounds" CHECK ({PARTITION_KEY} >= \'{lo}\' '
+                    f'AND {PARTITION_KEY} < \'{hi}\'))'
+                )
+            conn.commit()
+            self._loaded[year] = set()
+            return stage
+
+    def loaded(self, year: int, slug_id: str):
+        """Mark a (slug, year) unit as fully written to its stage table."""
+        with self._lock:
+            self._loaded[year].add(str(slug_id))
+
+    def finish(self, conn):
+        """Swap every staged year in, oldest first."""
+        for year in sorted(self._loaded):
+            t0 = time.time()
+            moved = swap_in_year(conn, year, self._loaded[year])
+            print(f"  {year}: swapped in {partition_name(year)} "
+                  f"({moved:,} rows carried over, {time.time() - t0:.1f}s)")
+
+
+def swap_in_year(conn, year: int, reloaded_slugs) -> int:
+    """
+    Replace year's partition with its stage table. Returns rows carried over
+    from slugs that were not reloaded.
+    """
+    stage, part = stage_name(year), partition_name(year)
+    lo, hi = year_bounds(year)
+    slugs = sorted(reloaded_slugs)
+
+    with conn.cursor() as cur:
+        existing = year in attached_years(cur)
+        source = part if existing else DEFAULT_PARTITION
+        cols = ", ".join(f'"{c}"' for c in table_columns(cur))
+
+        cur.execute(
+            f'INSERT INTO "{stage}" ({cols}) SELECT {cols} FROM "{source}" '
+            f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s '
+            f"AND coalesce(slug_id::text, '') <> ALL(%s)",
+            (lo, hi, slugs),
+        )
+        carried = cur.rowcount
+        conn.commit()
+
+        # Build indexes now so ATTACH only has to adopt them.
+        for idx in index_definitions(cur, TABLE_NAME):
+            cur.execute(_index_sql(idx, stage))
+        cur.execute(f'ANALYZE "{stage}"')
+        conn.commit()
+
+        if existing:
+            cur.execute(f'ALTER TABLE "{TABLE_NAME}" DETACH PARTITION "{part}"')
+            cur.execute(f'ALTER TABLE "{part}" RENAME TO "{part}_old"')
+        else:
+            cur.execute(
+                f'DELETE FROM "{DEFAULT_PARTITION}" '
+                f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s', (lo, hi))
+        cur.execute(f'ALTER TABLE "{TABLE_NAME}" ATTACH PARTITION "{stage}" '
+                    f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+        cur.execute(f'ALTER TABLE "{stage}" RENAME TO "{part}"')
+        cur.execute(f'ALTER TABLE "{part}" DROP CONSTRAINT "{stage}_bounds"')
+        if existing:
+            cur.execute(f'DROP TABLE "{part}_old"')
+        for idx in index_definitions(cur, part):
+            if idx["name"].startswith(stage):
+                cur.execute(f'ALTER INDEX "{idx["name"]}" '
+                            f'RENAME TO "{part}{idx["name"][len(stage):]}"')
+    conn.commit()
+    return carried
+
+
+# ── Migration ─────────────────────────────────────────────────────────────────
+
+def _year_range(cur, table: str) -> tuple[int, int]:
+    cur.execute(f'SELECT min({PARTITION_KEY}), max({PARTITION_KEY}) FROM "{table}"')
+    lo, hi = cur.fetchone()
+    this_year = date.today().year
+    if lo is None:
+        return this_year, this_year + 1
+    return _utc_year(lo), max(_utc_year(hi), this_year) + 1
+
+
+def _utc_year(value) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC")
+    return ts.year
+
+
+def _grant_sql(cur, source: str, target: str) -> list[str]:
+    cur.execute(
+        "SELECT grantee, string_agg(privilege_type, ', ') FROM information_schema.role_table_grants "
+        "WHERE table_schema = 'public' AND table_name = %s GROUP BY grantee",
+        (source,),
+    )
+    stmts = []
+    for grantee, privs in cur.fetchall():
+        to = "PUBLIC" if grantee == "PUBLIC" else f'"{grantee}"'
+        stmts.append(f'GRANT {privs} ON "{target}" TO {to}')
+    return stmts
+
+
+def _policy_sql(cur, source: str, target: str) -> list[str]:
+    """Row-level security switch and policies, so the anon role sees the same rows."""
+    cur.execute("SELECT relrowsecurity FROM pg_class WHERE oid = %s::regclass",
+                (f'public."{source}"',))
+    stmts = [f'ALTER TABLE "{target}" ENABLE ROW LEVEL SECURITY'] if cur.fetchone()[0] else []
+    cur.execute(
+        "SELECT policyname, permissive, roles, cmd, qual, with_check FROM pg_policies "
+        "WHERE schemaname = 'public' AND tablename = %s",
+        (source,),
+    )
+    for name, permissive, roles, cmd, qual, with_check in cur.fetchall():
+        if isinstance(roles, str):  # name[] arrives as '{a,b}' without a registered caster
+            roles = roles.strip("{}").split(",")
+        to = ", ".join("public" if r == "public" else f'"{r}"' for r in roles)
+        sql = f'CREATE POLICY "{name}" ON "{target}" AS {permissive} FOR {cmd} TO {to}'
+        if qual:
+            sql += f" USING ({qual})"
+        if with_check:
+            sql += f" WITH CHECK ({with_check})"
+        stmts.append(sql)
+    return stmts
+
+
+def migration_sql(cur) -> list[str]:
+    """
+    DDL that creates NEW_TABLE alongside the live table: sequence, partitioned
+    table, year partitions, grants and policies. Indexes come after the copy.
+    """
+    first, last = _year_range(cur, TABLE_NAME)
+    stmts = [
+        f'CREATE SEQUENCE IF NOT EXISTS "{ID_SEQUENCE}" AS bigint',
+        f'CREATE TABLE "{NEW_TABLE}" (LIKE "{TABLE_NAME}" INCLUDING DEFAULTS '
+        f'INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE ({PARTITION_KEY})',
+        f'ALTER TABLE "{NEW_TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{ID_SEQUENCE}"\')',
+        f'ALTER TABLE "{NEW_TABLE}" ALTER COLUMN {PARTITION_KEY} SET NOT NULL',
+        f'ALTER SEQUENCE "{ID_SEQUENCE}" OWNED BY "{NEW_TABLE}".id',
+    ]
+    stmts += [_create_partition_sql(NEW_TABLE, y) for y in range(first, last + 1)]
+    stmts.append(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{NEW_TABLE}" DEFAULT')
+    stmts += _grant_sql(cur, TABLE_NAME, NEW_TABLE)
+    stmts += _policy_sql(cur, TABLE_NAME, NEW_TABLE)
+    return stmts
+
+
+def index_migration_sql(cur) -> list[str]:
+    """
+    The live table's indexes rebuilt on NEW_TABLE (names suffixed until the
+    swap). Unique keys must contain report_date on a partitioned table: the
+    primary key is widened to (id, report_date) and any other unique index
+    without it is skipped with a warning.
+    """
+    stmts = [f'ALTER TABLE "{NEW_TABLE}" ADD CONSTRAINT "{TABLE_NAME}_pkey{_NEW_INDEX_SUFFIX}" '
+             f'PRIMARY KEY (id, {PARTITION_KEY})']
+    for idx in index_definitions(cur, TABLE_NAME):
+        if idx["primary"]:
+            continue
+        if idx["unique"] and PARTITION_KEY not in idx["columns"]:
+            print(f"  ⚠ Skipping unique index {idx['name']}: it does not include "
+                  f"{PARTITION_KEY}, so it cannot be enforced on a partitioned table")
+            continue
+        stmts.append(_index_sql(idx, NEW_TABLE, idx["name"] + _NEW_INDEX_SUFFIX))
+    return stmts
+
+
+def _dependent_views(cur, table: str) -> list[str]:
+    cur.execute(
+        "SELECT DISTINCT v.relname FROM pg_depend d "
+        "JOIN pg_rewrite r ON r.oid = d.objid JOIN pg_class v ON v.oid = r.ev_class "
+        "WHERE d.refobjid = %s::regclass AND v.relname <> %s",
+        (f'public."{table}"', table),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _copy_month_by_month(cur, cols: str, first: int, last: int) -> int:
+    copied = 0
+    month = pd.Period(f"{first}-01", "M")
+    end = pd.Period(f"{last}-12", "M")
+    while month <= end:
+        lo = f"{month.start_time.date()} 00:00:00+00"
+        hi = f"{(month + 1).start_time.date()} 00:00:00+00"
+        t0 = time.time()
+        # Delete first so a re-run after an interruption does not double-copy.
+        cur.execute(f'DELETE FROM "{NEW_TABLE}" WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s',
+                    (lo, hi))
+        cur.execute(
+            f'INSERT INTO "{NEW_TABLE}" ({cols}) SELECT {cols} FROM "{TABLE_NAME}" '
+            f'WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s',
+            (lo, hi),
+        )
+        if cur.rowcount:
+            print(f"  {month}: copied {cur.rowcount:,} rows ({time.time() - t0:.1f}s)")
+        copied += cur.rowcount
+        month += 1
+    return copied
+
+
+def apply_migration(conn):
+    """Convert the live table to the partitioned layout (see module docstring)."""
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        if is_partitioned(cur):
+            print(f"  {TABLE_NAME} is already partitioned — ensuring upcoming partitions")
+            conn.autocommit = False
+            ensure_partitions(conn)
+            return
+
+        cur.execute(f'SELECT count(*) FROM "{TABLE_NAME}" WHERE {PARTITION_KEY} IS NULL')
+        undated = cur.fetchone()[0]
+        if undated:
+            print(f"  ⚠ {undated:,} rows have no {PARTITION_KEY} and will not be copied")
+
+        if not table_exists(cur, NEW_TABLE):
+            for sql in migration_sql(cur):
+                cur.execute(sql)
+        else:
+            print(f"  Resuming: {NEW_TABLE} already exists")
+
+        cols = ", ".join(f'"{c}"' for c in table_columns(cur))
+        first, last = _year_range(cur, TABLE_NAME)
+        copied = _copy_month_by_month(cur, cols, first, last)
+        print(f"  Copied {copied:,} rows")
+
+        print("  Building indexes...")
+        built = {i["name"] for i in index_definitions(cur, NEW_TABLE)}
+        for sql in index_migration_sql(cur):
+            name = re.search(r'(?:CONSTRAINT|INDEX) "([^"]+)"', sql).group(1)
+            if name in built:
+                continue
+            t0 = time.time()
+            cur.execute(sql)
+            print(f"    {name} ({time.time() - t0:.1f}s)")
+
+        views = _dependent_views(cur, TABLE_NAME)
+
+        # Swap: block writers on the old table, catch up, and rename.
+        conn.autocommit = False
+        cur.execute(f'LOCK TABLE "{TABLE_NAME}" IN SHARE ROW EXCLUSIVE MODE')
+        cur.execute(f'SELECT coalesce(max(id), 0) FROM "{NEW_TABLE}"')
+        high_water = cur.fetchone()[0]
+        cur.execute(
+            f'INSERT INTO "{NEW_TABLE}" ({cols}) SELECT {cols} FROM "{TABLE_NAME}" '
+            f'WHERE id > %s AND {PARTITION_KEY} IS NOT NULL',
+            (high_water,),
+        )
+        if cur.rowcount:
+            print(f"  Caught up {cur.rowcount:,} rows written during the copy")
+        cur.execute(f'SELECT setval(\'"{ID_SEQUENCE}"\', '
+                    f'greatest((SELECT max(id) FROM "{TABLE_NAME}"), '
+                    f'(SELECT max(id) FROM "{NEW_TABLE}"), 1))')
+
+        for idx in index_definitions(cur, TABLE_NAME):
+            cur.execute(f'ALTER INDEX "{idx["name"]}" RENAME TO "{idx["name"]}_legacy"')
+        cur.execute(f'ALTER TABLE "{TABLE_NAME}" RENAME TO "{LEGACY_TABLE}"')
+        cur.execute(f'ALTER TABLE "{NEW_TABLE}" RENAME TO "{TABLE_NAME}"')
+        for idx in index_definitions(cur, TABLE_NAME):
+            if idx["name"].endswith(_NEW_INDEX_SUFFIX):
+                cur.execute(f'ALTER INDEX "{idx["name"]}" '
+                            f'RENAME TO "{idx["name"][:-len(_NEW_INDEX_SUFFIX)]}"')
+        conn.commit()
+
+    print(f"  ✔ {TABLE_NAME} is now partitioned by {PARTITION_KEY} year")
+    print(f"    The old table is kept as {LEGACY_TABLE}; once verified run:")
+    print(f'      DROP TABLE "{LEGACY_TABLE}";')
+    if views:
+        print(f"  ⚠ These views still read {LEGACY_TABLE} and must be recreated: {', '.join(views)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UnifiedCropPrice yearly partitioning")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the table and index SQL")
+    group.add_argument("--apply", action="store_true", help="Migrate the live table")
+    group.add_argument("--ensure", action="store_true", help="Create partitions through next year")
+    args = parser.parse_args()
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.ddl:
+            with conn.cursor() as cur:
+                if is_partitioned(cur):
+                    print(f"-- {TABLE_NAME} is already partitioned")
+                    return
+                print(";\n".join(migration_sql(cur) + index_migration_sql(cur)) + ";")
+        elif args.ensure:
+            ensure_partitions(conn)
+        else:
+            print(f"Started {datetime.now():%Y-%m-%d %H:%M:%S}")
+            apply_migration(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
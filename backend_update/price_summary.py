@@ -0,0 +1,229 @@
+"""
+Precomputed dashboard cards: PriceSummary and CommodityStats.
+
+getPriceSummary averages price_avg by commodity/variety over whatever 1,000
+raw rows it happens to fetch, and getStats pulls 14 days of `select('*')` for
+a commodity to work out one card. Both are recomputed for every commodity
+after each upload instead, so a card is a single primary-key fetch:
+
+    PriceSummary    (commodity, variety) -> avg_price, price_count, market_tone
+    CommodityStats  commodity -> the getStats() object, flattened
+
+CommodityStats follows getStats: over the last 14 days, the current week is
+the 7 days up to the commodity's latest report and the previous week the rest;
+per market type (Terminal / Shipping / Retail) it holds the current average
+price and its change on the previous week, plus the dominant package, the
+terminal - shipping spread and the latest non-empty market note.
+PriceSummary averages over all of history, read from UnifiedCropPriceMonthly
+(see rollups.py, which must be applied first), with the latest market note of
+the last 14 days.
+
+The SQL function refresh_price_summary() rebuilds both tables in one
+transaction; both upload paths call it after refreshing the rollups.
+
+Usage:
+    python price_summary.py --ddl       # print tables + function SQL
+    python price_summary.py --apply     # create them via DB_CONNECTION_STRING
+    python price_summary.py --rebuild   # recompute both tables
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from rollups import ROLLUP_TABLES
+
+TABLE_NAME = "UnifiedCropPrice"
+
+SUMMARY_TABLE = "PriceSummary"
+STATS_TABLE = "CommodityStats"
+
+# getStats matches market_type with a case-sensitive includes().
+MARKET_TYPES = ("Terminal", "Shipping", "Retail")
+
+STATS_WINDOW_DAYS = 14
+
+REFRESH_FUNCTION = "refresh_price_summary"
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def _table_sql() -> list[str]:
+    markets = ",\n    ".join(
+        f"{m.lower()}_avg double precision NOT NULL, {m.lower()}_pct_change double precision NOT NULL"
+        for m in MARKET_TYPES
+    )
+    roles = ", ".join(READ_ROLES)
+    stmts = [
+        f'CREATE TABLE IF NOT EXISTS "{SUMMARY_TABLE}" (\n'
+        f"    commodity text NOT NULL,\n    variety text NOT NULL DEFAULT '',\n"
+        f"    avg_price double precision,\n    price_count bigint NOT NULL,\n"
+        f"    market_tone text,\n    PRIMARY KEY (commodity, variety)\n)",
+        f'CREATE TABLE IF NOT EXISTS "{STATS_TABLE}" (\n'
+        f"    commodity text PRIMARY KEY,\n    date timestamptz NOT NULL,\n"
+        f"    package_unit text NOT NULL,\n    {markets},\n"
+        f"    spread double precision,\n    market_note text,\n"
+        f"    refreshed_at timestamptz NOT NULL DEFAULT now()\n)",
+    ]
+    for table in (SUMMARY_TABLE, STATS_TABLE):
+        stmts += [
+            f'ALTER TABLE "{table}" ENABLE ROW LEVEL SECURITY',
+            f'DROP POLICY IF EXISTS "{table} read" ON "{table}"',
+            f'CREATE POLICY "{table} read" ON "{table}" FOR SELECT TO {roles} USING (true)',
+            f'GRANT SELECT ON "{table}" TO {roles}',
+        ]
+    return stmts
+
+
+def function_sql() -> str:
+    """refresh_price_summary(): rebuild PriceSummary and CommodityStats."""
+    monthly = ROLLUP_TABLES["month"]
+    avgs, cols = [], []
+    for m in MARKET_TYPES:
+        like = f"market_type LIKE '%{m}%'"
+        avgs.append(f"avg(price_avg) FILTER (WHERE cur AND {like}) AS {m.lower()}_cur,\n"
+                    f"             avg(price_avg) FILTER (WHERE NOT cur AND {like}) AS {m.lower()}_prev")
+        # getStats: `avg || 0`, and `prev ? (curr - prev) / prev * 100 : 0`
+        cols.append(f"coalesce({m.lower()}_cur, 0),\n"
+                    f"             CASE WHEN coalesce({m.lower()}_prev, 0) = 0 THEN 0 ELSE\n"
+                    f"               (coalesce({m.lower()}_cur, 0) - {m.lower()}_prev) "
+                    f"/ {m.lower()}_prev * 100 END")
+    market_cols = ", ".join(f"{m.lower()}_avg, {m.lower()}_pct_change" for m in MARKET_TYPES)
+    avgs_sql = ",\n             ".join(avgs)
+    cols_sql = ",\n             ".join(cols)
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}()
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    n integer;
+    total integer := 0;
+BEGIN
+    DROP TABLE IF EXISTS pg_temp.summary_recent;
+    CREATE TEMP TABLE summary_recent ON COMMIT DROP AS
+      SELECT commodity, coalesce(variety, '') AS variety, report_date, market_type,
+             package, price_avg::double precision AS price_avg, market_tone_comments
+      FROM "{TABLE_NAME}"
+      WHERE report_date >= now() - interval '{STATS_WINDOW_DAYS} days' AND commodity IS NOT NULL;
+
+    DELETE FROM "{STATS_TABLE}";
+    INSERT INTO "{STATS_TABLE}" (commodity, date, package_unit, {market_cols}, spread, market_note)
+      WITH flagged AS (
+        SELECT r.*, r.report_date >= max(r.report_date) OVER (PARTITION BY r.commodity)
+                                     - interval '7 days' AS cur
+        FROM summary_recent r
+      ), agg AS (
+        SELECT commodity, max(report_date) AS latest,
+               mode() WITHIN GROUP (ORDER BY package) FILTER (WHERE package <> '') AS package_unit,
+               {avgs_sql},
+               (array_agg(market_tone_comments ORDER BY report_date DESC)
+                  FILTER (WHERE trim(market_tone_comments) <> ''))[1] AS market_note
+        FROM flagged
+        GROUP BY commodity
+      )
+      SELECT commodity, latest, coalesce(package_unit, 'lb'),
+             {cols_sql},
+             CASE WHEN terminal_cur <> 0 AND shipping_cur <> 0
+                  THEN terminal_cur - shipping_cur END,
+             market_note
+      FROM agg;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    total := total + n;
+
+    DELETE FROM "{SUMMARY_TABLE}";
+    INSERT INTO "{SUMMARY_TABLE}" (commodity, variety, avg_price, price_count, market_tone)
+      WITH history AS (
+        SELECT commodity, coalesce(variety, '') AS variety,
+               sum(price_avg_sum) / nullif(sum(price_avg_count), 0) AS avg_price,
+               sum(price_avg_count) AS price_count
+        FROM "{monthly}"
+        WHERE commodity IS NOT NULL
+        GROUP BY 1, 2
+      ), tones AS (
+        SELECT commodity, variety,
+               (array_agg(market_tone_comments ORDER BY report_date DESC)
+                  FILTER (WHERE trim(market_tone_comments) <> ''))[1] AS market_tone
+        FROM summary_recent
+        GROUP BY 1, 2
+      )
+      SELECT h.commodity, h.variety, round(h.avg_price::numeric, 2)::double precision,
+             h.price_count, t.market_tone
+      FROM history h LEFT JOIN tones t USING (commodity, variety);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    total := total + n;
+
+    RETURN total;
+END;
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = _table_sql()
+    stmts.append(function_sql())
+    signature = f"{REFRESH_FUNCTION}()"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {signature} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {signature} TO {WRITE_ROLE}")
+    return stmts
+
+
+def refresh_summary_pg(conn) -> int:
+    """Rebuild PriceSummary and CommodityStats in one transaction."""
+    t0 = time.time()
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {REFRESH_FUNCTION}()")
+        total = cur.fetchone()[0]
+    conn.commit()
+    print(f"  ✔ {SUMMARY_TABLE} / {STATS_TABLE} refreshed: {total:,} rows ({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_summary_rest(client) -> int:
+    """Same as refresh_summary_pg, through PostgREST RPC."""
+    t0 = time.time()
+    total = int(client.rpc(REFRESH_FUNCTION, {}).execute().data or 0)
+    print(f"  ✔ {SUMMARY_TABLE} / {STATS_TABLE} refreshed: {total:,} rows ({time.time() - t0:.1f}s)")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomputed price summary and commodity stats")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the tables and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Recompute both tables")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {SUMMARY_TABLE}, {STATS_TABLE} and {REFRESH_FUNCTION}()")
+        refresh_summary_pg(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Profiling hooks shared by the pipeline entry points.
+
+update_daily.py, update_recent.py, upload_historical.py, upload_recent_slugs.py
+and extract_filters.py accept --profile (or PIPELINE_PROFILE=1, e.g. in CI),
+so a production-sized run can be profiled without editing any script. A
+profiled run writes to its own directory,
+
+    backend_update/logs/profiles/update_daily-20260119-061502/
+        cpu.prof          cProfile of the main thread (snakeviz / pstats)
+        cpu_top.txt       top functions by cumulative and own time
+        memory.txt        per metrics stage: net allocations, by source line (tracemalloc)
+        samples.folded    with --profile-sample: stacks of every thread, collapsed
+                          (flamegraph.pl / speedscope)
+        summary.txt       the top-N of each, also printed at the end of the run
+
+Memory is attributed to the metrics.stage() blocks (fetch, format, upload, ...):
+the net traced allocation of every call, and a tracemalloc snapshot diff of the
+first call of each stage. The process is traced as a whole, so stages running
+in parallel share their allocations. cProfile only sees
+the main thread; the sampler covers the backfill's worker threads too.
+
+    parser = argparse.ArgumentParser(...)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profiled("update_daily"):
+        main()
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import metrics
+
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "profiles"),
+)
+PROFILE_TOP = 25
+
+# Frames kept per allocation; one is enough to attribute it to a source line.
+TRACE_FRAMES = 1
+
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """The --profile options every entry point accepts (read back by profiled())."""
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", action="store_true",
+                       help="Write CPU and per-stage memory profiles to a run directory "
+                            "(also PIPELINE_PROFILE=1)")
+    group.add_argument("--profile-dir", default=PROFILE_DIR,
+                       help=f"Where run directories go (default: {PROFILE_DIR})")
+    group.add_argument("--profile-sample", type=float, metavar="MS",
+                       default=float(os.getenv("PIPELINE_PROFILE_SAMPLE_MS", "0")),
+                       help="Also sample every thread's stack every MS milliseconds (default: off)")
+    group.add_argument("--profile-top", type=int, default=PROFILE_TOP, metavar="N",
+                       help=f"Entries per table in summary.txt (default: {PROFILE_TOP})")
+    return parser
+
+
+def _options(argv: list[str] = None) -> argparse.Namespace:
+    """The profile options from argv; the entry point's own parser validates the rest."""
+    args, _ = add_profile_arguments(argparse.ArgumentParser(add_help=False)).parse_known_args(
+        sys.argv[1:] if argv is None else argv)
+    if os.getenv("PIPELINE_PROFILE", "0") not in ("", "0"):
+        args.profile = True
+    return args
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of every other thread every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._done.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                 f"{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def top(self, n: int) -> str:
+        """Functions by samples where they were running (self) and on the stack (total)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        grand = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples:,} samples every {self.interval * 1000:g} ms, all threads",
+                 f"{'self %':>7} {'total %':>8}  function"]
+        for frame, count in own.most_common(n):
+            lines.append(f"{100 * count / grand:>6.1f}% {100 * total[frame] / grand:>7.1f}%  {frame}")
+        return "\n".join(lines)
+
+
+class StageMemory:
+    """
+    Per stage name: the net traced allocation of every call, and for the first
+    call a tracemalloc snapshot diff by source line. A snapshot walks every live
+    allocation, so one pair per stage name keeps the overhead bounded on runs
+    with thousands of (slug, year) stages.
+    """
+
+    def __init__(self):
+        self.growth: dict[str, list] = {}
+        self.calls = Counter()
+        self.net = Counter()
+        self.high = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self, name: str, slug: str = None):
+        with self._lock:
+            first = name not in self.growth
+            if first:
+                self.growth[name] = []
+        before = tracemalloc.take_snapshot().filter_traces(_IGNORED) if first else None
+        start, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            current, _ = tracemalloc.get_traced_memory()
+            if first:
+                after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+                growth = [s for s in after.compare_to(before, "lineno") if s.size_diff]
+            with self._lock:
+                if first:
+                    self.growth[name] = growth
+                self.calls[name] += 1
+                self.net[name] += current - start
+                self.high[name] = max(self.high[name], current)
+
+    def report(self, n: int) -> str:
+        lines = []
+        for name, growth in self.growth.items():
+            lines.append(f"[{name}] {self.calls[name]} call(s), net {_mb(self.net[name])}, "
+                         f"up to {_mb(self.high[name])} traced at exit")
+            if growth:
+                lines.append("  first call, by source line:")
+            for stat in sorted(growth, key=lambda s: -abs(s.size_diff))[:n]:
+                lines.append(f"  {_mb(stat.size_diff):>12}  {_short(str(stat.traceback[0]))}")
+            lines.append("")
+        return "\n".join(lines) or "No metrics stages ran.\n"
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1_048_576:+.2f} MB" if n < 0 else f"{n / 1_048_576:.2f} MB"
+
+
+def _short(path: str) -> str:
+    """Source paths relative to the repo or site-packages, for readable tables."""
+    for marker in ("site-packages" + os.sep, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    return path
+
+
+def _cpu_top(profile: cProfile.Profile, n: int) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.strip_dirs()
+    for key in ("cumulative", "tottime"):
+        out.write(f"── by {key} ──\n")
+        stats.sort_stats(key).print_stats(n)
+    return out.getvalue()
+
+
+@contextmanager
+def profiled(entry: str, argv: list[str] = None):
+    """
+    Profile the block when --profile (or PIPELINE_PROFILE=1) is set, else do nothing.
+
+    On exit, the run directory is written and summary.txt printed — also when
+    the block raises or calls sys.exit().
+    """
+    args = _options(argv)
+    if not args.profile:
+        yield None
+        return
+
+    run_dir = os.path.join(args.profile_dir, f"{entry}-{datetime.now():%Y%m%d-%H%M%S}")
+    os.makedirs(run_dir, exist_ok=True)
+    print(f"Profiling {entry} → {run_dir}")
+
+    memory = StageMemory()
+    sampler = StackSampler(args.profile_sample / 1000) if args.profile_sample > 0 else None
+    tracemalloc.start(TRACE_FRAMES)
+    metrics.add_stage_hook(memory)
+    if sampler:
+        sampler.start()
+    profile = cProfile.Profile()
+    t0 = time.perf_counter()
+    profile.enable()
+    try:
+        yield run_dir
+    finally:
+        profile.disable()
+        elapsed = time.perf_counter() - t0
+        if sampler:
+            sampler.stop()
+        metrics.remove_stage_hook(memory)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profile.dump_stats(os.path.join(run_dir, "cpu.prof"))
+        cpu = _cpu_top(profile, args.profile_top)
+        live = "\n".join(f"  {_mb(s.size):>12}  {_short(str(s.traceback[0]))}"
+                         for s in snapshot.statistics("lineno")[:args.profile_top])
+        mem = (f"Traced peak {_mb(peak)}, still allocated at exit {_mb(current)}\n\n"
+               f"{memory.report(args.profile_top)}\n── live at exit ──\n{live}\n")
+        sections = [f"{entry} profiled for {elapsed:.1f}s → {run_dir}",
+                    "CPU (main thread)\n" + cpu, "Memory by stage\n" + mem]
+        with open(os.path.join(run_dir, "cpu_top.txt"), "w") as f:
+            f.write(cpu)
+        with open(os.path.join(run_dir, "memory.txt"), "w") as f:
+            f.write(mem)
+        if sampler:
+            sampler.write_folded(os.path.join(run_dir, "samples.folded"))
+            sections.append("Samples\n" + sampler.top(args.profile_top))
+        summary = "\n\n".join(sections) + "\n"
+        with open(os.path.join(run_dir, "summary.txt"), "w") as f:
+            f.write(summary)
+        print("\n" + summary)
@@ -0,0 +1,212 @@
+"""
+Set-based recompute of the package-derived columns of UnifiedCropPrice.
+
+weight_lbs, weight_kgs and units depend only on (commodity, package), and
+price_per_lb / price_per_unit on those plus the row's price_avg. After a change
+to package_units.json or the package parser, every row has to be re-derived;
+backend/update_weight_column.py used to do that with one REST update per row.
+
+Here the measures are resolved once per distinct (commodity, package) in
+Python, staged into a temp table, and applied with
+
+    UPDATE "UnifiedCropPrice" u SET ... FROM recompute_keys k
+    WHERE u.commodity = k.commodity AND coalesce(u.package, '') = k.package
+      AND <report day in the slice> AND <any value changes>
+
+one calendar month of report_date per statement and transaction, so each
+UPDATE stays bounded and unchanged rows are not rewritten. The default
+resolver is the shared one in package_weights.py, so rows end up as a fresh
+upload would write them; a resolver returning None for a key leaves its rows alone.
+Prices follow format_data: weight wins, price_per_unit only for packages with
+a count and no weight.
+
+Finished slices are recorded in CHECKPOINT_PATH with a hash of the staged
+values; rerunning after an interruption skips them as long as the values are
+unchanged (`--restart` ignores the checkpoint).
+
+Usage:
+    python recompute_columns.py                # every report day
+    python recompute_columns.py --from 2024-01-01 --to 2024-12-31
+    python recompute_columns.py --dry-run      # count the rows that would change
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from package_weights import package_measures
+from rollups import full_range_pg, month_slices
+
+TABLE_NAME = "UnifiedCropPrice"
+
+MEASURE_COLUMNS = ("weight_lbs", "weight_kgs", "units")
+PRICE_COLUMNS = ("price_per_lb", "price_per_unit")
+
+STAGE_TABLE = "recompute_keys"
+
+# Print a progress line every this many monthly slices.
+PROGRESS_EVERY = 12
+
+CHECKPOINT_PATH = os.getenv(
+    "RECOMPUTE_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "recompute_columns.json"),
+)
+
+# New value of every recomputed column, in terms of u (the row) and k (its key).
+# Same rules and rounding as format_for_unified_crop_price.
+_HAS_WEIGHT = "coalesce(k.weight_lbs > 0, false)"
+NEW_VALUES = {
+    "weight_lbs": "k.weight_lbs",
+    "weight_kgs": "k.weight_kgs",
+    "units": "k.units",
+    "price_per_lb": (f"CASE WHEN u.price_avg IS NOT NULL AND {_HAS_WEIGHT} "
+                     "THEN round(u.price_avg::numeric / k.weight_lbs::numeric, 2)::real END"),
+    "price_per_unit": (f"CASE WHEN u.price_avg IS NOT NULL AND k.units > 0 AND NOT {_HAS_WEIGHT} "
+                       "THEN round(u.price_avg::numeric / k.units::numeric, 2)::real END"),
+}
+
+_COLUMNS = MEASURE_COLUMNS + PRICE_COLUMNS
+
+# Rows of one slice (%(lo)s..%(hi)s) joined to their key, whose values change.
+_CHANGED_ROWS = f"""FROM {STAGE_TABLE} k
+WHERE u.commodity = k.commodity AND coalesce(u.package, '') = k.package
+  AND u.report_date >= %(lo)s AND u.report_date < %(hi)s::date + 1
+  AND ({", ".join(f"u.{c}" for c in _COLUMNS)}) IS DISTINCT FROM
+      ({", ".join(NEW_VALUES[c] for c in _COLUMNS)})"""
+
+
+def update_sql() -> str:
+    """Rewrite the changed rows of one slice."""
+    assignments = ",\n    ".join(f"{c} = {NEW_VALUES[c]}" for c in _COLUMNS)
+    return f'UPDATE "{TABLE_NAME}" u SET\n    {assignments}\n{_CHANGED_ROWS}'
+
+
+def count_sql() -> str:
+    """Count the rows update_sql() would change (--dry-run)."""
+    return f'SELECT count(*) FROM "{TABLE_NAME}" u, {_CHANGED_ROWS[len("FROM "):]}'
+
+
+def resolve_keys(conn, resolve=package_measures) -> list[tuple]:
+    """
+    (commodity, package, weight_lbs, weight_kgs, units) for every distinct key in
+    the table that `resolve(commodity, package)` does not return None for.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT DISTINCT commodity, coalesce(package, \'\') FROM "{TABLE_NAME}" '
+                    "WHERE commodity IS NOT NULL")
+        keys = cur.fetchall()
+    conn.commit()
+    rows = []
+    for commodity, package in keys:
+        measures = resolve(commodity, package or None)
+        if measures is not None:
+            rows.append((commodity, package, *measures))
+    rows.sort(key=lambda r: (r[0], r[1]))
+    print(f"  {len(keys):,} distinct (commodity, package) keys, {len(rows):,} resolved")
+    return rows
+
+
+def stage_keys(cur, rows: list[tuple]):
+    """Load the resolved keys into the session's temp table."""
+    from psycopg2.extras import execute_values
+    cur.execute(f"DROP TABLE IF EXISTS pg_temp.{STAGE_TABLE}")
+    cur.execute(f"CREATE TEMP TABLE {STAGE_TABLE} (commodity text NOT NULL, package text NOT NULL, "
+                "weight_lbs real, weight_kgs real, units real, PRIMARY KEY (commodity, package))")
+    execute_values(cur, f"INSERT INTO {STAGE_TABLE} VALUES %s", rows, page_size=1000)
+    cur.execute(f"ANALYZE {STAGE_TABLE}")
+
+
+def _signature(rows: list[tuple]) -> str:
+    return hashlib.sha1(json.dumps(rows, default=str).encode()).hexdigest()
+
+
+def _load_checkpoint(signature: str) -> set[str]:
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return set(state.get("done", [])) if state.get("signature") == signature else set()
+
+
+def _save_checkpoint(signature: str, done: set[str]):
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    with open(CHECKPOINT_PATH, "w") as f:
+        json.dump({"signature": signature, "done": sorted(done)}, f)
+
+
+def recompute_pg(conn, start: date = None, end: date = None, resolve=package_measures,
+                 dry_run: bool = False, restart: bool = False) -> int:
+    """
+    Re-derive the package columns for report days in [start, end] (default: all).
+    Returns the number of rows changed (or that would change, with dry_run).
+    """
+    t0 = time.time()
+    window = full_range_pg(conn)
+    if window is None:
+        print("  Nothing to recompute")
+        return 0
+    start, end = start or window[0], end or window[1]
+
+    rows = resolve_keys(conn, resolve)
+    signature = _signature(rows)
+    done = set() if restart or dry_run else _load_checkpoint(signature)
+    slices = [(lo, hi) for lo, hi in month_slices(start, end)]
+    todo = [(lo, hi) for lo, hi in slices if lo.isoformat() not in done]
+    if len(todo) < len(slices):
+        print(f"  Resuming: {len(slices) - len(todo)} of {len(slices)} months already done")
+
+    total = 0
+    sql = count_sql() if dry_run else update_sql()
+    with conn.cursor() as cur:
+        stage_keys(cur, rows)
+        conn.commit()
+        for i, (lo, hi) in enumerate(todo, 1):
+            cur.execute(sql, {"lo": lo, "hi": hi})
+            changed = cur.fetchone()[0] if dry_run else cur.rowcount
+            conn.commit()
+            total += changed
+            if not dry_run:
+                done.add(lo.isoformat())
+                _save_checkpoint(signature, done)
+            if i % PROGRESS_EVERY == 0 or i == len(todo):
+                print(f"  → through {hi:%Y-%m}: {total:,} rows "
+                      f"[{i}/{len(todo)} months, {time.time() - t0:.1f}s]")
+
+    verb = "would change" if dry_run else "updated"
+    print(f"  ✔ {total:,} rows {verb} for {start}..{end} ({time.time() - t0:.1f}s)")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the package-derived columns in bulk")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would change")
+    parser.add_argument("--restart", action="store_true", help="Ignore the resume checkpoint")
+    args = parser.parse_args()
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        recompute_pg(conn, args.start, args.end, dry_run=args.dry_run, restart=args.restart)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Lean PostgREST writes for the Supabase REST path.
+
+The supabase-py builders ask PostgREST to echo every written or deleted row
+back (return=representation), and serialise request bodies with the stdlib
+json module. For bulk writes that doubles the traffic for data we already
+have. RestWriter sends the same requests over the client's own HTTP session
+with:
+
+  - Prefer: return=minimal,count=exact — the response body is empty and the
+    affected row count comes back in the Content-Range header;
+  - bodies encoded with orjson (stdlib json if it is not installed);
+  - optionally, gzip request bodies (Content-Encoding: gzip), off unless
+    REST_GZIP=1. PostgREST itself does not decompress request bodies, so this
+    only works behind a gateway that does; it has not been verified against
+    Supabase. If the server rejects a compressed body, compression is switched
+    off for the rest of the run and the request is resent as plain JSON.
+
+Byte counts are tracked so each run can print what it actually sent/received.
+
+    writer = RestWriter(client)
+    writer.insert("UnifiedCropPrice", records)
+    deleted = writer.delete("UnifiedCropPrice", {"report_date": ["gte.2024-01-01", "lt.2024-01-02"]})
+    writer.report()
+"""
+
+import gzip
+import json
+import os
+import threading
+
+from postgrest.exceptions import APIError
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# Compress request bodies only with REST_GZIP=1 (see the module docstring).
+REST_GZIP = os.getenv("REST_GZIP", "0") == "1"
+
+# With compression on, bodies smaller than this are still sent as-is.
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+def dumps(records) -> bytes:
+    """Serialise records to JSON bytes (NaN -> null with orjson)."""
+    if orjson is not None:
+        return orjson.dumps(records, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(records, default=str, allow_nan=False).encode("utf-8")
+
+
+def content_range_count(header: str | None) -> int | None:
+    """Total from a PostgREST Content-Range header ("0-24/25" or "*/25")."""
+    if not header or "/" not in header:
+        return None
+    total = header.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+class RestWriter:
+    """
+    Minimal-response writes through a Supabase client's PostgREST
+    session. Safe to share between threads.
+    """
+
+    def __init__(self, client, compress: bool = REST_GZIP):
+        postgrest = client.postgrest
+        self.session = postgrest.session
+        self.headers = dict(postgrest.headers)
+        self.compress = compress
+        self._compress_confirmed = False
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+
+    def _send(self, method: str, table: str, params, prefer: str, body: bytes = None):
+        headers = {**self.headers, "Prefer": prefer}
+        payload = body
+        compressed = False
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            if self.compress and len(body) >= GZIP_MIN_BYTES:
+                payload = gzip.compress(body, GZIP_LEVEL)
+                headers["Content-Encoding"] = "gzip"
+                compressed = True
+
+        resp = self.session.request(method, table, params=params, headers=headers, content=payload)
+        self._account(body, payload, resp)
+
+        if compressed and resp.status_code in (400, 415) and not self._compress_confirmed:
+            # The gateway did not inflate the body; fall back to plain JSON.
+            print(f"  ⚠ Server rejected a gzip request body ({resp.status_code}); "
+                  "sending uncompressed from now on")
+            self.compress = False
+            return self._send(method, table, params, prefer, body)
+
+        if resp.status_code >= 400:
+            try:
+                error = resp.json()
+            except ValueError:
+                error = {"message": resp.text, "code": str(resp.status_code)}
+            raise APIError(error if isinstance(error, dict) else {"message": str(error)})
+
+        if compressed:
+            self._compress_confirmed = True
+        return resp
+
+    def _account(self, body, payload, resp):
+        with self._lock:
+            self.requests += 1
+            self.raw_bytes += len(body or b"")
+            self.sent_bytes += len(payload or b"")
+            self.received_bytes += int(resp.headers.get("content-length") or len(resp.content))
+
+    def insert(self, table: str, records: list[dict], on_conflict: str = None) -> int:
+        """POST records; with on_conflict, upsert on those columns. Returns rows written."""
+        prefer = "return=minimal,count=exact"
+        params = {}
+        if on_conflict:
+            prefer += ",resolution=merge-duplicates"
+            params["on_conflict"] = on_conflict
+        resp = self._send("POST", table, params, prefer, dumps(records))
+        count = content_range_count(resp.headers.get("content-range"))
+        return len(records) if count is None else count
+
+    def delete(self, table: str, filters: dict) -> int:
+        """
+        DELETE rows matching PostgREST filters, e.g.
+        {"report_date": ["gte.2024-01-01", "lt.2024-02-01"], "slug_id": "eq.2306"}.
+        Returns the number of rows deleted.
+        """
+        params = [(col, f) for col, fs in filters.items()
+                  for f in ([fs] if isinstance(fs, str) else fs)]
+        resp = self._send("DELETE", table, params, "return=minimal,count=exact")
+        return content_range_count(resp.headers.get("content-range")) or 0
+
+    def report(self):
+        """Print request count and bytes on the wire."""
+        if not self.requests:
+            return
+        ratio = (f", {self.raw_bytes / self.sent_bytes:.1f}× compression"
+                 if self.sent_bytes and self.raw_bytes >= 1.1 * self.sent_bytes else "")
+        print(f"  [rest] {self.requests:,} requests: sent {_mb(self.sent_bytes)} "
+              f"({_mb(self.raw_bytes)} JSON{ratio}), received {_mb(self.received_bytes)}")
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1_048_576:.2f} MB"
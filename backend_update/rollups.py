@@ -0,0 +1,260 @@
+"""
+Day / week / month price rollups of UnifiedCropPrice.
+
+Charts only need per-period aggregates, so the pipeline keeps three small
+tables that hold them, one row per period and series:
+
+    UnifiedCropPriceDaily    period_start = report day (UTC)
+    UnifiedCropPriceWeekly   period_start = Monday of the ISO week
+    UnifiedCropPriceMonthly  period_start = first of the month
+
+Series key: commodity, variety, package, district, organic, market_type.
+For each of price_per_lb, price_per_unit and price_avg, and the CPI-deflated
+real_price_avg and real_price_per_lb (see cpi.py), a row holds count, sum, min
+and max, so an average over any set of rows is sum(sum) / sum(count).
+
+The tables are maintained by the SQL function refresh_price_rollups(from, to),
+which recomputes every day, week and month overlapping [from, to] from the
+base table. Both upload paths call it for just the window they wrote: the
+daily REST job through RPC, the historical backfill over psycopg2.
+
+Usage:
+    python rollups.py --ddl                   # print tables + function SQL
+    python rollups.py --apply                 # create them via DB_CONNECTION_STRING
+    python rollups.py --rebuild               # recompute every period
+    python rollups.py --rebuild --from 2024-01-01 --to 2024-12-31
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+TABLE_NAME = "UnifiedCropPrice"
+
+ROLLUP_TABLES = {
+    "day": f"{TABLE_NAME}Daily",
+    "week": f"{TABLE_NAME}Weekly",
+    "month": f"{TABLE_NAME}Monthly",
+}
+
+SERIES_COLUMNS = ("commodity", "variety", "package", "district", "organic", "market_type")
+
+# CPI-deflated copies of price_avg / price_per_lb on the base table, kept by cpi.py.
+REAL_PRICE_COLUMNS = {"real_price_avg": "price_avg", "real_price_per_lb": "price_per_lb"}
+
+METRIC_COLUMNS = ("price_per_lb", "price_per_unit", "price_avg") + tuple(REAL_PRICE_COLUMNS)
+
+REFRESH_FUNCTION = "refresh_price_rollups"
+
+# Roles the frontends read with; only the pipeline's service role may refresh.
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def _table_sql(table: str) -> list[str]:
+    series = ",\n    ".join(f"{c} text" for c in SERIES_COLUMNS)
+    metrics = ",\n    ".join(
+        f"{m}_count integer NOT NULL, {m}_sum double precision, {m}_min real, {m}_max real"
+        for m in METRIC_COLUMNS
+    )
+    roles = ", ".join(READ_ROLES)
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{table}" (\n'
+        f"    period_start date NOT NULL,\n    {series},\n"
+        f"    row_count integer NOT NULL,\n    {metrics}\n)",
+        # Tables created before a metric was added gain its columns (refill with --rebuild).
+        *(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS {m}_count integer NOT NULL DEFAULT 0, '
+          f"ADD COLUMN IF NOT EXISTS {m}_sum double precision, "
+          f"ADD COLUMN IF NOT EXISTS {m}_min real, ADD COLUMN IF NOT EXISTS {m}_max real"
+          for m in METRIC_COLUMNS),
+        f'CREATE INDEX IF NOT EXISTS "{table}_commodity_period" '
+        f'ON "{table}" (commodity, period_start)',
+        f'CREATE INDEX IF NOT EXISTS "{table}_period" ON "{table}" (period_start)',
+        f'ALTER TABLE "{table}" ENABLE ROW LEVEL SECURITY',
+        f'DROP POLICY IF EXISTS "{table} read" ON "{table}"',
+        f'CREATE POLICY "{table} read" ON "{table}" FOR SELECT TO {roles} USING (true)',
+        f'GRANT SELECT ON "{table}" TO {roles}',
+    ]
+
+
+def _refresh_block(grain: str, table: str) -> str:
+    series = ", ".join(SERIES_COLUMNS)
+    metrics_cols = ", ".join(
+        f"{m}_count, {m}_sum, {m}_min, {m}_max" for m in METRIC_COLUMNS
+    )
+    metrics_aggs = ",\n             ".join(
+        f"count({m}), sum({m}), min({m}), max({m})" for m in METRIC_COLUMNS
+    )
+    return f"""
+    lo := date_trunc('{grain}', from_date)::date;
+    hi := (date_trunc('{grain}', to_date) + interval '1 {grain}')::date;
+    DELETE FROM "{table}" WHERE period_start >= lo AND period_start < hi;
+    INSERT INTO "{table}" (period_start, {series}, row_count, {metrics_cols})
+      SELECT date_trunc('{grain}', report_date)::date, {series}, count(*),
+             {metrics_aggs}
+      FROM "{TABLE_NAME}"
+      WHERE report_date >= lo AND report_date < hi
+      GROUP BY 1, {series};
+    GET DIAGNOSTICS n = ROW_COUNT;
+    total := total + n;"""
+
+
+def function_sql() -> str:
+    """refresh_price_rollups(from_date, to_date): recompute every grain over the window."""
+    body = "".join(_refresh_block(g, t) for g, t in ROLLUP_TABLES.items())
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}(from_date date, to_date date)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+SET timezone = 'UTC'
+AS $$
+DECLARE
+    lo date;
+    hi date;
+    n integer;
+    total integer := 0;
+BEGIN{body}
+    RETURN total;
+END;
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = [f'ALTER TABLE "{TABLE_NAME}" ADD COLUMN IF NOT EXISTS {c} real' for c in REAL_PRICE_COLUMNS]
+    for table in ROLLUP_TABLES.values():
+        stmts += _table_sql(table)
+    stmts.append(function_sql())
+    signature = f"{REFRESH_FUNCTION}(date, date)"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {signature} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {signature} TO {WRITE_ROLE}")
+    return stmts
+
+
+def month_slices(start: date, end: date):
+    """[start, end] split into calendar-month pieces, so each call stays small."""
+    month = pd.Period(start, "M")
+    while month.start_time.date() <= end:
+        lo = max(start, month.start_time.date())
+        hi = min(end, month.end_time.date())
+        yield lo, hi
+        month += 1
+
+
+def touched_window(df: pd.DataFrame) -> tuple[date, date] | None:
+    """First and last report day in a formatted frame (None when it has no dates)."""
+    if df.empty or "report_date" not in df.columns:
+        return None
+    dates = pd.to_datetime(df["report_date"], errors="coerce", utc=True).dropna()
+    if dates.empty:
+        return None
+    return dates.min().date(), dates.max().date()
+
+
+def refresh_rollups_pg(conn, start: date, end: date) -> int:
+    """Recompute every period overlapping [start, end], one month per transaction."""
+    total = 0
+    t0 = time.time()
+    with conn.cursor() as cur:
+        for lo, hi in month_slices(start, end):
+            cur.execute(f"SELECT {REFRESH_FUNCTION}(%s, %s)", (lo, hi))
+            total += cur.fetchone()[0]
+            conn.commit()
+    print(f"  ✔ Rollups refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_rollups_rest(client, start: date, end: date) -> int:
+    """Same as refresh_rollups_pg, through PostgREST RPC."""
+    total = 0
+    t0 = time.time()
+    for lo, hi in month_slices(start, end):
+        res = client.rpc(REFRESH_FUNCTION, {
+            "from_date": lo.isoformat(), "to_date": hi.isoformat(),
+        }).execute()
+        total += int(res.data or 0)
+    print(f"  ✔ Rollups refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def _utc_date(value) -> date:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC")
+    return ts.date()
+
+
+def full_range_pg(conn) -> tuple[date, date] | None:
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT min(report_date), max(report_date) FROM "{TABLE_NAME}"')
+        lo, hi = cur.fetchone()
+    conn.commit()
+    if lo is None:
+        return None
+    return _utc_date(lo), _utc_date(hi)
+
+
+def full_range_rest(client) -> tuple[date, date] | None:
+    ends = []
+    for desc in (False, True):
+        res = (client.table(TABLE_NAME).select("report_date")
+               .order("report_date", desc=desc).limit(1).execute())
+        if not res.data:
+            return None
+        ends.append(_utc_date(res.data[0]["report_date"]))
+    return ends[0], ends[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UnifiedCropPrice day/week/month rollups")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the rollup tables and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Recompute rollups from the base table")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="First day to rebuild")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last day to rebuild")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {', '.join(ROLLUP_TABLES.values())} and {REFRESH_FUNCTION}()")
+            print("    Run `python rollups.py --rebuild` once to fill them.")
+            return
+
+        window = full_range_pg(conn)
+        if window is None:
+            print(f"  {TABLE_NAME} is empty — nothing to roll up")
+            return
+        start = args.start or window[0]
+        end = args.end or window[1] + timedelta(days=7)
+        refresh_rollups_pg(conn, start, end)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
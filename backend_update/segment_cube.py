@@ -0,0 +1,505 @@
+"""
+Prefix-sum segment cube behind the Period A / Period B price bridge.
+
+priceBridge.js splits a price change into level, package-mix and origin-mix
+effects. All it needs per (market_type, package, origin) segment is the
+number of reports, the number with a price and the sum of those prices in
+each period, but today it downloads every raw row of both periods to get them.
+
+PriceSegmentCube stores, for every segment and every day the segment has
+reports, running totals from the first report up to and including that day:
+
+    cum_rows    reports
+    cum_priced  reports with a price_avg
+    cum_sum     sum of price_avg
+
+The totals of any period [from, to] are then the row at the last day <= to
+minus the row at the last day < from. With a third lookup for the first day
+>= from (the period's first report day), that is three index lookups per
+segment, however long the periods are. Segments are keyed by commodity, variety, district and
+organic too (the filters the bridge is drawn with), missing values as ''.
+PriceSegments lists the segments so a lookup starts from them, not the cube.
+
+segment_totals(commodity, from, to, variety, district, organic) returns those
+per-segment totals over RPC; compute_all_bridges() turns two of them into the
+same bridge objects as computeAllBridges() in priceBridge.js.
+
+The pipeline keeps the cube current: refresh_segment_cube(from[, to])
+recomputes every day on or after `from` (a running total depends on all
+earlier days), and both upload paths call it from the first day they wrote.
+
+Usage:
+    python segment_cube.py --ddl        # print tables + function SQL
+    python segment_cube.py --apply      # create them via DB_CONNECTION_STRING
+    python segment_cube.py --rebuild    # recompute the whole cube
+    python segment_cube.py --benchmark Apples --period-a 2024-01-01 2024-01-31 \\
+                                              --period-b 2025-01-01 2025-01-31
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from rollups import full_range_pg, full_range_rest
+
+TABLE_NAME = "UnifiedCropPrice"
+
+CUBE_TABLE = "PriceSegmentCube"
+SEGMENT_TABLE = "PriceSegments"
+
+# Filters the bridge is drawn with, then the segment the bridge decomposes over.
+FILTER_COLUMNS = ("commodity", "variety", "district", "organic")
+SEGMENT_COLUMNS = ("market_type", "package", "origin")
+KEY_COLUMNS = FILTER_COLUMNS + SEGMENT_COLUMNS
+
+TOTAL_COLUMNS = ("report_count", "price_count", "price_sum", "first_day", "last_day")
+
+REFRESH_FUNCTION = "refresh_segment_cube"
+TOTALS_FUNCTION = "segment_totals"
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def _match(a: str, b: str) -> str:
+    return " AND ".join(f"{a}.{c} = {b}.{c}" for c in KEY_COLUMNS)
+
+
+def _table_sql() -> list[str]:
+    keys = ",\n    ".join(f"{c} text NOT NULL DEFAULT ''" for c in KEY_COLUMNS)
+    key = ", ".join(KEY_COLUMNS)
+    roles = ", ".join(READ_ROLES)
+    stmts = [
+        f'CREATE TABLE IF NOT EXISTS "{CUBE_TABLE}" (\n    {keys},\n    day date NOT NULL,\n'
+        f"    cum_rows bigint NOT NULL,\n    cum_priced bigint NOT NULL,\n"
+        f"    cum_sum double precision NOT NULL,\n    PRIMARY KEY ({key}, day)\n)",
+        f'CREATE TABLE IF NOT EXISTS "{SEGMENT_TABLE}" (\n    {keys},\n'
+        f"    first_day date NOT NULL,\n    PRIMARY KEY ({key})\n)",
+    ]
+    for table in (CUBE_TABLE, SEGMENT_TABLE):
+        stmts += [
+            f'ALTER TABLE "{table}" ENABLE ROW LEVEL SECURITY',
+            f'DROP POLICY IF EXISTS "{table} read" ON "{table}"',
+            f'CREATE POLICY "{table} read" ON "{table}" FOR SELECT TO {roles} USING (true)',
+            f'GRANT SELECT ON "{table}" TO {roles}',
+        ]
+    return stmts
+
+
+def refresh_function_sql() -> str:
+    """refresh_segment_cube(from_date, to_date): recompute the cube for days in [from, to)."""
+    key = ", ".join(KEY_COLUMNS)
+    key_exprs = ", ".join(f"coalesce({c}::text, '') AS {c}" for c in KEY_COLUMNS)
+    groups = ", ".join(str(i) for i in range(1, len(KEY_COLUMNS) + 2))
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}(from_date date, to_date date DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+SET timezone = 'UTC'
+AS $$
+DECLARE
+    n integer;
+BEGIN
+    DELETE FROM "{CUBE_TABLE}" WHERE day >= from_date AND (to_date IS NULL OR day < to_date);
+    WITH daily AS (
+      SELECT report_date::date AS day, {key_exprs},
+             count(*) AS n, count(price_avg) AS c,
+             coalesce(sum(price_avg::double precision), 0) AS s
+      FROM "{TABLE_NAME}"
+      WHERE report_date >= from_date AND (to_date IS NULL OR report_date < to_date)
+      GROUP BY {groups}
+    ), base AS (
+      -- each segment's running totals as of the day before the window
+      SELECT k.*, b.cum_rows, b.cum_priced, b.cum_sum
+      FROM (SELECT DISTINCT {key} FROM daily) k
+      JOIN LATERAL (
+        SELECT c.cum_rows, c.cum_priced, c.cum_sum FROM "{CUBE_TABLE}" c
+        WHERE {_match("c", "k")} AND c.day < from_date
+        ORDER BY c.day DESC LIMIT 1) b ON true
+    ), segments AS (
+      INSERT INTO "{SEGMENT_TABLE}" ({key}, first_day)
+      SELECT {key}, min(day) FROM daily GROUP BY {key}
+      ON CONFLICT ({key}) DO UPDATE
+        SET first_day = least("{SEGMENT_TABLE}".first_day, excluded.first_day)
+    )
+    INSERT INTO "{CUBE_TABLE}" ({key}, day, cum_rows, cum_priced, cum_sum)
+      SELECT {key}, d.day,
+             coalesce(b.cum_rows, 0) + sum(d.n) OVER w,
+             coalesce(b.cum_priced, 0) + sum(d.c) OVER w,
+             coalesce(b.cum_sum, 0) + sum(d.s) OVER w
+      FROM daily d LEFT JOIN base b USING ({key})
+      WINDOW w AS (PARTITION BY {key} ORDER BY d.day);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$"""
+
+
+def totals_function_sql() -> str:
+    """segment_totals(...): per (market_type, package, origin) totals over [p_from, p_to]."""
+    params = ", ".join(f"p_{c} text DEFAULT NULL" for c in FILTER_COLUMNS[1:])
+    filters = "\n    ".join(
+        f"AND (p_{c} IS NULL OR p_{c} = '' OR s.{c} = p_{c})" for c in FILTER_COLUMNS[1:]
+    )
+
+    def lookup(alias: str, cond: str, order: str) -> str:
+        return (f"SELECT c.day, c.cum_rows, c.cum_priced, c.cum_sum "
+                f'FROM "{CUBE_TABLE}" c\n'
+                f"    WHERE {_match('c', 's')} AND {cond}\n"
+                f"    ORDER BY c.day {order} LIMIT 1) {alias}")
+
+    return f"""CREATE OR REPLACE FUNCTION {TOTALS_FUNCTION}(
+    p_commodity text, p_from date, p_to date, {params})
+RETURNS TABLE (market_type text, package text, origin text, report_count bigint,
+               price_count bigint, price_sum double precision, first_day date, last_day date)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT s.market_type, s.package, s.origin,
+         sum(hi.cum_rows - coalesce(lo.cum_rows, 0))::bigint,
+         sum(hi.cum_priced - coalesce(lo.cum_priced, 0))::bigint,
+         sum(hi.cum_sum - coalesce(lo.cum_sum, 0)),
+         min(fst.day), max(hi.day)
+  FROM "{SEGMENT_TABLE}" s
+  JOIN LATERAL ({lookup("hi", "c.day <= p_to", "DESC")} ON hi.day >= p_from
+  LEFT JOIN LATERAL ({lookup("lo", "c.day < p_from", "DESC")} ON true
+  JOIN LATERAL ({lookup("fst", "c.day >= p_from", "ASC")} ON true
+  WHERE s.commodity = p_commodity AND s.first_day <= p_to
+    {filters}
+  GROUP BY 1, 2, 3
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = _table_sql()
+    stmts.append(refresh_function_sql())
+    refresh = f"{REFRESH_FUNCTION}(date, date)"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {refresh} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {refresh} TO {WRITE_ROLE}")
+    stmts.append(totals_function_sql())
+    totals = f"{TOTALS_FUNCTION}(text, date, date, {', '.join('text' for _ in FILTER_COLUMNS[1:])})"
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {totals} TO {', '.join(READ_ROLES)}")
+    return stmts
+
+
+# ─── Refresh ────────────────────────────────────────────────────────────────
+
+def _year_slices(start: date, end: date):
+    """[start, ...) as calendar-year pieces; the last one is open-ended (to=None)."""
+    lo = start
+    while lo.year < end.year:
+        hi = date(lo.year + 1, 1, 1)
+        yield lo, hi
+        lo = hi
+    yield lo, None
+
+
+def refresh_cube_pg(conn, start: date) -> int:
+    """
+    Recompute the cube from `start` onwards, one year per transaction. Slices
+    run oldest first, since each builds on the running totals before it.
+    """
+    window = full_range_pg(conn)
+    end = window[1] if window else start
+    total = 0
+    t0 = time.time()
+    with conn.cursor() as cur:
+        for lo, hi in _year_slices(start, max(start, end)):
+            cur.execute(f"SELECT {REFRESH_FUNCTION}(%s, %s)", (lo, hi))
+            total += cur.fetchone()[0]
+            conn.commit()
+    print(f"  ✔ {CUBE_TABLE} refreshed from {start}: {total:,} rows ({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_cube_rest(client, start: date) -> int:
+    """Same as refresh_cube_pg, through PostgREST RPC."""
+    window = full_range_rest(client)
+    end = window[1] if window else start
+    total = 0
+    t0 = time.time()
+    for lo, hi in _year_slices(start, max(start, end)):
+        res = client.rpc(REFRESH_FUNCTION, {
+            "from_date": lo.isoformat(), "to_date": hi.isoformat() if hi else None,
+        }).execute()
+        total += int(res.data or 0)
+    print(f"  ✔ {CUBE_TABLE} refreshed from {start}: {total:,} rows ({time.time() - t0:.1f}s)")
+    return total
+
+
+# ─── Period totals ──────────────────────────────────────────────────────────
+
+def _totals_frame(rows) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=[*SEGMENT_COLUMNS, *TOTAL_COLUMNS])
+    for col in ("report_count", "price_count"):
+        df[col] = df[col].astype("int64")
+    df["price_sum"] = df["price_sum"].astype("float64")
+    return df
+
+
+def segment_totals_pg(conn, commodity: str, start: date, end: date,
+                      variety: str = None, district: str = None, organic: str = None) -> pd.DataFrame:
+    """Per-segment totals for report days in [start, end] (inclusive, UTC)."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {TOTALS_FUNCTION}(%s, %s, %s, %s, %s, %s)",
+                    (commodity, start, end, variety, district, organic))
+        rows = cur.fetchall()
+    conn.commit()
+    return _totals_frame(rows)
+
+
+def segment_totals_rest(client, commodity: str, start: date, end: date,
+                        variety: str = None, district: str = None, organic: str = None) -> pd.DataFrame:
+    """Same as segment_totals_pg, through PostgREST RPC."""
+    res = client.rpc(TOTALS_FUNCTION, {
+        "p_commodity": commodity, "p_from": start.isoformat(), "p_to": end.isoformat(),
+        "p_variety": variety, "p_district": district, "p_organic": organic,
+    }).execute()
+    return _totals_frame(res.data or [])
+
+
+def segment_totals_from_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """The same totals computed directly from raw rows (the approach the cube replaces)."""
+    if rows.empty:
+        return _totals_frame([])
+    df = rows[list(SEGMENT_COLUMNS)].astype("string").fillna("")
+    df["price"] = pd.to_numeric(rows["price_avg"], errors="coerce")
+    df["day"] = pd.to_datetime(rows["report_date"], errors="coerce", utc=True).dt.date
+    out = df.groupby(list(SEGMENT_COLUMNS), sort=False).agg(
+        report_count=("day", "size"), price_count=("price", "count"),
+        price_sum=("price", "sum"), first_day=("day", "min"), last_day=("day", "max"),
+    ).reset_index()
+    return _totals_frame(out.to_dict("records"))
+
+
+# ─── Bridge (mirrors web_frontend/src/shared/priceBridge.js) ────────────────
+
+def _round(value) -> float:
+    if value is None or pd.isna(value):
+        return 0
+    return math.floor(value * 100 + 0.5) / 100  # Math.round semantics
+
+
+def _overall_avg(totals: pd.DataFrame) -> float:
+    priced = totals["price_count"].sum()
+    return totals["price_sum"].sum() / priced if priced else 0
+
+
+def _groups(totals: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """Average price and weight (share of all reports) per group, priced groups only."""
+    g = totals.groupby(by)[["price_count", "price_sum"]].sum()
+    g = g[g["price_count"] > 0]
+    return pd.DataFrame({
+        "avg": g["price_sum"] / g["price_count"],
+        "weight": g["price_count"] / totals["report_count"].sum(),
+    })
+
+
+def _mix_effect(a: pd.DataFrame, b: pd.DataFrame, field: str) -> float:
+    ga, gb = _groups(a, [field]), _groups(b, [field])
+    both = ga.join(gb, how="outer", lsuffix="_a", rsuffix="_b")
+    # JS `avgA || avgB || 0`: a zero average falls through too.
+    ref = both["avg_a"].where(both["avg_a"].fillna(0) != 0, both["avg_b"])
+    ref = ref.where(ref.fillna(0) != 0, 0)
+    return float(((both["weight_b"].fillna(0) - both["weight_a"].fillna(0)) * ref).sum())
+
+
+def _period(totals: pd.DataFrame) -> dict:
+    days = totals[totals["report_count"] > 0]
+    if days.empty:
+        return {"start": None, "end": None, "reportCount": 0}
+    return {"start": str(days["first_day"].min()), "end": str(days["last_day"].max()),
+            "reportCount": int(days["report_count"].sum())}
+
+
+def _effects(price_level=0, package_mix=0, origin_mix=0, residual=0) -> list[dict]:
+    return [
+        {"label": "Price Level", "value": _round(price_level)},
+        {"label": "Package Mix", "value": _round(package_mix)},
+        {"label": "Origin Mix", "value": _round(origin_mix)},
+        {"label": "Other / Residual", "value": _round(residual)},
+    ]
+
+
+def compute_bridge(a: pd.DataFrame, b: pd.DataFrame) -> dict:
+    """Decompose the price change between two periods' segment totals (one market type)."""
+    avg_a, avg_b = _overall_avg(a), _overall_avg(b)
+    total_delta = avg_b - avg_a
+    rows_a, rows_b = a["report_count"].sum(), b["report_count"].sum()
+
+    if rows_a == 0 and rows_b == 0:
+        effects = _effects()
+    elif rows_a == 0:
+        effects = [{"label": "New Data", "value": total_delta}]
+    elif rows_b == 0:
+        effects = [{"label": "Data Removed", "value": total_delta}]
+    else:
+        # Price level (Laspeyres): hold A's segment weights, swap in B's prices.
+        key = ["package", "origin"]
+        seg = _groups(a, key).join(_groups(b, key), how="inner", lsuffix="_a", rsuffix="_b")
+        price_level = float((seg["weight_a"] * (seg["avg_b"] - seg["avg_a"])).sum())
+        package_mix = _mix_effect(a, b, "package")
+        origin_mix = _mix_effect(a, b, "origin")
+        residual = total_delta - price_level - package_mix - origin_mix
+        effects = _effects(price_level, package_mix, origin_mix, residual)
+
+    return {
+        "period_a_avg": _round(avg_a),
+        "period_b_avg": _round(avg_b),
+        "effects": effects,
+        "period_a": _period(a),
+        "period_b": _period(b),
+    }
+
+
+def _market(totals: pd.DataFrame, kind: str) -> pd.DataFrame:
+    mt = totals["market_type"].str.lower()
+    if kind == "terminal":
+        return totals[mt.str.contains("terminal") | (mt == "")]
+    return totals[mt.str.contains(kind)]
+
+
+def compute_all_bridges(a: pd.DataFrame, b: pd.DataFrame) -> dict:
+    """Bridges for terminal, shipping and retail, as computeAllBridges() returns them."""
+    out = {kind: compute_bridge(_market(a, kind), _market(b, kind))
+           for kind in ("terminal", "shipping", "retail")}
+    summary = {}
+    for kind in ("terminal", "shipping", "retail"):
+        pa, pb = out[kind]["period_a_avg"], out[kind]["period_b_avg"]
+        summary[f"{kind}_delta"] = _round(pb - pa)
+    for kind in ("terminal", "shipping", "retail"):
+        pa, pb = out[kind]["period_a_avg"], out[kind]["period_b_avg"]
+        summary[f"{kind}_pct"] = _round((pb - pa) / pa * 100) if pa else 0
+    out["summary"] = summary
+    return out
+
+
+# ─── Benchmark ──────────────────────────────────────────────────────────────
+
+def _raw_rows_pg(conn, commodity: str, start: date, end: date, filters: dict) -> pd.DataFrame:
+    """Every raw row of one period, as the frontend downloads them."""
+    where = ["commodity = %s", "report_date >= %s", "report_date < %s"]
+    params = [commodity, start, end + timedelta(days=1)]
+    for col, value in filters.items():
+        if value:
+            where.append(f"{col} = %s")
+            params.append(value)
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'UTC'")
+        cur.execute(
+            f"SELECT report_date, {', '.join(SEGMENT_COLUMNS)}, price_avg "
+            f'FROM "{TABLE_NAME}" WHERE {" AND ".join(where)}', params)
+        rows = pd.DataFrame(cur.fetchall(), columns=["report_date", *SEGMENT_COLUMNS, "price_avg"])
+    conn.commit()
+    return rows
+
+
+def benchmark(conn, commodity: str, period_a, period_b, filters: dict, repeat: int = 5):
+    """Time raw-row bridges against cube bridges for the same two periods."""
+    def raw():
+        rows = [_raw_rows_pg(conn, commodity, *p, filters) for p in (period_a, period_b)]
+        return sum(map(len, rows)), compute_all_bridges(*map(segment_totals_from_rows, rows))
+
+    def cube():
+        totals = [segment_totals_pg(conn, commodity, *p, **filters) for p in (period_a, period_b)]
+        return sum(map(len, totals)), compute_all_bridges(*totals)
+
+    results = {}
+    for name, fn in (("raw rows", raw), ("segment cube", cube)):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fetched, bridges = fn()
+            times.append(time.perf_counter() - t0)
+        results[name] = bridges
+        unit = "rows" if name == "raw rows" else "segments"
+        print(f"  {name:<13} median {statistics.median(times) * 1000:8.1f} ms "
+              f"(best {min(times) * 1000:.1f} ms), {fetched:,} {unit} fetched")
+
+    same = results["raw rows"] == results["segment cube"]
+    print(f"  bridges {'identical' if same else 'DIFFER'}")
+    for kind in ("terminal", "shipping", "retail"):
+        bridge = results["segment cube"][kind]
+        effects = ", ".join(f"{e['label']} {e['value']:+.2f}" for e in bridge["effects"])
+        print(f"    {kind:<9} {bridge['period_a_avg']:.2f} → {bridge['period_b_avg']:.2f}: {effects}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix-sum segment cube for price bridges")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the cube tables and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Recompute the cube from the base table")
+    group.add_argument("--benchmark", metavar="COMMODITY",
+                       help="Time raw-row vs cube bridges for one commodity")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                        help="First day to rebuild (later days are recomputed too)")
+    parser.add_argument("--period-a", nargs=2, type=date.fromisoformat, metavar=("START", "END"))
+    parser.add_argument("--period-b", nargs=2, type=date.fromisoformat, metavar=("START", "END"))
+    for col in FILTER_COLUMNS[1:]:
+        parser.add_argument(f"--{col}", help=f"Benchmark filter on {col}")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {CUBE_TABLE}, {SEGMENT_TABLE}, "
+                  f"{REFRESH_FUNCTION}() and {TOTALS_FUNCTION}()")
+            print("    Run `python segment_cube.py --rebuild` once to fill them.")
+            return
+
+        window = full_range_pg(conn)
+        if window is None:
+            print(f"  {TABLE_NAME} is empty")
+            return
+
+        if args.rebuild:
+            refresh_cube_pg(conn, args.start or window[0])
+            return
+
+        # Default periods: the last full month vs the same month a year earlier.
+        last = window[1].replace(day=1) - timedelta(days=1)
+        period_b = args.period_b or (last.replace(day=1), last)
+        if args.period_a:
+            period_a = tuple(args.period_a)
+        else:
+            first = period_b[0].replace(year=period_b[0].year - 1)
+            period_a = (first, (pd.Timestamp(first) + pd.offsets.MonthEnd(0)).date())
+        filters = {col: getattr(args, col) for col in FILTER_COLUMNS[1:]}
+        print(f"Bridging {args.benchmark}: {period_a[0]}..{period_a[1]} → "
+              f"{period_b[0]}..{period_b[1]} ({args.repeat} runs each)")
+        benchmark(conn, args.benchmark, period_a, period_b, filters, args.repeat)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
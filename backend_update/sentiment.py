@@ -0,0 +1,258 @@
+"""
+Daily market-sentiment index per commodity.
+
+scripts/analyze_market_notes.py downloads every market-tone comment in a date
+range and counts USDA tone keywords on each call. The tallies are additive,
+so the pipeline keeps them per commodity and report day instead:
+
+    MarketSentimentDaily  (commodity, report_day) -> notes, one count per
+                          keyword, positive / negative / neutral scores
+
+Counts are per row, as the script counts them: a note carried by 12 rows
+adds 12 to each keyword it contains. They are read from MarketNotes (see
+market_notes.py), which already holds each distinct note once per day with its
+row count, so a refresh only touches the report days an upload wrote.
+
+Any range is then a sum over at most one row per day; market_sentiment()
+returns that sum and the same trend call the script makes.
+
+Usage:
+    python sentiment.py --ddl        # print table + function SQL
+    python sentiment.py --apply      # create them via DB_CONNECTION_STRING
+    python sentiment.py --rebuild    # recompute every day
+    python sentiment.py --commodity Apples --from 2024-01-01 --to 2024-12-31
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from market_notes import NOTES_TABLE
+from rollups import full_range_pg, month_slices
+
+SENTIMENT_TABLE = "MarketSentimentDaily"
+
+# USDA standard market-tone words, as tallied by analyze_market_notes.py.
+POSITIVE = ("higher", "active", "good", "firm")
+NEGATIVE = ("lower", "slow", "light", "weak")
+NEUTRAL = ("steady", "moderate", "fair")
+KEYWORDS = POSITIVE + NEGATIVE + NEUTRAL
+
+SOURCE_FIELD = "market_tone_comments"
+
+REFRESH_FUNCTION = "refresh_market_sentiment"
+QUERY_FUNCTION = "market_sentiment"
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def _table_sql() -> list[str]:
+    counts = ",\n    ".join(f"{k} integer NOT NULL" for k in KEYWORDS)
+    roles = ", ".join(READ_ROLES)
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{SENTIMENT_TABLE}" (\n'
+        f"    commodity text NOT NULL,\n    report_day date NOT NULL,\n"
+        f"    notes integer NOT NULL,\n    {counts},\n"
+        f"    positive integer NOT NULL,\n    negative integer NOT NULL,\n"
+        f"    neutral integer NOT NULL,\n    PRIMARY KEY (commodity, report_day)\n)",
+        f'CREATE INDEX IF NOT EXISTS "{SENTIMENT_TABLE}_day" ON "{SENTIMENT_TABLE}" (report_day)',
+        f'ALTER TABLE "{SENTIMENT_TABLE}" ENABLE ROW LEVEL SECURITY',
+        f'DROP POLICY IF EXISTS "{SENTIMENT_TABLE} read" ON "{SENTIMENT_TABLE}"',
+        f'CREATE POLICY "{SENTIMENT_TABLE} read" ON "{SENTIMENT_TABLE}" '
+        f"FOR SELECT TO {roles} USING (true)",
+        f'GRANT SELECT ON "{SENTIMENT_TABLE}" TO {roles}',
+    ]
+
+
+def refresh_function_sql() -> str:
+    """refresh_market_sentiment(from_date, to_date): recompute every day in [from, to]."""
+    pattern = "\\m(" + "|".join(KEYWORDS) + ")\\M"
+    per_note = ",\n               ".join(
+        f"count(*) FILTER (WHERE m[1] = '{k}') AS {k}" for k in KEYWORDS)
+    sums = ",\n             ".join(f"sum(n.row_count * k.{k}) AS {k}" for k in KEYWORDS)
+    score = {name: " + ".join(words) for name, words in
+             (("positive", POSITIVE), ("negative", NEGATIVE), ("neutral", NEUTRAL))}
+    cols = ", ".join(KEYWORDS)
+    return f"""CREATE OR REPLACE FUNCTION {REFRESH_FUNCTION}(from_date date, to_date date)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    n integer;
+BEGIN
+    DELETE FROM "{SENTIMENT_TABLE}" WHERE report_day >= from_date AND report_day <= to_date;
+    INSERT INTO "{SENTIMENT_TABLE}" (commodity, report_day, notes, {cols}, positive, negative, neutral)
+      SELECT commodity, report_day, notes, {cols},
+             {score["positive"]}, {score["negative"]}, {score["neutral"]}
+      FROM (
+        SELECT n.commodity, n.report_day, sum(n.row_count) AS notes,
+             {sums}
+        FROM "{NOTES_TABLE}" n
+        CROSS JOIN LATERAL (
+          SELECT {per_note}
+          FROM regexp_matches(lower(n.note), '{pattern}', 'g') m
+        ) k
+        WHERE n.field = '{SOURCE_FIELD}' AND n.report_day >= from_date AND n.report_day <= to_date
+        GROUP BY 1, 2
+      ) t;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$"""
+
+
+def query_function_sql() -> str:
+    """market_sentiment(commodity, from, to): summed tallies and the trend call."""
+    sums = ", ".join(f"sum({k})::bigint AS {k}" for k in KEYWORDS)
+    returns = ", ".join(f"{k} bigint" for k in KEYWORDS)
+    return f"""CREATE OR REPLACE FUNCTION {QUERY_FUNCTION}(
+    p_commodity text, p_from date DEFAULT NULL, p_to date DEFAULT NULL)
+RETURNS TABLE (days bigint, notes bigint, {returns},
+               positive bigint, negative bigint, neutral bigint, trend text)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  SELECT *, CASE
+      WHEN t.positive > t.negative AND t.positive > t.neutral THEN 'bullish'
+      WHEN t.negative > t.positive AND t.negative > t.neutral THEN 'bearish'
+      WHEN t.neutral > t.positive AND t.neutral > t.negative THEN 'neutral'
+      ELSE 'mixed' END
+  FROM (
+    SELECT count(*) AS days, coalesce(sum(notes), 0)::bigint AS notes, {sums},
+           coalesce(sum(positive), 0)::bigint AS positive,
+           coalesce(sum(negative), 0)::bigint AS negative,
+           coalesce(sum(neutral), 0)::bigint AS neutral
+    FROM "{SENTIMENT_TABLE}"
+    WHERE commodity = p_commodity
+      AND (p_from IS NULL OR report_day >= p_from)
+      AND (p_to IS NULL OR report_day <= p_to)
+  ) t
+$$"""
+
+
+def ddl() -> list[str]:
+    stmts = _table_sql()
+    stmts.append(refresh_function_sql())
+    refresh = f"{REFRESH_FUNCTION}(date, date)"
+    stmts.append(f"REVOKE EXECUTE ON FUNCTION {refresh} FROM PUBLIC, {', '.join(READ_ROLES)}")
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {refresh} TO {WRITE_ROLE}")
+    stmts.append(query_function_sql())
+    stmts.append(f"GRANT EXECUTE ON FUNCTION {QUERY_FUNCTION}(text, date, date) "
+                 f"TO {', '.join(READ_ROLES)}")
+    return stmts
+
+
+def refresh_sentiment_pg(conn, start: date, end: date) -> int:
+    """Recompute the index for report days in [start, end], one month per transaction."""
+    total = 0
+    t0 = time.time()
+    with conn.cursor() as cur:
+        for lo, hi in month_slices(start, end):
+            cur.execute(f"SELECT {REFRESH_FUNCTION}(%s, %s)", (lo, hi))
+            total += cur.fetchone()[0]
+            conn.commit()
+    print(f"  ✔ {SENTIMENT_TABLE} refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def refresh_sentiment_rest(client, start: date, end: date) -> int:
+    """Same as refresh_sentiment_pg, through PostgREST RPC."""
+    total = 0
+    t0 = time.time()
+    for lo, hi in month_slices(start, end):
+        res = client.rpc(REFRESH_FUNCTION, {
+            "from_date": lo.isoformat(), "to_date": hi.isoformat(),
+        }).execute()
+        total += int(res.data or 0)
+    print(f"  ✔ {SENTIMENT_TABLE} refreshed for {start}..{end}: {total:,} rows "
+          f"({time.time() - t0:.1f}s)")
+    return total
+
+
+def sentiment_pg(conn, commodity: str, start: date = None, end: date = None) -> dict:
+    """Keyword tallies, scores and trend for a commodity over [start, end]."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {QUERY_FUNCTION}(%s, %s, %s)", (commodity, start, end))
+        names = [d[0] for d in cur.description]
+        row = cur.fetchone()
+    conn.commit()
+    return dict(zip(names, row))
+
+
+def sentiment_rest(client, commodity: str, start: date = None, end: date = None) -> dict:
+    """Same as sentiment_pg, through PostgREST RPC."""
+    res = client.rpc(QUERY_FUNCTION, {
+        "p_commodity": commodity,
+        "p_from": start.isoformat() if start else None,
+        "p_to": end.isoformat() if end else None,
+    }).execute()
+    return res.data[0] if res.data else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily market-sentiment index")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ddl", action="store_true", help="Print the table and function SQL")
+    group.add_argument("--apply", action="store_true", help="Create them via DB_CONNECTION_STRING")
+    group.add_argument("--rebuild", action="store_true", help="Recompute from MarketNotes")
+    group.add_argument("--commodity", help="Print the sentiment of a commodity")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    db_conn_str = os.getenv("DB_CONNECTION_STRING")
+    if not db_conn_str:
+        print("ERROR: DB_CONNECTION_STRING must be set in .env")
+        sys.exit(1)
+
+    import psycopg2
+    conn = psycopg2.connect(db_conn_str)
+    try:
+        if args.apply:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+            print(f"  ✔ Created {SENTIMENT_TABLE}, {REFRESH_FUNCTION}() and {QUERY_FUNCTION}()")
+            print("    Run `python sentiment.py --rebuild` once to fill it.")
+            return
+
+        if args.rebuild:
+            window = full_range_pg(conn)
+            if window is None:
+                print("  Nothing to index")
+                return
+            refresh_sentiment_pg(conn, args.start or window[0], args.end or window[1] + timedelta(days=7))
+            return
+
+        t0 = time.perf_counter()
+        result = sentiment_pg(conn, args.commodity, args.start, args.end)
+        elapsed = (time.perf_counter() - t0) * 1000
+        print(f"{args.commodity}: {result['notes']:,} notes over {result['days']:,} report days")
+        for k in sorted(KEYWORDS, key=lambda k: result[k] or 0, reverse=True):
+            if result[k]:
+                print(f"  {k.capitalize()}: {result[k]:,}")
+        print(f"  Positive {result['positive']:,} / Negative {result['negative']:,} / "
+              f"Neutral {result['neutral']:,}  =>  {result['trend']}  ({elapsed:.0f} ms)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
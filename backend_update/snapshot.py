@@ -0,0 +1,381 @@
+"""
+Incremental Parquet snapshot of the production UnifiedCropPrice table.
+
+local_analytics.py --build formats the local CSV files; nothing mirrors what is
+actually in Supabase, so every analysis goes back to the API. This module keeps
+a copy of the table in the same layout LocalAnalytics reads,
+
+    APP_CROP_DATA/snapshot/year=2024/data.parquet      (+ _manifest.json)
+
+and updates it from what changed since the last sync. The manifest records
+the id watermark (the largest id synced) and, per report month, the row count
+and a checksum (sum of hashtextextended(row::text)) of the rows synced. One
+call per year to the SQL function
+
+    snapshot_manifest(upto_id, from_date, to_date)
+
+returns, per month, the count and checksum of the rows with id <= upto_id and
+the count of the newer rows. Then, per month:
+
+  - old part unchanged, newer rows    fetch only ids in (watermark, new max]
+  - count or checksum differs         (rows updated or deleted in place, or a
+                                      window replaced) fetch the whole month
+  - month gone from the table         drop it
+
+Months are fetched in parallel, each paged by keyset on id (table_reader.py).
+Each touched year is then compacted into one Parquet file (the kept months of
+the old file plus the fetched ones, ordered by report_date, id) and swapped
+in. A sync that finds nothing to do only costs the manifest calls.
+
+Usage:
+    python snapshot.py --apply        # create snapshot_manifest() via DB_CONNECTION_STRING
+    python snapshot.py                # sync (psycopg2 if DB_CONNECTION_STRING, else REST)
+    python snapshot.py --full         # ignore the manifest, fetch everything
+    python snapshot.py --info         # rows per year in the snapshot
+    python local_analytics.py --snapshot --sql "SELECT count(*) FROM UnifiedCropPrice"
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+sys.path.insert(0, os.path.dirname(__file__))
+from format_data import DATA_DIR
+from local_analytics import normalize_frame, require_duckdb
+from table_reader import read_pg, read_rest
+
+TABLE_NAME = "UnifiedCropPrice"
+KEY_COLUMN = "id"
+
+SNAPSHOT_DIR = os.path.abspath(os.getenv("LOCAL_SNAPSHOT_DIR") or os.path.join(DATA_DIR, "snapshot"))
+MANIFEST_NAME = "_manifest.json"
+
+MANIFEST_FUNCTION = "snapshot_manifest"
+
+# Months fetched at once.
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", "4"))
+
+READ_ROLES = ("anon", "authenticated")
+WRITE_ROLE = "service_role"
+
+
+def function_sql() -> str:
+    """snapshot_manifest(upto_id, from_date, to_date): per-month counts and checksums."""
+    return f"""CREATE OR REPLACE FUNCTION {MANIFEST_FUNCTION}(upto_id bigint, from_date date, to_date date)
+RETURNS TABLE (month date, old_rows bigint, old_checksum text, new_rows bigint,
+               new_checksum text, max_id bigint)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+SET timezone = 'UTC'
+AS $$
+    SELECT date_trunc('month', u.report_date)::date,
+           count(*) FILTER (WHERE u.{KEY_COLUMN} <= upto_id),
+           coalesce(sum(hashtextextended(u::text, 0)) FILTER (WHERE u.{KEY_COLUMN} <= upto_id), 0)::text,
+           count(*) FILTER (WHERE u.{KEY_COLUMN} > upto_id),
+           coalesce(sum(hashtextextended(u::text, 0)) FILTER (WHERE u.{KEY_COLUMN} > upto_id), 0)::text,
+           max(u.{KEY_COLUMN})
+    FROM "{TABLE_NAME}" u
+    WHERE u.report_date >= from_date AND u.report_date < to_date + 1
+    GROUP BY 1
+    ORDER BY 1
+$$"""
+
+
+def ddl() -> list[str]:
+    signature = f"{MANIFEST_FUNCTION}(bigint, date, date)"
+    return [
+        function_sql(),
+        f"REVOKE EXECUTE ON FUNCTION {signature} FROM PUBLIC, {', '.join(READ_ROLES)}",
+        f"GRANT EXECUTE ON FUNCTION {signature} TO {WRITE_ROLE}",
+    ]
+
+
+# ─── Manifest ───────────────────────────────────────────────────────────────
+
+def load_manifest(snapshot_dir: str = SNAPSHOT_DIR) -> dict:
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"watermark": 0, "months": {}}
+
+
+def save_manifest(manifest: dict, snapshot_dir: str = SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def plan(manifest: dict, server: dict) -> tuple[dict, list[str]]:
+    """
+    month -> "append" (only ids past the watermark) or "full" for every month
+    that needs fetching, and the local months the table no longer has.
+    """
+    work = {}
+    for month, s in server.items():
+        local = manifest["months"].get(month, {"rows": 0, "checksum": "0"})
+        if s["old_rows"] == local["rows"] and s["old_checksum"] == local["checksum"]:
+            if s["new_rows"]:
+                work[month] = "append"
+        else:
+            work[month] = "full"
+    dropped = sorted(set(manifest["months"]) - set(server))
+    return work, dropped
+
+
+# ─── Sources ────────────────────────────────────────────────────────────────
+
+class _PgSource:
+    """Manifest calls and month reads over psycopg2, one connection per thread."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+
+    def _connect(self):
+        import psycopg2
+        return psycopg2.connect(self.dsn)
+
+    def window(self) -> tuple[date, date] | None:
+        from rollups import full_range_pg
+        conn = self._connect()
+        try:
+            return full_range_pg(conn)
+        finally:
+            conn.close()
+
+    def columns(self) -> list[str]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f'SELECT * FROM "{TABLE_NAME}" LIMIT 0')
+                return [d[0] for d in cur.description]
+        finally:
+            conn.close()
+
+    def manifest(self, upto: int, start: date, end: date) -> list[dict]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT * FROM {MANIFEST_FUNCTION}(%s, %s, %s)", (upto, start, end))
+                names = [d[0] for d in cur.description]
+                return [dict(zip(names, row)) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def read(self, columns, start: date, end: date, ids: tuple) -> pd.DataFrame:
+        conn = self._connect()
+        try:
+            chunks = list(read_pg(conn, columns, since=start, until=end, ids=ids))
+        finally:
+            conn.close()
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+class _RestSource:
+    """The same through PostgREST (the client is shared; requests are independent)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def window(self) -> tuple[date, date] | None:
+        from rollups import full_range_rest
+        return full_range_rest(self.client)
+
+    def columns(self) -> list[str]:
+        res = self.client.table(TABLE_NAME).select("*").limit(1).execute()
+        return list(res.data[0]) if res.data else []
+
+    def manifest(self, upto: int, start: date, end: date) -> list[dict]:
+        res = self.client.rpc(MANIFEST_FUNCTION, {
+            "upto_id": upto, "from_date": start.isoformat(), "to_date": end.isoformat(),
+        }).execute()
+        return [dict(r, month=date.fromisoformat(r["month"])) for r in res.data or []]
+
+    def read(self, columns, start: date, end: date, ids: tuple) -> pd.DataFrame:
+        chunks = list(read_rest(self.client, columns, since=start, until=end, ids=ids, workers=1))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+# ─── Sync ───────────────────────────────────────────────────────────────────
+
+def _month_bounds(month: str) -> tuple[date, date]:
+    period = pd.Period(month, "M")
+    return period.start_time.date(), period.end_time.date()
+
+
+def _year_files(snapshot_dir: str, year: int) -> list[str]:
+    return sorted(glob.glob(os.path.join(snapshot_dir, f"year={year}", "*.parquet")))
+
+
+def _typed(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Fetched months as one frame with the store's column types."""
+    df = pd.concat(frames, ignore_index=True)
+    for col in df.columns[df.isna().all().to_numpy()]:
+        df[col] = np.nan  # typeless: let the kept months decide in the union
+    return normalize_frame(df)
+
+
+def _compact(con, snapshot_dir: str, year: int, replaced: set[str], frames: list[pd.DataFrame]) -> int:
+    """Rewrite a year as one file: its kept months plus the fetched ones. Returns its rows."""
+    directory = os.path.join(snapshot_dir, f"year={year}")
+    old = _year_files(snapshot_dir, year)
+    parts = []
+    if old:
+        months = ", ".join(f"'{m}'" for m in replaced) or "''"
+        parts.append(f"SELECT * FROM read_parquet({old!r}, hive_partitioning = false, union_by_name = true) "
+                     f"WHERE strftime(report_date, '%Y-%m') NOT IN ({months})")
+    if frames:
+        con.register("fetched", _typed(frames))
+        parts.append("SELECT * FROM fetched")
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, "data.parquet.tmp")
+    sql = " UNION ALL BY NAME ".join(f"({p})" for p in parts)
+    con.execute(f"COPY (SELECT * FROM ({sql}) ORDER BY report_date, {KEY_COLUMN}) TO '{tmp}' "
+                "(FORMAT PARQUET, COMPRESSION ZSTD)")
+    if frames:
+        con.unregister("fetched")
+    rows = con.execute(f"SELECT count(*) FROM read_parquet('{tmp}')").fetchone()[0]
+    for path in old:
+        os.remove(path)
+    if rows:
+        os.replace(tmp, os.path.join(directory, "data.parquet"))
+    else:
+        shutil.rmtree(directory)
+    return rows
+
+
+def sync(source, snapshot_dir: str = SNAPSHOT_DIR, full: bool = False,
+         workers: int = SNAPSHOT_WORKERS) -> dict:
+    """Bring the snapshot up to date with the table. Returns the new manifest."""
+    t0 = time.time()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = {"watermark": 0, "months": {}} if full else load_manifest(snapshot_dir)
+    window = source.window()
+    if window is None:
+        print(f"  {TABLE_NAME} is empty — nothing to sync")
+        return manifest
+    watermark = manifest["watermark"]
+
+    # Per-month state of the table, one manifest call per year, in parallel.
+    years = range(window[0].year, window[1].year + 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = pool.map(lambda y: source.manifest(watermark, date(y, 1, 1), date(y, 12, 31)), years)
+        server = {f"{r['month']:%Y-%m}": r for rows in results for r in rows}
+    upto = max([watermark] + [int(r["max_id"]) for r in server.values()])
+    work, dropped = plan(manifest, server)
+    appended = sum(1 for kind in work.values() if kind == "append")
+    print(f"  {len(server)} months in {TABLE_NAME}: {appended} with new rows, "
+          f"{len(work) - appended} changed, {len(dropped)} removed "
+          f"({time.time() - t0:.1f}s)")
+
+    columns = source.columns() if work else []
+
+    def fetch(month: str) -> tuple[str, pd.DataFrame]:
+        start, end = _month_bounds(month)
+        after = watermark if work[month] == "append" else None
+        return month, source.read(columns, start, end, (after, upto))
+
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for month, df in pool.map(fetch, sorted(work)):
+            if not df.empty:
+                fetched.setdefault(int(month[:4]), []).append(df)
+    rows_fetched = sum(len(df) for frames in fetched.values() for df in frames)
+    print(f"  → {rows_fetched:,} rows fetched from {len(work)} months ({time.time() - t0:.1f}s)")
+
+    # Compact every touched year: appended months keep their rows and gain the
+    # fetched ones; the other fetched (or removed) months are replaced.
+    con = require_duckdb().connect()
+    for year in sorted({int(m[:4]) for m in [*work, *dropped]}):
+        replaced = {m for m in [*work, *dropped]
+                    if m.startswith(f"{year}-") and work.get(m) != "append"}
+        rows = _compact(con, snapshot_dir, year, replaced, fetched.get(year, []))
+        print(f"  ✔ year={year}: {rows:,} rows")
+    con.close()
+
+    for month in dropped:
+        manifest["months"].pop(month, None)
+    for month, s in server.items():
+        manifest["months"][month] = {
+            "rows": int(s["old_rows"]) + int(s["new_rows"]),
+            "checksum": str(int(s["old_checksum"]) + int(s["new_checksum"])),
+        }
+    manifest["watermark"] = upto
+    manifest["synced_at"] = pd.Timestamp.now(tz="UTC").isoformat(timespec="seconds")
+    save_manifest(manifest, snapshot_dir)
+    print(f"\n✔ Snapshot synced: {sum(m['rows'] for m in manifest['months'].values()):,} rows "
+          f"through id {upto:,} in {snapshot_dir} ({time.time() - t0:.1f}s)")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental Parquet snapshot of UnifiedCropPrice")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--ddl", action="store_true", help="Print the manifest function SQL")
+    group.add_argument("--apply", action="store_true", help="Create it via DB_CONNECTION_STRING")
+    group.add_argument("--info", action="store_true", help="Rows per year in the snapshot")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and fetch everything")
+    parser.add_argument("--workers", type=int, default=SNAPSHOT_WORKERS)
+    parser.add_argument("--rest", action="store_true", help="Use the REST API even if DB_CONNECTION_STRING is set")
+    args = parser.parse_args()
+
+    if args.ddl:
+        print(";\n\n".join(ddl()) + ";")
+        return
+
+    if args.info:
+        manifest = load_manifest()
+        per_year = {}
+        for month, m in manifest["months"].items():
+            per_year[month[:4]] = per_year.get(month[:4], 0) + m["rows"]
+        for year, rows in sorted(per_year.items()):
+            print(f"  {year}: {rows:,} rows")
+        print(f"\nWatermark id {manifest['watermark']:,}, synced {manifest.get('synced_at', 'never')}")
+        return
+
+    db_conn_str = None if args.rest else os.getenv("DB_CONNECTION_STRING")
+    if args.apply:
+        if not db_conn_str:
+            print("ERROR: DB_CONNECTION_STRING must be set in .env")
+            sys.exit(1)
+        import psycopg2
+        conn = psycopg2.connect(db_conn_str)
+        try:
+            with conn.cursor() as cur:
+                for sql in ddl():
+                    cur.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"  ✔ Created {MANIFEST_FUNCTION}()")
+        print("    Run `python snapshot.py` to take the first snapshot.")
+        return
+
+    if db_conn_str:
+        source = _PgSource(db_conn_str)
+    elif os.getenv("SUPABASE_URL"):
+        from overwrite_supabse import get_supabase_client
+        source = _RestSource(get_supabase_client())
+    else:
+        print("ERROR: DB_CONNECTION_STRING or SUPABASE_URL must be set in .env")
+        sys.exit(1)
+    sync(source, full=args.full, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
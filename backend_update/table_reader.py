@@ -0,0 +1,289 @@
+"""
+Complete, parallel reads of UnifiedCropPrice.
+
+The backend scripts read Supabase with one capped query — `.limit(10000)`,
+`.limit(50000)` — and PostgREST's max-rows setting cuts even those to a page,
+so audits over the multi-million-row table silently see a fraction of it.
+This module reads every matching row instead:
+
+  - REST: the id range is split into key ranges and several are fetched in
+    parallel. Each range is paged by keyset (`id >= cursor ORDER BY id LIMIT
+    n`, cursor = last id + 1) until a page comes back empty, so no server row
+    cap can truncate it. Only the listed columns are requested, and report_date
+    bounds (`since` / `until`) are applied server-side.
+  - PostgreSQL: one server-side cursor streams the result in fetchmany()
+    chunks.
+
+Both yield DataFrame chunks as they arrive, so callers can aggregate without
+holding the table. The distinct_* variants return the distinct combinations
+of a few columns, e.g. every (commodity, package): server-side DISTINCT over
+psycopg2, per-chunk de-duplication over REST.
+
+    from table_reader import read_rest, distinct_rest
+    for chunk in read_rest(client, ["commodity", "package", "price_avg"], since=date(2024, 1, 1)):
+        ...
+    pairs = distinct_rest(client, ["commodity", "package"])
+
+Usage:
+    python table_reader.py --columns commodity,package --distinct
+    python table_reader.py --columns market_type --since 2025-01-01
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Iterator
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+
+TABLE_NAME = "UnifiedCropPrice"
+KEY_COLUMN = "id"
+
+# Rows per REST request. PostgREST may cap it lower (max-rows); paging stops on
+# an empty page, not a short one, so a lower cap only costs requests.
+PAGE_SIZE = 1000
+
+# Parallel REST requests, and key ranges per worker (more ranges balance
+# uneven id density, e.g. gaps left by deleted windows).
+READ_WORKERS = int(os.getenv("READ_WORKERS", "4"))
+RANGES_PER_WORKER = 4
+
+# Rows per yielded chunk.
+CHUNK_ROWS = 50000
+
+
+def _filtered(query, filters: dict = None, since: date = None, until: date = None,
+              ids: tuple = None):
+    """Equality filters, a report_date window [since, until] and an id window (after, upto]."""
+    for col, value in (filters or {}).items():
+        query = query.eq(col, value)
+    if since:
+        query = query.gte("report_date", since.isoformat())
+    if until:
+        query = query.lt("report_date", (pd.Timestamp(until) + pd.Timedelta(days=1)).date().isoformat())
+    after, upto = ids or (None, None)
+    if after is not None:
+        query = query.gt(KEY_COLUMN, after)
+    if upto is not None:
+        query = query.lte(KEY_COLUMN, upto)
+    return query
+
+
+def id_range_rest(client, table: str = TABLE_NAME, filters: dict = None,
+                  since: date = None, until: date = None, ids: tuple = None) -> tuple[int, int] | None:
+    """Smallest and largest id of the matching rows (None when there are none)."""
+    ends = []
+    for desc in (False, True):
+        query = _filtered(client.table(table).select(KEY_COLUMN), filters, since, until, ids)
+        res = query.order(KEY_COLUMN, desc=desc).limit(1).execute()
+        if not res.data:
+            return None
+        ends.append(int(res.data[0][KEY_COLUMN]))
+    return ends[0], ends[1]
+
+
+def key_ranges(lo: int, hi: int, parts: int) -> list[tuple[int, int]]:
+    """[lo, hi] split into `parts` half-open [start, stop) ranges."""
+    parts = max(1, min(parts, hi - lo + 1))
+    step = (hi - lo + 1) / parts
+    bounds = [lo + round(i * step) for i in range(parts)] + [hi + 1]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def _parallel(fetch_range, ranges: list[tuple[int, int]], workers: int) -> Iterator[pd.DataFrame]:
+    """Run fetch_range over the ranges on `workers` threads, yielding chunks as they come."""
+    out = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(lo, hi):
+        try:
+            for chunk in fetch_range(lo, hi):
+                if stop.is_set():
+                    return
+                put(chunk)
+        except Exception as e:  # surfaced to the consumer
+            put(e)
+        finally:
+            put(done)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for lo, hi in ranges:
+            executor.submit(run, lo, hi)
+        remaining = len(ranges)
+        while remaining:
+            item = out.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_rest(client, columns: list[str], filters: dict = None, since: date = None,
+              until: date = None, table: str = TABLE_NAME, workers: int = READ_WORKERS,
+              page_size: int = PAGE_SIZE, chunk_rows: int = CHUNK_ROWS,
+              ids: tuple = None) -> Iterator[pd.DataFrame]:
+    """
+    Every matching row of `table`, as DataFrame chunks of `columns` (in no
+    particular order across chunks; ascending id within a key range).
+    `ids=(after, upto)` limits the read to after < id <= upto (either may be None).
+    """
+    columns = list(columns)
+    select = ",".join(columns if KEY_COLUMN in columns else [*columns, KEY_COLUMN])
+    bounds = id_range_rest(client, table, filters, since, until, ids)
+    if bounds is None:
+        return
+
+    def fetch_range(lo, hi):
+        cursor, rows = lo, []
+        while cursor < hi:
+            query = client.table(table).select(select).gte(KEY_COLUMN, cursor).lt(KEY_COLUMN, hi)
+            data = (_filtered(query, filters, since, until, ids)
+                    .order(KEY_COLUMN).limit(page_size).execute().data)
+            if not data:
+                break
+            rows.extend(data)
+            cursor = int(data[-1][KEY_COLUMN]) + 1
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame(rows, columns=columns)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=columns)
+
+    ranges = key_ranges(*bounds, max(1, workers) * RANGES_PER_WORKER)
+    yield from _parallel(fetch_range, ranges, max(1, workers))
+
+
+def read_pg(conn, columns: list[str], filters: dict = None, since: date = None,
+            until: date = None, table: str = TABLE_NAME,
+            chunk_rows: int = CHUNK_ROWS, ids: tuple = None) -> Iterator[pd.DataFrame]:
+    """Same as read_rest, streamed through a server-side cursor."""
+    where, params = _where_pg(filters, since, until, ids)
+    cols = ", ".join(f'"{c}"' for c in columns)
+    with conn.cursor(name="table_reader") as cur:
+        cur.itersize = chunk_rows
+        cur.execute(f'SELECT {cols} FROM "{table}"{where}', params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=list(columns))
+    conn.commit()
+
+
+def _where_pg(filters: dict = None, since: date = None, until: date = None, ids: tuple = None):
+    clauses, params = [], []
+    for col, value in (filters or {}).items():
+        clauses.append(f'"{col}" = %s')
+        params.append(value)
+    if since:
+        clauses.append("report_date >= %s")
+        params.append(since)
+    if until:
+        clauses.append("report_date < %s::date + 1")
+        params.append(until)
+    after, upto = ids or (None, None)
+    if after is not None:
+        clauses.append(f"{KEY_COLUMN} > %s")
+        params.append(after)
+    if upto is not None:
+        clauses.append(f"{KEY_COLUMN} <= %s")
+        params.append(upto)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def distinct_rest(client, columns: list[str], **kwargs) -> pd.DataFrame:
+    """Distinct combinations of `columns` over every matching row (read_rest kwargs)."""
+    seen = set()
+    for chunk in read_rest(client, columns, **kwargs):
+        seen.update(chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None))
+    return _sorted_frame(seen, columns)
+
+
+def distinct_pg(conn, columns: list[str], filters: dict = None, since: date = None,
+                until: date = None, table: str = TABLE_NAME) -> pd.DataFrame:
+    """Same as distinct_rest, as one SELECT DISTINCT."""
+    where, params = _where_pg(filters, since, until)
+    cols = ", ".join(f'"{c}"' for c in columns)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT DISTINCT {cols} FROM "{table}"{where}', params)
+        rows = cur.fetchall()
+    conn.commit()
+    return _sorted_frame(rows, columns)
+
+
+def _sorted_frame(rows, columns) -> pd.DataFrame:
+    df = pd.DataFrame(list(rows), columns=list(columns), dtype=object)
+    return df.sort_values(list(columns), na_position="last", ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read every row of UnifiedCropPrice")
+    parser.add_argument("--columns", required=True, help="Comma-separated columns to read")
+    parser.add_argument("--distinct", action="store_true", help="Distinct combinations only")
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    parser.add_argument("--table", default=TABLE_NAME)
+    parser.add_argument("--workers", type=int, default=READ_WORKERS)
+    parser.add_argument("--rest", action="store_true", help="Use the REST API even if DB_CONNECTION_STRING is set")
+    args = parser.parse_args()
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+    window = {"since": args.since, "until": args.until, "table": args.table}
+
+    t0 = time.perf_counter()
+    db_conn_str = None if args.rest else os.getenv("DB_CONNECTION_STRING")
+    if db_conn_str:
+        import psycopg2
+        conn = psycopg2.connect(db_conn_str)
+        try:
+            if args.distinct:
+                result = distinct_pg(conn, columns, **window)
+            else:
+                result = sum(len(c) for c in read_pg(conn, columns, **window))
+        finally:
+            conn.close()
+    elif os.getenv("SUPABASE_URL"):
+        sys.path.insert(0, os.path.dirname(__file__))
+        from overwrite_supabse import get_supabase_client
+        client = get_supabase_client()
+        if args.distinct:
+            result = distinct_rest(client, columns, workers=args.workers, **window)
+        else:
+            result = sum(len(c) for c in read_rest(client, columns, workers=args.workers, **window))
+    else:
+        print("ERROR: DB_CONNECTION_STRING or SUPABASE_URL must be set in .env")
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - t0
+    if args.distinct:
+        with pd.option_context("display.max_rows", 500, "display.width", 200):
+            print(result.to_string(index=False))
+        print(f"\n{len(result):,} distinct combinations ({elapsed:.1f}s)")
+    else:
+        print(f"{result:,} rows read ({elapsed:.1f}s, {result / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,71 @@
 """
-update_cpi.py — Fetch latest BLS CPI-U data and update the frontends' cpiData.js
+update_cpi.py — Fetch latest BLS CPI-U data into cpi_u.json, regenerate the
+frontends' cpiData.js from it, and sync the database's real prices.
 
-Keeps both the phone and web copies of cpiData.js identical (they're plain data
-modules consumed by each frontend's CPI-adjustment code).
+cpi_u.json (see cpi.py) is the one copy of the series. Both the phone and web
+cpiData.js are generated from it, identically (they're plain data modules
+consumed by each frontend's CPI-adjustment code). With DB_CONNECTION_STRING or
+SUPABASE_URL set, the new months are pushed to CpiMonthly and only their rows'
+real prices and rollups are recomputed.
 
 Series: CUUR0000SA0 (CPI-U All Urban Consumers, All Items, 1982-84=100, NSA)
 BLS public API v2 (no key required): https://api.bls.gov/publicAPI/v2/timeseries/data/
 BLS releases prior-month CPI around the 10th–15th of each month.
 """
 
-import re
+import os
 import sys
 import requests
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(__file__))
+from cpi import latest_month, load_store, save_store
+
 SERIES_ID = 'CUUR0000SA0'
 _ROOT = Path(__file__).parent.parent
-# Phone is the canonical source we read from; both copies are written identically.
-CPI_JS = _ROOT / 'phone_frontend/src/constants/cpiData.js'
 CPI_JS_TARGETS = [
-    CPI_JS,
+    _ROOT / 'phone_frontend/src/constants/cpiData.js',
     _ROOT / 'web_frontend/src/constants/cpiData.js',
 ]
 BLS_URL = 'https://api.bls.gov/publicAPI/v2/timeseries/data/'
 
 
+def _month_name(key: str, fmt: str) -> str:
+    return date.fromisoformat(f"{key}-01").strftime(fmt)
+
+
+def render_js(store: dict) -> str:
+    """cpiData.js for the store: the series, its latest month as CPI_BASE_*, and real_base."""
+    values = store['values']
+    base, real_base = latest_month(store), store['real_base']
+    lines = [
+        f"// {store['title']}",
+        f"// Source: {store['source']}",
+        f"// Base period: {_month_name(base, '%B %Y')} (most recent published value)",
+    ]
+    if store.get('comment'):
+        lines += ['//'] + [f"// {line}" for line in store['comment']]
+    lines += ['', 'export const CPI_U_ALL_ITEMS = {']
+    for key in sorted(values):
+        note = store.get('notes', {}).get(key)
+        lines.append(f"  '{key}': {values[key]:.3f}," + (f" // {note}" if note else ''))
+    lines += [
+        '};',
+        '',
+        '// The most recent published CPI value, used as the adjustment base '
+        f'("{_month_name(base, "%b %Y")} dollars").',
+        f"export const CPI_BASE_KEY = '{base}';",
+        f"export const CPI_BASE_VALUE = {values[base]:.3f};",
+        '',
+        "// The month whose dollars UnifiedCropPrice's real_price_* columns are in (backend_update/cpi.py).",
+        '// real_price × CPI_BASE_VALUE / REAL_PRICE_BASE_VALUE is in CPI_BASE_KEY dollars.',
+        f"export const REAL_PRICE_BASE_KEY = '{real_base}';",
+        f"export const REAL_PRICE_BASE_VALUE = {values[real_base]:.3f};",
+    ]
+    return '\n'.join(lines) + '\n'
+
+
 def write_all(text: str):
     """Write the generated cpiData.js content to every frontend copy."""
     for target in CPI_JS_TARGETS:
@@ -51,12 +91,34 @@ def fetch_bls(start_year: int, end_year: int) -> list:
     return data['Results']['series'][0]['data']
 
 
-def main():
-    text = CPI_JS.read_text()
+def sync_database(store: dict):
+    """Push the store to CpiMonthly and refresh the months that changed (non-fatal)."""
+    print('\n=== Syncing CpiMonthly and real prices ===')
+    try:
+        if os.getenv('DB_CONNECTION_STRING'):
+            import psycopg2
+            from cpi import sync_cpi_pg
+            conn = psycopg2.connect(os.getenv('DB_CONNECTION_STRING'))
+            try:
+                sync_cpi_pg(conn, store)
+            finally:
+                conn.close()
+        elif os.getenv('SUPABASE_URL'):
+            from cpi import sync_cpi_rest
+            from overwrite_supabse import get_supabase_client
+            sync_cpi_rest(get_supabase_client(), store)
+        else:
+            print('  DB_CONNECTION_STRING / SUPABASE_URL not set — skipped.')
+    except Exception as e:
+        print(f"  ⚠️  CPI sync failed: {e}")
+        print('  Run `python cpi.py --apply` once if CpiMonthly does not exist yet, then `python cpi.py --sync`.')
 
-    existing_keys = set(re.findall(r"'(\d{4}-\d{2})'", text))
+
+def main():
+    store = load_store()
+    existing_keys = set(store['values'])
     if not existing_keys:
-        print("ERROR: could not parse existing CPI keys from cpiData.js", file=sys.stderr)
+        print("ERROR: cpi_u.json holds no CPI values", file=sys.stderr)
         sys.exit(1)
 
     latest_key = max(existing_keys)
@@ -76,42 +138,17 @@ def main():
             if key not in existing_keys and key > latest_key:
                 new_entries[key] = float(entry['value'])
 
-    if not new_entries:
-        # Nothing new from BLS, but still mirror the canonical file to every copy
-        # so the web and phone modules can't drift apart.
-        write_all(text)
+    if new_entries:
+        store['values'].update(new_entries)
+        save_store(store)
+        print(f"Added months: {sorted(new_entries.keys())}")
+        print(f"New base: {latest_month(store)} = {store['values'][latest_month(store)]}")
+    else:
         print('CPI data is already up to date.')
-        return
-
-    # Append new lines before the closing `};`
-    new_lines = ''.join(f"  '{k}': {v},\n" for k in sorted(new_entries))
-    text = text.replace('\n};\n', f'\n{new_lines}}};\n', 1)
-
-    # Update CPI_BASE_KEY and CPI_BASE_VALUE to the newest available month
-    new_base = max(existing_keys | set(new_entries.keys()))
-    new_base_value = new_entries.get(new_base) or float(
-        re.search(rf"'{re.escape(new_base)}':\s*([\d.]+)", text).group(1)
-    )
-    text = re.sub(
-        r"export const CPI_BASE_KEY = '[\d-]+'",
-        f"export const CPI_BASE_KEY = '{new_base}'",
-        text,
-    )
-    text = re.sub(
-        r"export const CPI_BASE_VALUE = [\d.]+",
-        f"export const CPI_BASE_VALUE = {new_base_value}",
-        text,
-    )
-    # Update the trailing comment that names the base period
-    text = re.sub(
-        r'(\(")[\d-]+( dollars"\)\.)',
-        rf'\g<1>{new_base}\g<2>',
-        text,
-    )
-
-    write_all(text)
-    print(f"Added months: {sorted(new_entries.keys())}")
-    print(f"New base: {new_base} = {new_base_value}")
+
+    # Regenerated either way, so the web and phone modules can't drift apart.
+    write_all(render_js(store))
+    sync_database(store)
 
 
 if __name__ == '__main__':
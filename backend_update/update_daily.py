@@ -9,8 +9,10 @@ This script orchestrates the daily data update process:
 
 Usage:
     python update_daily.py
+    python update_daily.py --profile    # CPU/memory profiles in logs/profiles/ (profiling.py)
 """
 
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
@@ -22,6 +24,8 @@ load_dotenv()
 from get_recent_data import fetch_recent_data, REQUIRED_SLUG_IDS
 from format_data import load_and_format_all_data
 from overwrite_supabse import overwrite_supabase_data
+from metrics import recorded_run
+from profiling import add_profile_arguments, profiled
 
 
 def main():
@@ -80,5 +84,8 @@ def main():
 
 
 if __name__ == "__main__":
-    success = main()
-    sys.exit(0 if success else 1)
+    parser = argparse.ArgumentParser(description="Daily fetch, format and upload")
+    add_profile_arguments(parser).parse_args()
+    with profiled("update_daily"), recorded_run("update_daily") as run:
+        run.ok = main()
+    sys.exit(0 if run.ok else 1)
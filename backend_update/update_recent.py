@@ -8,8 +8,13 @@ the full dataset to Supabase.
 
 This avoids the timeout that occurs when fetching all history with no date
 filter, while still producing a complete Supabase table.
+
+Usage:
+    python update_recent.py
+    python update_recent.py --profile   # CPU/memory profiles in logs/profiles/ (profiling.py)
 """
 
+import argparse
 import os
 import sys
 import time
@@ -22,6 +27,8 @@ load_dotenv()
 from get_recent_data import safe_request, flatten_sections, REQUIRED_SLUG_IDS, OUTPUT_DIR
 from format_data import load_and_format_all_data
 from overwrite_supabse import overwrite_supabase_data
+from metrics import recorded_run, stage
+from profiling import add_profile_arguments, profiled
 
 API_KEY = os.getenv("USDA_API_KEY")
 BASE_URL = "https://marsapi.ams.usda.gov/services/v1.2/reports"
@@ -52,10 +59,13 @@ def fetch_slug_range(slug, start_dt, end_dt):
         "allSections": "true",
         "q": f"published_date={start_str}:{end_str}",
     }
-    data = safe_request(url, params)
+    with stage("fetch", slug=slug):
+        data = safe_request(url, params)
     if not data:
         return pd.DataFrame()
-    df = flatten_sections(data)
+    with stage("flatten", slug=slug) as s:
+        df = flatten_sections(data)
+        s.count(rows=len(df))
     return df if df is not None else pd.DataFrame()
 
 
@@ -119,7 +129,8 @@ def main():
             continue
 
         print(f"  Got {len(new_df)} new rows.")
-        merge_into_csv(slug, new_df, start_dt)
+        with stage("merge", slug=slug, rows=len(new_df)):
+            merge_into_csv(slug, new_df, start_dt)
 
     # ── Step 2: Format ────────────────────────────────────────────
     print("\n[Step 2/3] Formatting data for UnifiedCropPrice table...")
@@ -152,4 +163,8 @@ def main():
 
 
 if __name__ == "__main__":
-    sys.exit(0 if main() else 1)
+    parser = argparse.ArgumentParser(description="Incremental fetch, format and upload")
+    add_profile_arguments(parser).parse_args()
+    with profiled("update_recent"), recorded_run("update_recent") as run:
+        run.ok = main()
+    sys.exit(0 if run.ok else 1)
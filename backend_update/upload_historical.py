@@ -16,19 +16,38 @@ Settings -> Database -> Connection string -> Session pooler URI).
 Usage:
     pip install psycopg2-binary   # once, for the fast path
     python upload_historical.py
+    python upload_historical.py --workers 4   # parallel (slug, year) units
+    python upload_historical.py --swap        # rebuild past years as partitions
+    python upload_historical.py --profile     # CPU/memory profiles (profiling.py)
 
 The script is idempotent: it deletes each slug+year window before inserting,
-so it is safe to re-run from any point if interrupted.
+so it is safe to re-run from any point if interrupted. With --upsert (after
+running natural_key.py --apply) it skips the delete pass entirely and writes
+with INSERT ... ON CONFLICT on the row's natural key instead.
+
+Parallel mode (PostgreSQL path only): each worker owns one (slug, year) unit
+and runs its delete + insert as a single transaction on a pooled connection,
+holding a transaction-scoped advisory lock keyed on (slug, year) so two
+windows can never interleave. Set --workers (or BACKFILL_WORKERS in .env) to
+what the database can absorb — the Supabase session pooler caps connections.
+
+Swap mode (PostgreSQL path, after partitioning.py --apply): years that end
+before the cutoff are loaded into unindexed stage tables while the slug files
+are read, then each is indexed and attached in place of its year partition.
+No DELETE runs for those years; the year still inside the daily window is
+written in place as usual.
 
 Rows within the last 60 days are skipped — the daily pipeline owns that window.
 """
 
+import argparse
 import glob
 import math
 import os
 import re
 import sys
 import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
 import pandas as pd
@@ -37,7 +56,19 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
 sys.path.insert(0, os.path.dirname(__file__))
+from batching import AdaptiveBatcher, is_statement_timeout, pg_statement_timeout_s
 from format_data import format_for_unified_crop_price
+from metrics import count, recorded_run, stage
+from natural_key import CONFLICT_COLUMNS, KEY_COLUMN, table_has_key_rest, upsert_sql, with_row_keys
+from partitioning import YearSwap, ensure_partitions, is_partitioned
+from profiling import add_profile_arguments, profiled
+from filter_index import merge_filter_index, rebuild_filter_index_pg
+from rollups import full_range_pg, refresh_rollups_pg
+from cpi import refresh_real_prices_pg
+from market_notes import refresh_notes_pg
+from price_summary import refresh_summary_pg
+from segment_cube import refresh_cube_pg
+from sentiment import refresh_sentiment_pg
 
 # ── Configuration ─────────────────────────────────────────────────────────────
 
@@ -53,12 +84,18 @@ TABLE_NAME = "UnifiedCropPrice"
 # Leave the most-recent window for the daily pipeline to manage.
 CUTOFF_DATE = (datetime.now() - timedelta(days=60)).date()
 
-# Rows per execute_values batch (PostgreSQL path).
+# Starting rows per execute_values batch (PostgreSQL path). An AdaptiveBatcher
+# moves it between the bounds based on observed statement latency.
 PG_BATCH_SIZE = 5000
+PG_MIN_BATCH_SIZE = 500
+PG_MAX_BATCH_SIZE = 50000
 
-# Rows per REST API batch (fallback path).
+# Starting rows per REST API batch (fallback path); adapted the same way.
 REST_BATCH_SIZE = 500
 
+# Concurrent (slug, year) units in parallel mode; 1 = sequential.
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "1"))
+
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
@@ -69,31 +106,54 @@ def extract_slug_id(filepath: str) -> str | None:
 
 def read_csv_by_year(csv_path: str):
     """
-    Load a combined full-file CSV and yield (year, DataFrame) pairs, one per
-    calendar year, ordered from oldest to newest. Oldest-first keeps the
+    Load a combined full-file CSV and yield (year, DataFrame, max_date) triples,
+    one per calendar year, ordered from oldest to newest. Oldest-first keeps the
     delete-then-insert window well away from the live recent data.
+
+    The date column is parsed once and the frame is split in a single grouped
+    pass; max_date (the latest report date in the chunk, or None) is taken from
+    the same parse so callers can apply the cutoff without re-parsing.
     """
     print(f"  Loading {os.path.basename(csv_path)}...")
-    df = pd.read_csv(csv_path, low_memory=False)
-    print(f"  {len(df):,} raw rows")
+    with stage("read", slug=extract_slug_id(csv_path)) as s:
+        df = pd.read_csv(csv_path, low_memory=False)
+        s.count(rows=len(df), bytes=os.path.getsize(csv_path))
+        print(f"  {len(df):,} raw rows")
+
+        date_col = next(
+            (c for c in ("report_date", "report_end_date") if c in df.columns), None
+        )
+        if date_col:
+            parsed = pd.to_datetime(df[date_col], format="%m/%d/%Y", errors="coerce")
+            years = parsed.dt.year
+            max_dates = parsed.groupby(years).max()
 
-    date_col = next(
-        (c for c in ("report_date", "report_end_date") if c in df.columns), None
-    )
     if not date_col:
         print("  WARNING: no date column — yielding as single chunk")
-        yield None, df
+        yield None, df, None
+        return
+
+    if max_dates.empty:
+        print("  WARNING: no parseable dates — nothing to yield")
         return
+    print(f"  Years: {int(max_dates.index[0])}–{int(max_dates.index[-1])}")
 
-    parsed = pd.to_datetime(df[date_col], format="%m/%d/%Y", errors="coerce")
-    df = df.assign(_year=parsed.dt.year)
+    # groupby drops rows whose date failed to parse, matching the old per-year masks.
+    for year, chunk in df.groupby(years, sort=True):
+        yield int(year), chunk, max_dates[year].date()
 
-    years = sorted(df["_year"].dropna().unique().astype(int))
-    print(f"  Years: {years[0]}–{years[-1]}")
 
-    for year in years:
-        chunk = df[df["_year"] == year].drop(columns=["_year"]).copy()
-        yield year, chunk
+def format_year(slug_id: str, year_df: pd.DataFrame) -> pd.DataFrame:
+    """format_for_unified_crop_price() on one (slug, year) chunk, timed as a format stage."""
+    with stage("format", slug=slug_id) as s:
+        formatted = format_for_unified_crop_price(year_df)
+        s.count(input_rows=len(year_df), rows=len(formatted))
+    return formatted
+
+
+def past_cutoff(max_date) -> bool:
+    """True when a chunk reaches into the window the daily pipeline owns."""
+    return max_date is not None and max_date >= CUTOFF_DATE
 
 
 def get_table_columns_pg(cur) -> list[str]:
@@ -146,40 +206,133 @@ def delete_year_pg(cur, slug_id: str, year: int):
     )
 
 
-def insert_year_pg(conn, df: pd.DataFrame, table_cols: list[str]) -> int:
+def lock_year_pg(cur, slug_id: str, year: int):
+    """
+    Take a transaction-scoped advisory lock on the (slug, year) window.
+
+    Held until commit/rollback, so a concurrent writer on the same window waits
+    instead of interleaving its delete-then-insert with ours.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (int(slug_id), int(year)))
+
+
+def new_pg_batcher(conn) -> AdaptiveBatcher:
+    """Insert-size controller bounded by this session's statement_timeout."""
+    with conn.cursor() as cur:
+        timeout_s = pg_statement_timeout_s(cur)
+    conn.commit()
+    return AdaptiveBatcher("pg_insert", initial=PG_BATCH_SIZE, minimum=PG_MIN_BATCH_SIZE,
+                           maximum=PG_MAX_BATCH_SIZE, timeout_s=timeout_s)
+
+
+def insert_year_pg(conn, df: pd.DataFrame, table_cols: list[str],
+                   batcher: AdaptiveBatcher = None, upsert: bool = False,
+                   table: str = TABLE_NAME) -> int:
+    """
+    Insert df in adaptively sized execute_values statements, then commit.
+
+    Each batch runs under a savepoint, so a statement timeout only rolls back
+    that batch; it is retried at the smaller size the batcher picks instead of
+    aborting the whole (slug, year) transaction.
+
+    Rows are keyed whenever the table has a row_key column, in every mode, so
+    no row is left with a NULL key a later upsert could duplicate; keys never
+    drop rows. upsert=True writes ON CONFLICT DO UPDATE.
+    table overrides the target for plain inserts (swap-mode stage tables).
+    """
     from psycopg2.extras import execute_values
 
+    if batcher is None:
+        batcher = new_pg_batcher(conn)
+
+    if KEY_COLUMN in table_cols:
+        df = with_row_keys(df)
     aligned = align_df_to_columns(df, table_cols)
     records = to_records(aligned)
-    col_names = ", ".join(f'"{c}"' for c in table_cols)
-    sql = f'INSERT INTO "{TABLE_NAME}" ({col_names}) VALUES %s'
+    if upsert:
+        sql = upsert_sql(table_cols)
+    else:
+        col_names = ", ".join(f'"{c}"' for c in table_cols)
+        sql = f'INSERT INTO "{table}" ({col_names}) VALUES %s'
+    max_retries = 3
 
     with conn.cursor() as cur:
-        for i in range(0, len(records), PG_BATCH_SIZE):
-            execute_values(cur, sql, records[i : i + PG_BATCH_SIZE])
+        i = 0
+        while i < len(records):
+            failures = 0
+            while True:
+                batch = records[i : i + batcher.size]
+                cur.execute("SAVEPOINT batch")
+                t0 = time.perf_counter()
+                try:
+                    # page_size=len(batch): one statement per batch, so the latency
+                    # the batcher sees is the latency of a single statement.
+                    execute_values(cur, sql, batch, page_size=len(batch))
+                except Exception as e:
+                    batcher.record(len(batch), time.perf_counter() - t0, ok=False, exc=e)
+                    cur.execute("ROLLBACK TO SAVEPOINT batch")
+                    failures += 1
+                    # Timeouts keep shrinking the batch; give up only once even
+                    # the minimum size has failed max_retries times.
+                    if not is_statement_timeout(e) or (
+                        failures >= max_retries and len(batch) <= batcher.minimum
+                    ):
+                        raise
+                    continue
+                batcher.record(len(batch), time.perf_counter() - t0)
+                count(rows=len(batch))
+                cur.execute("RELEASE SAVEPOINT batch")
+                break
+            i += len(batch)
     conn.commit()
     return len(records)
 
 
-def process_slug_pg(conn, full_csv: str, slug_id: str, table_cols: list[str]) -> int:
+def replace_year_pg(conn, slug_id: str, year: int, df: pd.DataFrame, table_cols: list[str],
+                    batcher: AdaptiveBatcher = None) -> int:
+    """Delete and re-insert one (slug, year) window as a single locked transaction."""
+    with conn.cursor() as cur, stage("delete", slug=slug_id) as s:
+        lock_year_pg(cur, slug_id, year)
+        delete_year_pg(cur, slug_id, year)
+        s.count(rows=max(cur.rowcount, 0))
+    with stage("upload", slug=slug_id):
+        return insert_year_pg(conn, df, table_cols, batcher)  # commits, releasing the lock
+
+
+def write_year_pg(conn, slug_id: str, year: int, df: pd.DataFrame, table_cols: list[str],
+                  batcher: AdaptiveBatcher = None, upsert: bool = False,
+                  swap: YearSwap = None) -> int:
+    """
+    Write one (slug, year) unit: into the year's stage table when swap covers
+    it, else ON CONFLICT upsert, else locked delete + insert.
+    """
+    if swap is not None and swap.covers(year):
+        with stage("upload", slug=slug_id):
+            inserted = insert_year_pg(conn, df, table_cols, batcher,
+                                      table=swap.stage_table(conn, year))
+        swap.loaded(year, slug_id)
+        return inserted
+    if upsert:
+        with stage("upload", slug=slug_id):
+            return insert_year_pg(conn, df, table_cols, batcher, upsert=True)
+    return replace_year_pg(conn, slug_id, year, df, table_cols, batcher)
+
+
+def process_slug_pg(conn, full_csv: str, slug_id: str, table_cols: list[str],
+                    batcher: AdaptiveBatcher = None, upsert: bool = False,
+                    swap: YearSwap = None) -> int:
     total = 0
-    for year, year_df in read_csv_by_year(full_csv):
+    for year, year_df, max_date in read_csv_by_year(full_csv):
         if year is None:
             year = 0
 
-        # Check max date in this chunk against the cutoff
-        date_col = next(
-            (c for c in ("report_date", "report_end_date") if c in year_df.columns), None
-        )
-        if date_col:
-            max_dt = pd.to_datetime(year_df[date_col], format="%m/%d/%Y", errors="coerce").max()
-            if pd.notna(max_dt) and max_dt.date() >= CUTOFF_DATE:
-                print(f"  {year}: max={max_dt.date()} >= cutoff {CUTOFF_DATE} → skipping (daily pipeline owns)")
-                continue
+        if past_cutoff(max_date):
+            print(f"  {year}: max={max_date} >= cutoff {CUTOFF_DATE} → skipping (daily pipeline owns)")
+            continue
 
         t0 = time.time()
         print(f"  {year}: {len(year_df):,} raw rows → formatting…", end=" ", flush=True)
-        formatted = format_for_unified_crop_price(year_df)
+        formatted = format_year(slug_id, year_df)
 
         if formatted.empty:
             print("0 formatted rows, skipping")
@@ -187,40 +340,120 @@ def process_slug_pg(conn, full_csv: str, slug_id: str, table_cols: list[str]) ->
 
         print(f"{len(formatted):,} rows → uploading…", end=" ", flush=True)
 
-        with conn.cursor() as cur:
-            delete_year_pg(cur, slug_id, year)
-        conn.commit()
-
-        inserted = insert_year_pg(conn, formatted, table_cols)
+        inserted = write_year_pg(conn, slug_id, year, formatted, table_cols, batcher, upsert, swap)
         total += inserted
         print(f"✔  ({time.time() - t0:.1f}s)")
 
     return total
 
 
+# ── Parallel PostgreSQL path ───────────────────────────────────────────────────
+
+def process_unit_pg(pool, slug_id: str, year: int, year_df: pd.DataFrame,
+                    table_cols: list[str], batcher: AdaptiveBatcher, upsert: bool = False,
+                    swap: YearSwap = None) -> int:
+    """Format and upload one (slug, year) unit on a connection borrowed from the pool."""
+    t0 = time.time()
+    formatted = format_year(slug_id, year_df)
+    if formatted.empty:
+        print(f"  [{slug_id}] {year}: 0 formatted rows, skipping")
+        return 0
+
+    conn = pool.getconn()
+    try:
+        inserted = write_year_pg(conn, slug_id, year, formatted, table_cols, batcher, upsert,
+                                 swap)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+    print(f"  [{slug_id}] {year}: {inserted:,} rows ✔  ({time.time() - t0:.1f}s)")
+    return inserted
+
+
+def run_parallel_pg(db_conn_str: str, full_files: list[str], table_cols: list[str],
+                    workers: int, batcher: AdaptiveBatcher, upsert: bool = False,
+                    swap: YearSwap = None) -> int:
+    """
+    Fan (slug, year) units out over a thread pool backed by a connection pool.
+
+    The main thread reads and partitions each slug file while workers format and
+    upload, so CSV parsing and formatting overlap with the database round-trips
+    of other units (formatting itself is GIL-bound; the win is hiding network
+    latency). At most 2 × workers units are queued at once to bound memory.
+    """
+    from psycopg2.pool import ThreadedConnectionPool
+
+    pool = ThreadedConnectionPool(1, workers, db_conn_str)
+    slug_totals: dict[str, int] = {}
+    pending = {}
+
+    def drain(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for fut in done:
+            slug_id, year = pending.pop(fut)
+            try:
+                slug_totals[slug_id] = slug_totals.get(slug_id, 0) + fut.result()
+            except Exception as e:
+                print(f"\n  ERROR processing slug {slug_id} year {year}: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for full_csv in full_files:
+                slug_id = extract_slug_id(full_csv)
+                if not slug_id:
+                    print(f"\nWARNING: cannot parse slug ID from {full_csv}, skipping")
+                    continue
+
+                print(f"\nSlug {slug_id}: {os.path.basename(full_csv)}")
+                for year, year_df, max_date in read_csv_by_year(full_csv):
+                    if year is None:
+                        year = 0
+
+                    if past_cutoff(max_date):
+                        print(f"  [{slug_id}] {year}: skipping (daily pipeline owns)")
+                        continue
+
+                    while len(pending) >= 2 * workers:
+                        drain(FIRST_COMPLETED)
+                    fut = executor.submit(process_unit_pg, pool, slug_id, year, year_df,
+                                         table_cols, batcher, upsert, swap)
+                    pending[fut] = (slug_id, year)
+
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        pool.closeall()
+
+    for slug_id, inserted in sorted(slug_totals.items()):
+        print(f"  Slug {slug_id} done: {inserted:,} rows inserted")
+    return sum(slug_totals.values())
+
+
 # ── REST API fallback path ─────────────────────────────────────────────────────
 
-def process_slug_rest(full_csv: str, slug_id: str) -> int:
+def process_slug_rest(full_csv: str, slug_id: str, batcher: AdaptiveBatcher = None,
+                      upsert: bool = False) -> int:
     from overwrite_supabse import get_supabase_client, upload_dataframe
+    from rest_writer import RestWriter
 
     client = get_supabase_client()
+    writer = RestWriter(client)
+    keyed = upsert or table_has_key_rest(client, TABLE_NAME)
     total = 0
 
-    for year, year_df in read_csv_by_year(full_csv):
+    for year, year_df, max_date in read_csv_by_year(full_csv):
         if year is None:
             year = 0
 
-        date_col = next(
-            (c for c in ("report_date", "report_end_date") if c in year_df.columns), None
-        )
-        if date_col:
-            max_dt = pd.to_datetime(year_df[date_col], format="%m/%d/%Y", errors="coerce").max()
-            if pd.notna(max_dt) and max_dt.date() >= CUTOFF_DATE:
-                print(f"  {year}: skipping (within daily pipeline window)")
-                continue
+        if past_cutoff(max_date):
+            print(f"  {year}: skipping (within daily pipeline window)")
+            continue
 
         print(f"  {year}: {len(year_df):,} raw rows → formatting…", end=" ", flush=True)
-        formatted = format_for_unified_crop_price(year_df)
+        formatted = format_year(slug_id, year_df)
 
         if formatted.empty:
             print("0 formatted rows, skipping")
@@ -229,30 +462,68 @@ def process_slug_rest(full_csv: str, slug_id: str) -> int:
         print(f"{len(formatted):,} rows → uploading…", end=" ", flush=True)
         t0 = time.time()
 
+        if keyed:
+            formatted = with_row_keys(formatted)
+
+        if upsert:
+            with stage("upload", slug=slug_id) as s:
+                sent = writer.sent_bytes
+                upload_dataframe(client, TABLE_NAME, formatted, batch_size=REST_BATCH_SIZE,
+                                 batcher=batcher, on_conflict=",".join(CONFLICT_COLUMNS),
+                                 writer=writer)
+                s.count(bytes=writer.sent_bytes - sent)
+            merge_filter_index(writer, formatted)
+            total += len(formatted)
+            print(f"✔  ({time.time() - t0:.1f}s)")
+            continue
+
         # Delete existing rows for this slug+year window
         try:
-            client.table(TABLE_NAME).delete() \
-                .gte("report_date", f"{year}-01-01") \
-                .lt("report_date", f"{year+1}-01-01") \
-                .eq("slug_id", slug_id) \
-                .execute()
+            with stage("delete", slug=slug_id) as s:
+                s.count(rows=writer.delete(TABLE_NAME, {
+                    "report_date": [f"gte.{year}-01-01", f"lt.{year+1}-01-01"],
+                    "slug_id": f"eq.{slug_id}",
+                }))
         except Exception as e:
             print(f"\n    WARNING: delete failed: {e}")
 
-        upload_dataframe(client, TABLE_NAME, formatted, batch_size=REST_BATCH_SIZE)
+        with stage("upload", slug=slug_id) as s:
+            sent = writer.sent_bytes
+            upload_dataframe(client, TABLE_NAME, formatted, batch_size=REST_BATCH_SIZE,
+                             batcher=batcher, writer=writer)
+            s.count(bytes=writer.sent_bytes - sent)
+        merge_filter_index(writer, formatted)
         total += len(formatted)
         print(f"✔  ({time.time() - t0:.1f}s)")
 
+    writer.report()
     return total
 
 
 # ── Main ───────────────────────────────────────────────────────────────────────
 
 def main():
+    parser = argparse.ArgumentParser(description="Historical backfill into UnifiedCropPrice")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS,
+                        help="Concurrent (slug, year) units on the PostgreSQL path "
+                             f"(default: {BACKFILL_WORKERS}, env BACKFILL_WORKERS)")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Write with ON CONFLICT on the natural key instead of "
+                             "delete-then-insert (run natural_key.py --apply first)")
+    parser.add_argument("--swap", action="store_true",
+                        help="Rebuild years before the cutoff as stage tables and attach "
+                             "them as partitions (run partitioning.py --apply first)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
     print("=" * 60)
     print("SpecialtyCropDashboard — Historical Backfill")
     print(f"Table:   {TABLE_NAME}")
     print(f"Cutoff:  {CUTOFF_DATE}  (rows after this date are skipped)")
+    print(f"Workers: {workers}")
+    print(f"Mode:    {'upsert (natural key)' if args.upsert else 'delete + insert'}"
+          f"{' + partition swap' if args.swap else ''}")
     print("=" * 60)
 
     full_files = sorted(glob.glob(os.path.join(FULL_FILE_DIR, "*-Full.csv")))
@@ -272,6 +543,8 @@ def main():
     use_pg = False
     conn = None
     table_cols: list[str] = []
+    batcher = None
+    swap = None
 
     if db_conn_str:
         try:
@@ -281,48 +554,132 @@ def main():
             with conn.cursor() as cur:
                 table_cols = get_table_columns_pg(cur)
             use_pg = True
+            batcher = new_pg_batcher(conn)
             print(f"\n✔ Connected via PostgreSQL (fast path)")
             print(f"  Table columns ({len(table_cols)}): {table_cols[:6]}…")
+            if args.upsert and KEY_COLUMN not in table_cols:
+                print(f"\nERROR: {TABLE_NAME} has no {KEY_COLUMN} column — "
+                      "run `python natural_key.py --apply` before using --upsert.")
+                sys.exit(1)
+            with conn.cursor() as cur:
+                partitioned = is_partitioned(cur)
+            if partitioned:
+                ensure_partitions(conn)
+            if args.swap:
+                if not partitioned:
+                    print(f"\nERROR: {TABLE_NAME} is not partitioned — "
+                          "run `python partitioning.py --apply` before using --swap.")
+                    sys.exit(1)
+                swap = YearSwap(CUTOFF_DATE)
         except Exception as e:
             print(f"\n⚠ PostgreSQL connection failed: {e}")
             print("  Falling back to Supabase REST API")
             conn = None
+            use_pg = False
     else:
         print(
             "\n⚠ DB_CONNECTION_STRING not set — using REST API (slower).\n"
             "  Add DB_CONNECTION_STRING to .env for ~10× faster uploads."
         )
 
+    if args.swap and not use_pg:
+        print("\nERROR: --swap needs the PostgreSQL path (DB_CONNECTION_STRING)")
+        sys.exit(1)
+
+    if not use_pg:
+        from overwrite_supabse import REST_MAX_BATCH_SIZE
+        batcher = AdaptiveBatcher("rest_insert", initial=REST_BATCH_SIZE, minimum=50,
+                                  maximum=REST_MAX_BATCH_SIZE)
+
     # ── Process each slug ─────────────────────────────────────────────────────
     grand_total = 0
     grand_t0 = time.time()
 
-    for full_csv in full_files:
-        slug_id = extract_slug_id(full_csv)
-        if not slug_id:
-            print(f"\nWARNING: cannot parse slug ID from {full_csv}, skipping")
-            continue
+    if use_pg and workers > 1:
+        conn.close()
+        conn = None
+        grand_total = run_parallel_pg(db_conn_str, full_files, table_cols, workers, batcher,
+                                      args.upsert, swap)
+    else:
+        for full_csv in full_files:
+            slug_id = extract_slug_id(full_csv)
+            if not slug_id:
+                print(f"\nWARNING: cannot parse slug ID from {full_csv}, skipping")
+                continue
 
+            print(f"\n{'─' * 60}")
+            print(f"Slug {slug_id}: {os.path.basename(full_csv)}")
+            print("─" * 60)
+
+            try:
+                if use_pg and conn:
+                    inserted = process_slug_pg(conn, full_csv, slug_id, table_cols, batcher,
+                                               args.upsert, swap)
+                else:
+                    inserted = process_slug_rest(full_csv, slug_id, batcher, args.upsert)
+                grand_total += inserted
+                print(f"  Slug {slug_id} done: {inserted:,} rows inserted")
+            except Exception as e:
+                print(f"\n  ERROR processing slug {slug_id}: {e}")
+                if conn:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                import traceback
+                traceback.print_exc()
+
+    if swap is not None:
         print(f"\n{'─' * 60}")
-        print(f"Slug {slug_id}: {os.path.basename(full_csv)}")
+        print("Swapping rebuilt years into place")
         print("─" * 60)
+        if conn is None:
+            conn = psycopg2.connect(db_conn_str)
+        swap.finish(conn)
 
+    # The backfill rewrote every period up to the cutoff; recompute their real prices, rollups,
+    # the segment cube, the dashboard cards, the note index and sentiment, and
+    # (PostgreSQL path) regenerate the filter index.
+    # The REST path merged each unit's filter combinations as it went.
+    if grand_total:
+        print(f"\n{'─' * 60}")
+        print("Refreshing derived tables")
+        print("─" * 60)
         try:
-            if use_pg and conn:
-                inserted = process_slug_pg(conn, full_csv, slug_id, table_cols)
-            else:
-                inserted = process_slug_rest(full_csv, slug_id)
-            grand_total += inserted
-            print(f"  Slug {slug_id} done: {inserted:,} rows inserted")
+            with stage("refresh"):
+                if use_pg:
+                    if conn is None:
+                        conn = psycopg2.connect(db_conn_str)
+                    window = full_range_pg(conn)
+                    if window:
+                        refresh_real_prices_pg(conn, window[0], CUTOFF_DATE)
+                        refresh_rollups_pg(conn, window[0], CUTOFF_DATE)
+                        refresh_cube_pg(conn, window[0])
+                        refresh_summary_pg(conn)
+                        refresh_notes_pg(conn, window[0], CUTOFF_DATE)
+                        refresh_sentiment_pg(conn, window[0], CUTOFF_DATE)
+                    rebuild_filter_index_pg(conn)
+                else:
+                    from overwrite_supabse import get_supabase_client
+                    from rollups import full_range_rest, refresh_rollups_rest
+                    from cpi import refresh_real_prices_rest
+                    from market_notes import refresh_notes_rest
+                    from price_summary import refresh_summary_rest
+                    from segment_cube import refresh_cube_rest
+                    from sentiment import refresh_sentiment_rest
+                    client = get_supabase_client()
+                    window = full_range_rest(client)
+                    if window:
+                        refresh_real_prices_rest(client, window[0], CUTOFF_DATE)
+                        refresh_rollups_rest(client, window[0], CUTOFF_DATE)
+                        refresh_cube_rest(client, window[0])
+                        refresh_summary_rest(client)
+                        refresh_notes_rest(client, window[0], CUTOFF_DATE)
+                        refresh_sentiment_rest(client, window[0], CUTOFF_DATE)
         except Exception as e:
-            print(f"\n  ERROR processing slug {slug_id}: {e}")
-            if conn:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-            import traceback
-            traceback.print_exc()
+            print(f"  ⚠ Rollup refresh failed: {e}")
+            print("  Run `--apply` once for cpi.py, rollups.py, segment_cube.py, price_summary.py, "
+                  "market_notes.py, sentiment.py and filter_index.py, then rebuild them.")
 
     if conn:
         conn.close()
@@ -332,6 +689,8 @@ def main():
     print("BACKFILL COMPLETE")
     print(f"  Total rows inserted : {grand_total:,}")
     print(f"  Elapsed             : {elapsed / 60:.1f} min")
+    if batcher:
+        batcher.report()
     print("=" * 60)
     print("\nVerification SQL:")
     print(
@@ -343,4 +702,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profiled("upload_historical"), recorded_run("upload_historical"):
+        main()
@@ -7,8 +7,10 @@ and overwrites the UnifiedCropPrice table in Supabase.
 
 Usage:
     python upload_recent_slugs.py
+    python upload_recent_slugs.py --profile   # CPU/memory profiles (profiling.py)
 """
 
+import argparse
 import os
 import sys
 import glob
@@ -19,6 +21,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from format_data import format_for_unified_crop_price
 from overwrite_supabse import overwrite_supabase_data
+from profiling import add_profile_arguments, profiled
 
 # Path to the recent_slugs directory in SpecialtyCropPrices
 # SpecialtyCropPrices is a sibling project at ~/Programming/SpecialtyCropPrices
@@ -105,4 +108,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Upload recent_slugs CSVs to Supabase")
+    add_profile_arguments(parser).parse_args()
+    with profiled("upload_recent_slugs"):
+        main()
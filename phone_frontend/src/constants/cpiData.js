@@ -110,3 +110,8 @@ export const CPI_U_ALL_ITEMS = {
 // The most recent published CPI value, used as the adjustment base ("Feb 2026 dollars").
 export const CPI_BASE_KEY = '2026-02';
 export const CPI_BASE_VALUE = 326.785;
+
+// The month whose dollars UnifiedCropPrice's real_price_* columns are in (backend_update/cpi.py).
+// real_price × CPI_BASE_VALUE / REAL_PRICE_BASE_VALUE is in CPI_BASE_KEY dollars.
+export const REAL_PRICE_BASE_KEY = '2026-02';
+export const REAL_PRICE_BASE_VALUE = 326.785;
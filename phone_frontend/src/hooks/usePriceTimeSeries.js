@@ -1,6 +1,6 @@
 import { useState, useEffect, useMemo, useCallback } from 'react';
 import { getTimeSeriesData, getPricesByDateRange } from '../services/api';
-import { adjustToCurrent } from '../shared/cpiAdjust';
+import { realPrice } from '../shared/cpiAdjust';
 
 // ── Time range presets ──────────────────────────────────────────
 const RANGE_PRESETS = [
@@ -76,9 +76,10 @@ function classifyMarketType(mt) {
 
 /**
  * Aggregate rows into daily averages, normalizing each row to price/lb or
- * price/unit where the package weight is known.
+ * price/unit where the package weight is known. With `real`, each row's
+ * precomputed real_price_avg is used instead of price_avg.
  */
-function aggregateDailyAverages(rows) {
+function aggregateDailyAverages(rows, real = false) {
     const byDay = {};
     let totalLb = 0, totalUnit = 0;
 
@@ -89,16 +90,17 @@ function aggregateDailyAverages(rows) {
             byDay[dayKey] = { sum: 0, count: 0, packages: {}, origins: {}, varieties: {} };
         }
 
+        const price = real ? realPrice(row, 'price_avg') : row.price_avg;
         const weight = lookupWeight(row);
         let normalizedPrice;
         if (weight?.weight_lbs > 0) {
-            normalizedPrice = row.price_avg / weight.weight_lbs;
+            normalizedPrice = price / weight.weight_lbs;
             totalLb++;
         } else if (weight?.units > 0) {
-            normalizedPrice = row.price_avg / weight.units;
+            normalizedPrice = price / weight.units;
             totalUnit++;
         } else {
-            normalizedPrice = row.price_avg;
+            normalizedPrice = price;
         }
 
         byDay[dayKey].sum += normalizedPrice;
@@ -299,23 +301,19 @@ export default function usePriceTimeSeries(filters, options = {}) {
         const longRange = selectedRange === '1Y' || selectedRange === '2Y' || selectedRange === 'All';
         const shouldApplyCpi = cpiAdjusted && longRange;
 
-        const applyCpi = (points) => shouldApplyCpi
-            ? points.map(p => ({ ...p, price: adjustToCurrent(p.price, p.date) }))
-            : points;
-
         const filterType = (rows, type) => rows
             .filter(d => !selectedVarieties[type] || d.variety === selectedVarieties[type])
             .filter(d => !selectedPackages[type]  || d.package === selectedPackages[type])
             .filter(d => !selectedOrigins[type]   || d.origin  === selectedOrigins[type]);
 
-        const retailResult   = aggregateDailyAverages(filterType(timePartitioned.retail,   'retail'));
-        const terminalResult = aggregateDailyAverages(filterType(timePartitioned.terminal, 'terminal'));
-        const shippingResult = aggregateDailyAverages(filterType(timePartitioned.shipping, 'shipping'));
+        const retailResult   = aggregateDailyAverages(filterType(timePartitioned.retail,   'retail'),   shouldApplyCpi);
+        const terminalResult = aggregateDailyAverages(filterType(timePartitioned.terminal, 'terminal'), shouldApplyCpi);
+        const shippingResult = aggregateDailyAverages(filterType(timePartitioned.shipping, 'shipping'), shouldApplyCpi);
 
         return {
-            retail:   applyCpi(retailResult.points),
-            terminal: applyCpi(terminalResult.points),
-            shipping: applyCpi(shippingResult.points),
+            retail:   retailResult.points,
+            terminal: terminalResult.points,
+            shipping: shippingResult.points,
             _cpiActive: shouldApplyCpi,
             _units: {
                 retail:   retailResult.seriesUnit,
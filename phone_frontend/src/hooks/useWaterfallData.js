@@ -15,7 +15,7 @@
 
 import { useState, useEffect, useRef, useCallback } from 'react';
 import { getDateRange, getPricesByDateRange } from '../services/api';
-import { adjustToCurrent } from '../shared/cpiAdjust';
+import { realPrice } from '../shared/cpiAdjust';
 
 // Package weight lookup
 const PACKAGE_WEIGHTS = {
@@ -435,7 +435,7 @@ export default function useWaterfallData(filters, timeRange, options = {}) {
                 .map(d => {
                     const nominal = parseFloat(d.price_avg);
                     if (isNaN(nominal)) return NaN;
-                    return cpiAdjusted ? adjustToCurrent(nominal, d.report_date) : nominal;
+                    return cpiAdjusted ? realPrice(d, 'price_avg') : nominal;
                 })
                 .filter(v => !isNaN(v));
             if (validValues.length === 0) return 0;
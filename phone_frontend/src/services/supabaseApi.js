@@ -605,7 +605,7 @@ export const getPriceSummary = async (options = {}) => {
  *
  * @param {string} commodity - Required commodity name
  * @param {Object} filters - Optional { district, organic }
- * @returns {Array} Array of { report_date, market_type, price_avg, package, origin, variety, organic }
+ * @returns {Array} Array of { report_date, market_type, price_avg, real_price_avg, package, origin, variety, organic, ... }
  */
 export const getTimeSeriesData = async (commodity, filters = {}) => {
     try {
@@ -618,7 +618,7 @@ export const getTimeSeriesData = async (commodity, filters = {}) => {
         while (hasMore) {
             let query = supabase
                 .from('UnifiedCropPrice')
-                .select('report_date, market_type, price_avg, package, origin, variety, organic, weight_lbs, weight_kgs, units')
+                .select('report_date, market_type, price_avg, real_price_avg, package, origin, variety, organic, weight_lbs, weight_kgs, units')
                 .eq('commodity', commodity)
                 .not('report_date', 'is', null)
                 .order('report_date', { ascending: true })
@@ -1,36 +1,40 @@
 /**
  * cpiAdjust — CPI inflation-adjustment utilities
  *
- * Converts nominal prices to real prices denominated in CPI_BASE_VALUE dollars
- * (January 2026). Operates on BLS CPI-U All Items monthly index values.
+ * Rows carry precomputed real prices (real_price_avg, real_price_per_lb) in
+ * REAL_PRICE_BASE_KEY dollars, set by the pipeline (backend_update/cpi.py).
+ * These helpers read them and move them to CPI_BASE_VALUE dollars with one
+ * scalar, instead of deflating each point against the CPI table.
  *
  * No React dependencies — safe to use in hooks, utilities, and tests.
  */
 
-import { CPI_U_ALL_ITEMS, CPI_BASE_VALUE } from '../constants/cpiData';
+import { CPI_BASE_VALUE, REAL_PRICE_BASE_VALUE } from '../constants/cpiData';
+
+// real_price_* (REAL_PRICE_BASE_KEY dollars) × this = CPI_BASE_KEY dollars.
+export const REAL_TO_CURRENT = CPI_BASE_VALUE / REAL_PRICE_BASE_VALUE;
 
 /**
- * Look up the CPI index value for a given date.
- * Accepts 'YYYY-MM-DD', 'YYYY-MM-DDT...' (ISO), or 'YYYY-MM'.
- * Returns null if no data is available for that month.
+ * A row's real price for a nominal column ('price_avg' or 'price_per_lb'),
+ * in CPI_BASE_VALUE dollars.
+ *
+ * If the row has no real price (its CPI month is not published yet), the
+ * nominal price is returned unchanged — as a number, or null if it is missing.
  */
-export function getCpiForDate(dateStr) {
-    if (!dateStr) return null;
-    const key = String(dateStr).substring(0, 7); // 'YYYY-MM'
-    const value = CPI_U_ALL_ITEMS[key];
-    return value !== undefined ? value : null;
+export function realPrice(row, field = 'price_avg') {
+    const real = row[`real_${field}`];
+    if (real != null && !isNaN(real)) return Number(real) * REAL_TO_CURRENT;
+    const nominal = row[field];
+    return nominal != null && !isNaN(nominal) ? Number(nominal) : null;
 }
 
 /**
- * Adjust a nominal price to January 2026 dollars using CPI-U All Items.
- *
- * Formula: adjustedPrice = nominalPrice × (CPI_BASE_VALUE / CPI_for_period)
- *
- * If CPI data is unavailable for the given date (out-of-range or missing month),
- * the nominal price is returned unchanged — never null or NaN.
+ * The factor that deflates any of a row's nominal prices (real_price_avg /
+ * price_avg) into CPI_BASE_VALUE dollars; 1 when the row has no real price.
+ * Used for prices without their own real column, such as price_per_unit.
  */
-export function adjustToCurrent(nominalPrice, dateStr) {
-    const cpiPeriod = getCpiForDate(dateStr);
-    if (cpiPeriod == null) return nominalPrice;
-    return nominalPrice * (CPI_BASE_VALUE / cpiPeriod);
+export function rowDeflator(row) {
+    const nominal = Number(row.price_avg);
+    if (row.real_price_avg == null || isNaN(row.real_price_avg) || !nominal) return 1;
+    return (Number(row.real_price_avg) / nominal) * REAL_TO_CURRENT;
 }
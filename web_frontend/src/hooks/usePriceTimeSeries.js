@@ -6,8 +6,10 @@
  * range, package, and CPI setting.
  *
  * Price basis: the backend-computed `price_per_lb` (else `price_per_unit`, else
- * `price_avg`) — no client-side weight math. Granularity is adaptive: daily for
- * short ranges, monthly averages for long ranges.
+ * `price_avg`) — no client-side weight math. With the CPI setting on, each row
+ * contributes its precomputed real price (`real_price_*`, see cpiAdjust.js)
+ * before averaging. Granularity is adaptive: daily for short ranges, monthly
+ * averages for long ranges.
  *
  * @param {Object} filters  - { commodity, variety, district }
  * @param {Object} options  - { organicOnly }
@@ -15,7 +17,7 @@
 
 import { useState, useEffect, useMemo, useCallback } from 'react';
 import { getTimeSeriesData } from '../services/supabaseApi';
-import { adjustToCurrent } from '../shared/cpiAdjust';
+import { realPrice, rowDeflator } from '../shared/cpiAdjust';
 
 // Range presets. `days` is the lookback from the latest data point; `granularity`
 // switches daily↔monthly so long ranges stay readable and light.
@@ -38,20 +40,28 @@ function classifyMarketType(mt) {
 }
 
 // Per-row price basis: prefer normalized $/lb, then $/unit, else the package price.
-function rowPrice(row) {
-    if (row.price_per_lb != null && !isNaN(row.price_per_lb)) return { value: Number(row.price_per_lb), unit: 'lb' };
-    if (row.price_per_unit != null && !isNaN(row.price_per_unit)) return { value: Number(row.price_per_unit), unit: 'unit' };
-    if (row.price_avg != null && !isNaN(row.price_avg)) return { value: Number(row.price_avg), unit: 'pkg' };
+// `real` reads the row's real prices; $/unit has no real column, so it takes the
+// row's own deflator.
+function rowPrice(row, real = false) {
+    if (row.price_per_lb != null && !isNaN(row.price_per_lb)) {
+        return { value: real ? realPrice(row, 'price_per_lb') : Number(row.price_per_lb), unit: 'lb' };
+    }
+    if (row.price_per_unit != null && !isNaN(row.price_per_unit)) {
+        return { value: Number(row.price_per_unit) * (real ? rowDeflator(row) : 1), unit: 'unit' };
+    }
+    if (row.price_avg != null && !isNaN(row.price_avg)) {
+        return { value: real ? realPrice(row, 'price_avg') : Number(row.price_avg), unit: 'pkg' };
+    }
     return null;
 }
 
 // Bucket rows by day (YYYY-MM-DD) or month (YYYY-MM) and average the basis price.
-function aggregateBuckets(rows, granularity) {
+function aggregateBuckets(rows, granularity, real = false) {
     const buckets = new Map();
     const tally = { lb: 0, unit: 0, pkg: 0 };
 
     for (const row of rows) {
-        const p = rowPrice(row);
+        const p = rowPrice(row, real);
         if (!p || !(p.value > 0)) continue;
         const day = String(row.report_date).substring(0, 10);
         const key = granularity === 'month' ? day.substring(0, 7) : day;
@@ -179,14 +189,10 @@ export default function usePriceTimeSeries(filters, options = {}) {
             if (t) buckets[t].push(row);
         }
 
-        const applyCpi = (pts) => (cpiAdjusted
-            ? pts.map(p => ({ ...p, price: adjustToCurrent(p.price, p.date) }))
-            : pts);
-
         const out = { _units: {} };
         for (const t of MARKET_TYPES) {
-            const { points, seriesUnit } = aggregateBuckets(buckets[t], preset.granularity);
-            out[t] = applyCpi(points);
+            const { points, seriesUnit } = aggregateBuckets(buckets[t], preset.granularity, cpiAdjusted);
+            out[t] = points;
             out._units[t] = seriesUnit;
         }
         return out;
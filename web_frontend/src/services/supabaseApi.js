@@ -533,7 +533,7 @@ export const getTimeSeriesData = async (commodity, filters = {}) => {
         while (hasMore) {
             let query = supabase
                 .from('UnifiedCropPrice')
-                .select('report_date, market_type, price_avg, price_per_lb, price_per_unit, package, origin, variety, organic')
+                .select('report_date, market_type, price_avg, price_per_lb, price_per_unit, real_price_avg, real_price_per_lb, package, origin, variety, organic')
                 .eq('commodity', commodity)
                 .not('report_date', 'is', null)
                 .order('report_date', { ascending: true })